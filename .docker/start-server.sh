@@ -2,5 +2,10 @@
 # start-server.sh
 source /kompello/.venv/bin/activate
 python /kompello/manage.py migrate
-gunicorn kompello.app.wsgi:application --bind 0.0.0.0:8753 --daemon
-nginx -g 'daemon off;'
\ No newline at end of file
+# ADMISSION["CONCURRENCY"] plus the queues of all route classes (12 + 19), and some threads for other paths
+gunicorn kompello.app.wsgi:application --bind 0.0.0.0:8753 --worker-class gthread --threads 32 --daemon
+# Removes the soft deleted users and tenants, a single worker per database
+python /kompello/manage.py run_deletions &
+# Serves the event streams of /api/events/, a single process keeps the ids of the buffered events valid
+uvicorn kompello.app.asgi:application --host 127.0.0.1 --port 8754 --no-access-log &
+nginx -g 'daemon off;'
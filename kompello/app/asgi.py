@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kompello.app.settings.dev')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after the setup of Django, it needs the models
+from kompello.core.event_stream import EventStreamRouter  # noqa: E402
+
+application = EventStreamRouter(django_application)
@@ -13,4 +13,7 @@ DATABASES = {
     }
 }
 
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# runserver is a single process, there is nobody to notify
+INVALIDATION_BUS["ENABLED"] = False
\ No newline at end of file
@@ -10,6 +10,9 @@ ALLOWED_HOSTS = ["0.0.0.0", "localhost"]
 DEBUG = False
 SECURE_SSL_REDIRECT = False
 
+# Requests reach gunicorn through the nginx proxy from .docker/nginx.conf
+REST_FRAMEWORK["NUM_PROXIES"] = 1
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 from .config import get_secret
 from authlib.integrations.django_client import OAuth
@@ -37,18 +39,47 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'kompello.core.metrics_middleware.MetricsMiddleware',
+    'kompello.core.admission_middleware.AdmissionMiddleware',
+    'kompello.core.profiling_middleware.ProfilingMiddleware',
+    'kompello.core.compression_middleware.CompressionMiddleware',
+    'kompello.core.singleflight_middleware.SingleflightMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.locale.LocaleMiddleware',
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'kompello.core.invalidation_bus_middleware.InvalidationBusMiddleware',
+    'kompello.core.middleware_profiles.MiddlewareProfileRouter',
     'kompello.core.tenant_middleware.TenantMiddleware',
 ]
 
+# Middleware run by the MiddlewareProfileRouter, for the first profile whose PATHS prefixes match the request.
+# The API authenticates with JWT only and needs no sessions, CSRF tokens or messages.
+MIDDLEWARE_PROFILES = {
+    "api": {
+        "PATHS": ["/api/", "/metrics"],
+        "EXCLUDED_PATHS": ["/api/schema/swagger-ui/"],
+        "MIDDLEWARE": [
+            'django.middleware.locale.LocaleMiddleware',
+            'corsheaders.middleware.CorsMiddleware',
+            'django.middleware.common.CommonMiddleware',
+        ],
+    },
+    "full": {
+        "PATHS": ["/"],
+        "MIDDLEWARE": [
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.middleware.locale.LocaleMiddleware',
+            'corsheaders.middleware.CorsMiddleware',
+            'django.middleware.common.CommonMiddleware',
+            'django.middleware.csrf.CsrfViewMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+            'django.middleware.clickjacking.XFrameOptionsMiddleware',
+        ],
+    },
+}
+
+# The admin checks only look at MIDDLEWARE, the full profile has the middleware they require
+SILENCED_SYSTEM_CHECKS = ["admin.E408", "admin.E409", "admin.E410"]
+
 ROOT_URLCONF = 'kompello.app.urls'
 
 TEMPLATES = [
@@ -121,16 +152,195 @@ API_RESPONSE_TYPE = 'application/json'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
-    ]
+        'kompello.core.authentication.JWTAuthentication'
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth.ip': '30/min',
+        'auth.username': '10/min',
+        'auth.global': '600/min',
+    },
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Django cache alias used to share the throttle buckets between workers.
+    # None keeps the buckets local to each worker.
+    'TOKEN_BUCKET_CACHE': None,
+}
+
+# application/msgpack for clients that send it as Accept or Content-Type, when msgpack is installed
+if find_spec("msgpack") is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('kompello.core.helper.messagepack.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('kompello.core.helper.messagepack.MessagePackParser')
+
+# Bearer token for the Prometheus scraper on /metrics
+METRICS_TOKEN = os.getenv("KOMPELLO_METRICS_TOKEN", "")
+
+# Concurrency limits of a worker, see kompello.core.admission_middleware
+ADMISSION = {
+    "ENABLED": True,
+    # Requests of all classes that run at the same time. Queued requests hold a thread of the gunicorn
+    # worker as well, so its --threads in .docker/start-server.sh are at least CONCURRENCY plus the QUEUE
+    # of all classes, or requests queue inside gunicorn where they are never shed.
+    "CONCURRENCY": 12,
+    # Seconds the clients of rejected requests are asked to wait
+    "RETRY_AFTER": 1,
+    # The first class whose PATHS prefixes and METHODS match handles a request, requests of no class
+    # are never limited. Queued requests of a lower PRIORITY run first.
+    "ROUTE_CLASSES": [
+        {"NAME": "auth", "PATHS": ["/api/auth/"], "CONCURRENCY": 4, "QUEUE": 2, "TIMEOUT": 2, "PRIORITY": 2},
+        {"NAME": "import", "PATHS": ["/api/users/import/"], "CONCURRENCY": 1, "QUEUE": 1, "TIMEOUT": 5,
+         "PRIORITY": 2},
+        # Batches mostly carry reads, their sub-requests don't pass the middleware again
+        {"NAME": "batch", "PATHS": ["/api/batch/"], "CONCURRENCY": 4, "QUEUE": 4, "TIMEOUT": 5, "PRIORITY": 0},
+        # SQLite has a single writer, concurrent writes only wait for the lock or fail with "database is locked"
+        {"NAME": "write", "PATHS": ["/api/"], "METHODS": ["POST", "PUT", "PATCH", "DELETE"], "CONCURRENCY": 1,
+         "QUEUE": 4, "TIMEOUT": 5, "PRIORITY": 1},
+        {"NAME": "read", "PATHS": ["/api/"], "CONCURRENCY": 12, "QUEUE": 8, "TIMEOUT": 5, "PRIORITY": 0},
+    ],
+}
+
+# Request profiles captured by the ProfilingMiddleware
+PROFILING = {
+    # Share of requests that is profiled without the X-KOMPELLO-PROFILE header
+    "SAMPLE_RATE": 0,
+    "DIRECTORY": BASE_DIR / "profiles",
+    "MAX_PROFILES": 100,
+}
+
+# Queries slower than THRESHOLD seconds are logged to the kompello.slow_queries logger
+SLOW_QUERIES = {
+    "THRESHOLD": 0.1,
+    "EXPLAIN_SAMPLE_RATE": 0.1,
+    "TOP_N": 50,
+}
+
+# Cache for rendered GET responses, see kompello.core.helper.response_cache
+RESPONSE_CACHE = {
+    "ENABLED": True,
+    "BACKEND": "kompello.core.helper.response_cache.LocMemLRUBackend",
+    "OPTIONS": {
+        "MAX_BYTES": 32 * 1024 * 1024,
+    },
+}
+
+# Response compression, see kompello.core.compression_middleware
+# zstd and brotli are used when the zstandard and brotli packages are installed, gzip always
+COMPRESSION = {
+    "ENABLED": True,
+    # Smaller bodies are sent uncompressed, streaming responses are always compressed
+    "MIN_SIZE": 1024,
+    # Media types, or prefixes ending with a slash
+    "CONTENT_TYPES": [
+        "text/",
+        "application/json",
+        "application/x-ndjson",
+        "application/jsonl",
+        "application/vnd.oai.openapi",
+        "application/vnd.oai.openapi+json",
+        "application/javascript",
+        "image/svg+xml",
+    ],
+    # Streams whose events must reach the client without being buffered by a compressor
+    "EXCLUDED_CONTENT_TYPES": ["text/event-stream"],
+    "LEVELS": {"zstd": 3, "br": 5, "gzip": 6},
+    # Compressed bodies of GET responses kept per worker
+    "CACHE_BYTES": 16 * 1024 * 1024,
+}
+
+# Coalesces concurrent identical GET requests and response cache misses of a worker,
+# see kompello.core.helper.singleflight
+SINGLEFLIGHT = {
+    "ENABLED": True,
+    # Seconds a request waits for an identical one before it runs on its own
+    "TIMEOUT": 10,
+}
+
+# Server-Sent Events of /api/events/, served by kompello.app.asgi
+EVENTS = {
+    "ENABLED": True,
+    # Events kept per tenant for clients that reconnect with Last-Event-ID
+    "BUFFER_SIZE": 100,
+    # Tenants without subscribers whose events are still buffered for reconnecting clients
+    "BUFFERED_TENANTS": 1000,
+    # Events queued per connection before the client has to resync
+    "QUEUE_SIZE": 100,
+    # Tenants with more membership changes at once get one memberships.changed event
+    "MAX_DETAILED": 20,
+    # Seconds between heartbeats on idle connections
+    "HEARTBEAT": 15,
+    # Reconnection delay for the clients in milliseconds
+    "RETRY": 3000,
+}
+
+# Batch endpoint, see kompello.core.helper.batch
+BATCH = {
+    "MAX_REQUESTS": 20,
+    # Threads for the GET requests of one batch, 1 runs them one after another
+    "MAX_WORKERS": 4,
+}
+
+# Bulk memberships endpoint, see kompello.core.views.tenant_api_view
+MEMBERSHIPS = {
+    # Pairs of one request, counting tenants times users
+    "MAX_PAIRS": 10000,
+}
+
+# Changes endpoints, see kompello.core.helper.changes
+CHANGES = {
+    "PAGE_SIZE": 500,
+}
+
+# Bulk user import, see kompello.core.helper.user_import
+USER_IMPORT = {
+    "CHUNK_SIZE": 1000,
+    # Processes that hash the imported passwords, None uses one per CPU and 0 hashes in the request
+    "HASH_WORKERS": None,
+}
+
+# Distributes cache invalidations between the gunicorn workers,
+# see kompello.core.helper.invalidation_bus
+INVALIDATION_BUS = {
+    "ENABLED": True,
+    "POLL_INTERVAL": 0.5,
+    "MAX_BACKLOG": 1000,
+    "RETENTION": 3600,
+}
+
+# Soft deletion of users and tenants, see kompello.core.helper.deletion
+DELETION = {
+    "ENABLED": True,
+    "CHUNK_SIZE": 1000,
+    "PAUSE": 0.1,
+    "POLL_INTERVAL": 5,
+}
+
+# Write-behind of the last login of the users, see kompello.core.helper.last_login
+LAST_LOGIN = {
+    "ENABLED": True,
+    "FLUSH_INTERVAL": 60,
+    "BATCH_SIZE": 300,
+}
+
+# Revocation list of the refresh tokens, see kompello.core.helper.revocation
+REVOCATION = {
+    "SWEEP_INTERVAL": 3600,
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=24),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
-    "ROTATE_REFRESH_TOKENS": False,
+    # Used refresh tokens are revoked by kompello.core.helper.revocation instead of the blacklist app
+    "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": False,
-    "UPDATE_LAST_LOGIN": True,
+    "TOKEN_REFRESH_SERIALIZER": "kompello.core.helper.revocation.RotatingTokenRefreshSerializer",
+    # Written in bulk by kompello.core.helper.last_login
+    "UPDATE_LAST_LOGIN": False,
     "SIGNING_KEY": "complexsigningkey",
     "ALGORITHM": "HS512",
 }
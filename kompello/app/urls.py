@@ -1,5 +1,8 @@
 from django.urls import include, path
 
+from kompello.core.views.metrics_view import metrics
+
 urlpatterns = [
     path('api/', include("kompello.core.urls", namespace="core")),
+    path('metrics', metrics, name='metrics'),
 ]
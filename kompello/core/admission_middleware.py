@@ -0,0 +1,36 @@
+import math
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from kompello.core.helper.admission import AdmissionController
+
+
+class AdmissionMiddleware:
+    """
+    Sheds load before the worker saturates: every request needs a slot of the route class its path
+    and method match in ADMISSION["ROUTE_CLASSES"]. Requests that find the queue of their class full,
+    or don't get a slot before its timeout, are rejected right away with 503 and Retry-After instead
+    of piling up until gunicorn times them out.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.controller = AdmissionController.from_settings(settings.ADMISSION)
+
+    def __call__(self, request):
+        config = settings.ADMISSION
+        route_class = self.controller.classify(request.path, request.method)
+        if not config["ENABLED"] or route_class is None:
+            return self.get_response(request)
+
+        # Checking the token would cost the time this is meant to save, so its presence has to do
+        rejected = self.controller.acquire(route_class, "Authorization" in request.headers)
+        if rejected is not None:
+            response = JsonResponse({"detail": "The server is busy, try again later."}, status=503)
+            response["Retry-After"] = str(math.ceil(config["RETRY_AFTER"]))
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            self.controller.release(route_class)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kompello.core'
+
+    def ready(self):
+        from kompello.core import signals  # noqa: F401
@@ -11,7 +11,7 @@ def parse_id_token(data: dict[str, str]) -> dict[str, str] or None: # type: igno
 
 def get_user_social_auth(provider: str, sub: str) -> KompelloUser or None: # type: ignore
     try:
-        return KompelloUserSocialAuths.objects.get(provider=provider, sub=sub).user
+        return KompelloUserSocialAuths.objects.get(provider=provider, sub=sub, user__deleted_on__isnull=True).user
     except KompelloUserSocialAuths.DoesNotExist:
         return None
     
@@ -0,0 +1,18 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt import authentication
+
+from kompello.core.helper.metrics import timed_auth
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    JWT authentication that reports its duration to the metrics of the current request
+    """
+
+    def authenticate(self, request):
+        with timed_auth():
+            return super().authenticate(request)
+
+
+class JWTScheme(SimpleJWTScheme):
+    target_class = 'kompello.core.authentication.JWTAuthentication'
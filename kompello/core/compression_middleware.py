@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from kompello.core.helper.compression import (CompressedBodyCache, acompress_chunks, available_codecs,
+                                              compress_chunks, negotiate)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with zstd, brotli or gzip, whichever installed codec the client prefers.
+
+    Only the content types of COMPRESSION["CONTENT_TYPES"] are compressed, responses with a body
+    below COMPRESSION["MIN_SIZE"] are sent as they are. Streaming responses are compressed chunk
+    by chunk. The compressed bodies of GET responses are cached, so repeated responses like the
+    OpenAPI schema are only compressed once.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.codecs = available_codecs()
+        self.cache = CompressedBodyCache(settings.COMPRESSION["CACHE_BYTES"])
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        config = settings.COMPRESSION
+        if not config["ENABLED"] or not self._compressible(response, config):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        codec = negotiate(request.headers.get("Accept-Encoding", ""), self.codecs)
+        if codec is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_chunks(codec, response.streaming_content)
+            else:
+                response.streaming_content = compress_chunks(codec, response.streaming_content)
+            response.headers.pop("Content-Length", None)
+        else:
+            if len(response.content) < config["MIN_SIZE"]:
+                return response
+            if request.method in ("GET", "HEAD"):
+                content = self.cache.compress(codec, response.content)
+            else:
+                content = codec.compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response["Content-Length"] = str(len(content))
+
+        # The compressed body isn't byte for byte the one the strong ETag was computed for
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        response["Content-Encoding"] = codec.name
+        return response
+
+    @staticmethod
+    def _compressible(response, config) -> bool:
+        if response.has_header("Content-Encoding") or "no-transform" in response.get("Cache-Control", ""):
+            return False
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type in config["EXCLUDED_CONTENT_TYPES"]:
+            return False
+        return any(content_type == allowed or (allowed.endswith("/") and content_type.startswith(allowed))
+                   for allowed in config["CONTENT_TYPES"])
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from kompello.core.authentication import JWTAuthentication
+from kompello.core.helper.events import broker
+from kompello.core.helper.invalidation_bus import bus
+from kompello.core.models.auth_models import KompelloUser, Tenant
+
+EVENTS_PATH = "/api/events/"
+# Events of the subscribed user after which it may not see the tenant anymore
+ACCESS_EVENTS = {"membership.removed", "user.updated", "user.deleted"}
+
+
+class EventStreamRouter:
+    """
+    ASGI application that serves the Server-Sent Events of EVENTS_PATH itself and passes
+    every other request to the Django application.
+
+    The event streams don't go through Django, so an idle connection only costs a
+    coroutine and its queue instead of a thread. The access of the user is checked again after
+    the events that may have removed it, and the stream ends when the token expires, so the
+    client reconnects and is authorized with a new token.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self._poller = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+            return await self.stream(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def stream(self, scope, receive, send):
+        if scope["method"] != "GET":
+            return await _error(send, 405, "Method not allowed")
+
+        headers = {name.decode("latin1").lower(): value.decode("latin1") for name, value in scope["headers"]}
+        query = {name: values[0] for name, values in parse_qs(scope.get("query_string", b"").decode()).items()}
+        # EventSource can't send headers, so the token and the tenant can also be passed as query parameters
+        token = headers.get("authorization", "").removeprefix("Bearer ").strip() or query.get("access_token")
+        tenant = headers.get("x-kompello-tenant") or query.get("tenant")
+        if not token:
+            return await _error(send, 401, "Authentication credentials were not provided")
+        if not tenant:
+            return await _error(send, 400, "No tenant given")
+
+        try:
+            tenant, allowed, user, expires = await sync_to_async(_authorize)(token, tenant)
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return await _error(send, 401, "Invalid token")
+        if tenant is None:
+            return await _error(send, 404, "Tenant not found")
+        if not allowed:
+            return await _error(send, 403, "You are not a member of this tenant")
+
+        subscription, missed = broker.subscribe(tenant, headers.get("last-event-id") or query.get("last_event_id"))
+        self._start_poller()
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            await _send_event(send, None, "ready", {"tenant": tenant}, retry=settings.EVENTS["RETRY"])
+            if missed is None:
+                return await _send_event(send, None, "reset", {}, more_body=False)
+            for seq, event, data in missed:
+                await _send_event(send, broker.event_id(seq), event, data)
+
+            while (remaining := expires - time.time()) > 0:
+                received = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait({received, disconnected},
+                                             timeout=min(settings.EVENTS["HEARTBEAT"], remaining),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    received.cancel()
+                    return
+                if received not in done:
+                    received.cancel()
+                    await send({"type": "http.response.body", "body": b": heartbeat\n\n", "more_body": True})
+                    continue
+                if subscription.lagging:
+                    return await _send_event(send, None, "reset", {}, more_body=False)
+                seq, event, data = received.result()
+                await _send_event(send, broker.event_id(seq), event, data)
+                if _may_lose_access(event, data, user) and not await sync_to_async(_allowed)(user.pk, tenant):
+                    break
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            disconnected.cancel()
+            broker.unsubscribe(subscription)
+
+    def _start_poller(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+
+    @staticmethod
+    async def _poll():
+        """
+        Polls the invalidation bus for the events of the other workers while there are subscribers
+        """
+        while broker.subscriber_count():
+            await sync_to_async(bus.poll)()
+            await asyncio.sleep(settings.INVALIDATION_BUS["POLL_INTERVAL"])
+
+
+def _authorize(token: str, tenant: str) -> tuple[str or None, bool, KompelloUser, int]: # type: ignore
+    """
+    Returns the uuid of the tenant, None if it doesn't exist, whether the user of the token may subscribe to it,
+    the user and the expiration time of the token
+    """
+    authentication = JWTAuthentication()
+    validated = authentication.get_validated_token(token.encode())
+    user = authentication.get_user(validated)
+    try:
+        tenant = Tenant.objects.get(uuid=tenant)
+    except (Tenant.DoesNotExist, ValidationError):
+        return None, False, user, validated["exp"]
+    return str(tenant.uuid), user.is_staff or tenant.users.filter(pk=user.pk).exists(), user, validated["exp"]
+
+
+def _may_lose_access(event: str, data: dict, user: KompelloUser) -> bool:
+    # The bulk and the tenant events don't name the users
+    return event in ("memberships.changed", "tenant.deleted") or (
+        event in ACCESS_EVENTS and data.get("user") == str(user.uuid)
+    )
+
+
+def _allowed(user_pk: int, tenant: str) -> bool:
+    """
+    Whether the user still exists, is active and may still see the tenant
+    """
+    user = KompelloUser.objects.filter(pk=user_pk, is_active=True).first()
+    return user is not None and Tenant.objects.filter(uuid=tenant).filter(
+        **({} if user.is_staff else {"users": user})
+    ).exists()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_event(send, id, event, data, retry=None, more_body=True):
+    lines = []
+    if retry is not None:
+        lines.append(f"retry: {retry}")
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=str)}", "", ""]
+    await send({"type": "http.response.body", "body": "\n".join(lines).encode(), "more_body": more_body})
+
+
+async def _error(send, status, detail):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()})
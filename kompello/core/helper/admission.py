@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import threading
+
+from kompello.core.helper.metrics import Counter, Gauge, registry
+
+ADMISSION_LIMIT = registry.register(Gauge(
+    "kompello_admission_limit", "Requests of a route class that may run at the same time.", ("route_class",),
+))
+ADMISSION_ACTIVE = registry.register(Gauge(
+    "kompello_admission_active", "Running requests of a route class.", ("route_class",),
+))
+ADMISSION_QUEUED = registry.register(Gauge(
+    "kompello_admission_queued", "Requests of a route class waiting to run.", ("route_class",),
+))
+ADMISSION_REJECTED = registry.register(Counter(
+    "kompello_admission_rejected_total", "Requests rejected by the admission control.", ("route_class", "reason"),
+))
+
+
+class RouteClass:
+    """
+    Requests with their own concurrency limit, wait queue and maximum waiting time
+    """
+
+    def __init__(self, name: str, concurrency: int, queue: int, timeout: float, priority: int,
+                 paths=(), methods=()):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.priority = priority
+        self.paths = tuple(paths)
+        self.methods = tuple(methods)
+        self.active = 0
+        self.queued = 0
+
+    def matches(self, path: str, method: str) -> bool:
+        return ((not self.paths or path.startswith(self.paths))
+                and (not self.methods or method in self.methods))
+
+
+class _Waiter:
+    __slots__ = ("route_class", "event", "admitted", "cancelled")
+
+    def __init__(self, route_class: RouteClass):
+        self.route_class = route_class
+        self.event = threading.Event()
+        self.admitted = False
+        self.cancelled = False
+
+
+class AdmissionController:
+    """
+    Limits the requests of the worker that run at the same time, in total and per route class.
+
+    Requests that can't run wait in the bounded queue of their class for at most its timeout.
+    Free slots go to the waiting requests by priority, the priority of their class first and
+    requests with credentials before anonymous ones, then in order of arrival.
+    """
+
+    def __init__(self, concurrency: int, route_classes: list[RouteClass]):
+        self.concurrency = concurrency
+        self.route_classes = route_classes
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        for route_class in route_classes:
+            ADMISSION_LIMIT.set(route_class.name, value=route_class.concurrency)
+            self._update_gauges(route_class)
+
+    @classmethod
+    def from_settings(cls, config: dict) -> "AdmissionController":
+        return cls(config["CONCURRENCY"], [
+            RouteClass(route_class["NAME"], route_class["CONCURRENCY"], route_class["QUEUE"],
+                       route_class["TIMEOUT"], route_class["PRIORITY"], route_class.get("PATHS", ()),
+                       route_class.get("METHODS", ()))
+            for route_class in config["ROUTE_CLASSES"]
+        ])
+
+    def classify(self, path: str, method: str) -> RouteClass or None: # type: ignore
+        return next((route_class for route_class in self.route_classes if route_class.matches(path, method)), None)
+
+    def acquire(self, route_class: RouteClass, authenticated: bool) -> str or None: # type: ignore
+        """
+        Waits for a slot and returns None once the request may run,
+        or the reason why it was rejected, "queue_full" or "timeout"
+        """
+        with self._lock:
+            if self._has_slot(route_class):
+                self._start(route_class)
+                return None
+            if route_class.queued >= route_class.queue:
+                ADMISSION_REJECTED.inc(route_class.name, "queue_full")
+                return "queue_full"
+            waiter = _Waiter(route_class)
+            priority = (route_class.priority, 0 if authenticated else 1, next(self._order))
+            heapq.heappush(self._waiters, (priority, waiter))
+            route_class.queued += 1
+            self._update_gauges(route_class)
+
+        waiter.event.wait(route_class.timeout)
+        with self._lock:
+            if waiter.admitted:
+                return None
+            waiter.cancelled = True
+            route_class.queued -= 1
+            self._update_gauges(route_class)
+        ADMISSION_REJECTED.inc(route_class.name, "timeout")
+        return "timeout"
+
+    def release(self, route_class: RouteClass):
+        with self._lock:
+            self.active -= 1
+            route_class.active -= 1
+            self._update_gauges(route_class)
+            self._admit_waiters()
+
+    def _has_slot(self, route_class: RouteClass) -> bool:
+        return self.active < self.concurrency and route_class.active < route_class.concurrency
+
+    def _start(self, route_class: RouteClass):
+        self.active += 1
+        route_class.active += 1
+        self._update_gauges(route_class)
+
+    def _admit_waiters(self):
+        # Waiters of classes without a free slot stay queued, lower priorities may still run
+        blocked = []
+        while self._waiters and self.active < self.concurrency:
+            entry = heapq.heappop(self._waiters)
+            waiter = entry[1]
+            if waiter.cancelled:
+                continue
+            if not self._has_slot(waiter.route_class):
+                blocked.append(entry)
+                continue
+            waiter.admitted = True
+            waiter.route_class.queued -= 1
+            self._start(waiter.route_class)
+            waiter.event.set()
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+
+    @staticmethod
+    def _update_gauges(route_class: RouteClass):
+        ADMISSION_ACTIVE.set(route_class.name, value=route_class.active)
+        ADMISSION_QUEUED.set(route_class.name, value=route_class.queued)
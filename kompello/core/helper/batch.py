@@ -0,0 +1,106 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger("kompello.batch")
+
+# Headers of the batch request that are not passed on to the sub-requests,
+# which are always sent and rendered as JSON
+SKIPPED_META = {"CONTENT_TYPE", "CONTENT_LENGTH", "QUERY_STRING", "PATH_INFO", "SCRIPT_NAME", "REQUEST_METHOD",
+                "HTTP_ACCEPT", "HTTP_ACCEPT_ENCODING", "wsgi.input"}
+
+
+class BatchDispatcher:
+    """
+    Dispatches the sub-requests of a batch request directly to the views of the API, without the middleware.
+
+    The sub-requests are authenticated as the user of the batch request and use its tenant.
+    Consecutive GET requests are read only and run concurrently on up to BATCH["MAX_WORKERS"] threads,
+    every other request waits for the ones before it and runs alone.
+    """
+
+    def __init__(self, request: HttpRequest, user, auth):
+        self.request = request
+        self.user = user
+        self.auth = auth
+        self.workers = settings.BATCH["MAX_WORKERS"]
+
+    def run(self, sub_requests: list[dict]) -> list[dict]:
+        results = []
+        reads = []
+        for sub_request in sub_requests:
+            if sub_request["method"] == "GET":
+                reads.append(sub_request)
+                continue
+            results += self._run_reads(reads)
+            reads = []
+            results.append(self.dispatch(sub_request))
+        return results + self._run_reads(reads)
+
+    def _run_reads(self, reads: list[dict]) -> list[dict]:
+        if self.workers <= 1 or len(reads) <= 1:
+            return [self.dispatch(read) for read in reads]
+        with ThreadPoolExecutor(min(self.workers, len(reads))) as pool:
+            return list(pool.map(self._dispatch_in_thread, reads))
+
+    def _dispatch_in_thread(self, sub_request: dict) -> dict:
+        try:
+            return self.dispatch(sub_request)
+        finally:
+            # The thread ends with the batch, its connections would be left open otherwise
+            connections.close_all()
+
+    def dispatch(self, sub_request: dict) -> dict:
+        path, _, query = sub_request["path"].partition("?")
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is None or self.request.resolver_match.namespace not in match.namespaces:
+            return {"status": 404, "body": {"detail": "Not found."}}
+        if match.view_name == self.request.resolver_match.view_name:
+            return {"status": 400, "body": {"detail": "Batch requests can't be nested."}}
+
+        request = self._build_request(sub_request["method"], path, query, sub_request.get("body"))
+        request.resolver_match = match
+        try:
+            response = match.func(request, *match.args, **match.kwargs)
+            if hasattr(response, "render"):
+                response.render()
+        except Exception:
+            logger.exception("Sub-request %s %s failed", sub_request["method"], sub_request["path"])
+            return {"status": 500, "body": {"detail": "Internal server error."}}
+
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        if response.get("Content-Type", "").startswith("application/json") and content:
+            body = json.loads(content)
+        else:
+            body = content.decode(response.charset, errors="replace") or None
+        return {"status": response.status_code, "body": body}
+
+    def _build_request(self, method: str, path: str, query: str, body) -> HttpRequest:
+        content = b"" if body is None else json.dumps(body).encode()
+        environ = {key: value for key, value in self.request.META.items() if key not in SKIPPED_META}
+        environ.update({
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(content)),
+            "wsgi.input": io.BytesIO(content),
+            "wsgi.url_scheme": self.request.scheme,
+        })
+        request = WSGIRequest(environ)
+        # Read by the DRF request instead of authenticating the sub-request again
+        request._force_auth_user = self.user
+        request._force_auth_token = self.auth
+        request.tenant = getattr(self.request, "tenant", None)
+        return request
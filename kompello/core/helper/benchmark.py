@@ -0,0 +1,361 @@
+import io
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kompello.core.helper import messagepack
+from kompello.core.helper.dataset import DatasetGenerator
+from kompello.core.helper.throttling import reset_throttles
+from kompello.core.models.auth_models import KompelloUser, Tenant, TenantMembership, TenantRole
+from kompello.core.models.change_models import Tombstone
+from kompello.core.views.auth_api_view import LoginResponseSerializer
+from kompello.core.views.tenant_api_view import TenantSerializer
+from kompello.core.views.user_api_view import UserSerializer
+
+BENCH_PASSWORD = "bench-password-1!"
+
+
+class Dataset:
+    def __init__(self, admin: KompelloUser, member: KompelloUser, tenant: Tenant, user_pks: list[int],
+                 tenant_pks: list[int]):
+        self.admin = admin
+        self.member = member
+        self.tenant = tenant
+        self.user_pks = user_pks
+        self.tenant_pks = tenant_pks
+
+
+def seed(tenants: int, users: int, memberships: int, social: float, seed: int, batch_size: int = 1000) -> Dataset:
+    """
+    Generates a dataset with :class:`DatasetGenerator` and adds an admin, a member and its tenant to it.
+    The member owns the tenant. Nothing is left behind if the generation fails.
+    """
+    generator = DatasetGenerator(users, tenants, memberships, social, seed=seed, batch_size=batch_size,
+                                 password=BENCH_PASSWORD, prefix="bench")
+    with transaction.atomic():
+        for _ in generator.run():
+            pass
+
+        admin = KompelloUser.objects.create(username="bench-admin", email="bench-admin@email.com",
+                                            password=make_password(BENCH_PASSWORD), is_staff=True, is_superuser=True)
+        member = KompelloUser.objects.get(username="bench0")
+        tenant = Tenant.objects.get(slug="bench0")
+        tenant.users.add(member)
+        TenantMembership.objects.filter(tenant=tenant, kompellouser=member).update(role=TenantRole.OWNER)
+        # The admin is a plain member, so it can be removed without leaving the tenant without an owner
+        tenant.users.add(admin)
+    return Dataset(admin, member, tenant, [*generator.user_pks, admin.pk], generator.tenant_pks)
+
+
+def remove(dataset: Dataset, chunk_size: int = 500):
+    """
+    Deletes the users and tenants of the dataset with their dependent rows and audit history, in chunks.
+    The tombstones of the deletes are removed as well, the objects were never meant to be seen by the clients.
+    """
+    for model, pks in ((Tenant, dataset.tenant_pks), (KompelloUser, dataset.user_pks)):
+        for start in range(0, len(pks), chunk_size):
+            with transaction.atomic():
+                queryset = model.all_objects.filter(pk__in=pks[start:start + chunk_size])
+                uuids = list(queryset.values_list("uuid", flat=True))
+                queryset.delete()
+                Tombstone.objects.filter(object_uuid__in=uuids).delete()
+
+
+class Scenario:
+    """
+    One request to an endpoint of kompello/core/urls.py.
+
+    ``args`` and ``data`` are callables that get the Dataset. ``safe`` scenarios don't change data
+    and are the only ones that are sent over HTTP, in process every request is rolled back.
+    ``throttled`` scenarios are rate limited by the server and are only measured in process,
+    where the throttles are reset before every request.
+    ``data`` is sent as JSON unless a ``content_type`` is given.
+    """
+
+    def __init__(self, name, method="get", user="member", args=None, data=None, safe=None, content_type=None,
+                 throttled=False):
+        self.name = name
+        self.method = method
+        self.user = user
+        self.args = args or (lambda dataset: [])
+        self.data = data or (lambda dataset: None)
+        self.safe = method == "get" if safe is None else safe
+        self.content_type = content_type
+        self.throttled = throttled
+
+    def __str__(self):
+        return f"{self.method.upper()} {self.name}"
+
+
+def _self(dataset):
+    return [f"{dataset.member.uuid}"]
+
+
+def _tenant(dataset):
+    return [f"{dataset.tenant.uuid}"]
+
+
+def _member_uuid(dataset):
+    return {"uuids": [f"{dataset.member.uuid}"]}
+
+
+def _admin_uuid(dataset):
+    return {"uuids": [f"{dataset.admin.uuid}"]}
+
+
+def _startup_batch(dataset):
+    return {"requests": [
+        {"method": "GET", "path": reverse("core:users-me")},
+        {"method": "GET", "path": reverse("core:users-permissions", args=[f"{dataset.member.uuid}"])},
+        {"method": "GET", "path": reverse("core:tenants-list")},
+        {"method": "GET", "path": reverse("core:tenants-users", args=[f"{dataset.tenant.uuid}"])},
+    ]}
+
+
+SCENARIOS = [
+    Scenario("core:schema.spec", user=None),
+    Scenario("core:schema.swagger", user=None),
+    Scenario("core:auth.social", "post", user=None, throttled=True,
+             data=lambda dataset: {"provider": "unknown", "access_token": "token", "id_token": "token"}),
+    Scenario("core:auth.standard", "post", user=None, safe=True, throttled=True,
+             data=lambda dataset: {"username": dataset.member.email, "password": BENCH_PASSWORD}),
+    Scenario("core:auth.register", "post", user=None, throttled=True,
+             data=lambda dataset: {"email": "new@email.com", "password": BENCH_PASSWORD,
+                                   "password_repeated": BENCH_PASSWORD, "first_name": "New", "last_name": "User"}),
+    Scenario("core:auth.refresh", "post", user=None,
+             data=lambda dataset: {"refresh": str(RefreshToken.for_user(dataset.member))}),
+    Scenario("core:auth.revoke", "post", user=None, throttled=True,
+             data=lambda dataset: {"refresh": str(RefreshToken.for_user(dataset.member))}),
+    Scenario("core:batch", "post", safe=True, data=_startup_batch),
+    Scenario("core:users-list", user="admin"),
+    Scenario("core:users-list", "post", user=None,
+             data=lambda dataset: {"email": "new@email.com", "password": BENCH_PASSWORD, "first_name": "New",
+                                   "last_name": "User"}),
+    Scenario("core:users-detail", args=_self),
+    Scenario("core:users-detail", "patch", args=_self, data=lambda dataset: {"first_name": "New"}),
+    Scenario("core:users-detail", "delete", args=_self),
+    Scenario("core:users-me"),
+    Scenario("core:users-changes", user="admin"),
+    Scenario("core:users-import", "post", user="admin", content_type="text/csv",
+             data=lambda dataset: "email,first_name,last_name\nimport@email.com,New,User\n"),
+    Scenario("core:users-set-password", "post", args=_self, data=lambda dataset: {"password": "NewPassword"}),
+    Scenario("core:users-permissions", args=_self),
+    Scenario("core:tenants-list"),
+    Scenario("core:tenants-list", "post", data=lambda dataset: {"slug": "new", "name": "New"}),
+    Scenario("core:tenants-detail", args=_tenant),
+    Scenario("core:tenants-detail", "patch", args=_tenant, data=lambda dataset: {"name": "New"}),
+    Scenario("core:tenants-detail", "delete", args=_tenant),
+    Scenario("core:tenants-users", args=_tenant),
+    Scenario("core:tenants-add-users", "post", args=_tenant, data=_member_uuid),
+    Scenario("core:tenants-remove-users", "post", args=_tenant, data=_admin_uuid),
+    Scenario("core:tenants-roles", "post", args=_tenant,
+             data=lambda dataset: {"user": f"{dataset.member.uuid}", "role": "owner"}),
+    Scenario("core:tenants-memberships", "post",
+             data=lambda dataset: {"action": "add", "pairs": [[f"{dataset.tenant.uuid}", f"{dataset.member.uuid}"]]}),
+    Scenario("core:tenants-changes"),
+    Scenario("core:tenants-memberships-changes"),
+    Scenario("core:profiles-list", user="admin"),
+    Scenario("core:profiles-detail", user="admin", args=lambda dataset: ["missing.prof"]),
+    Scenario("core:slow-queries-list", user="admin"),
+    Scenario("core:deletion-jobs-list", user="admin"),
+    Scenario("core:deletion-jobs-detail", user="admin", args=lambda dataset: [uuid.uuid4()]),
+]
+
+
+def _token(dataset: Dataset, scenario: Scenario) -> str or None: # type: ignore
+    if scenario.user is None:
+        return None
+    return str(RefreshToken.for_user(getattr(dataset, scenario.user)).access_token)
+
+
+def summarize(latencies: list[float], wall: float, statuses: list[int], queries: list[int] = None) -> dict:
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "rps": len(latencies) / wall if wall else None,
+        "queries_per_request": statistics.median(queries) if queries else None,
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def run_in_process(dataset: Dataset, scenarios: list[Scenario], requests: int) -> dict:
+    """
+    Sends every scenario ``requests`` times through the Django test client, each request in a rolled back transaction.
+    Batch requests run their sub-requests in the same thread, so their queries are counted.
+    """
+    client = APIClient()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                           BATCH={**settings.BATCH, "MAX_WORKERS": 1}):
+        for scenario in scenarios:
+            results[str(scenario)] = _run_scenario(client, dataset, scenario, requests)
+    return results
+
+
+def _run_scenario(client: APIClient, dataset: Dataset, scenario: Scenario, requests: int) -> dict:
+    token = _token(dataset, scenario)
+    client.credentials(**({"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}))
+    request = getattr(client, scenario.method)
+    options = {"content_type": scenario.content_type} if scenario.content_type else {"format": "json"}
+    path = reverse(scenario.name, args=scenario.args(dataset))
+
+    latencies, statuses, queries = [], [], []
+    started = None
+    # The first request only warms up process wide caches, like the content types, and is not measured
+    for _ in range(requests + 1):
+        reset_throttles()
+        # Refresh tokens only work once, every request gets its own data
+        data = scenario.data(dataset)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                resp = request(path, data, **options)
+                latency = time.perf_counter() - start
+            transaction.set_rollback(True)
+        if started is None:
+            started = time.perf_counter()
+            continue
+        latencies.append(latency)
+        statuses.append(resp.status_code)
+        queries.append(len(captured))
+    return summarize(latencies, time.perf_counter() - started, statuses, queries)
+
+
+def run_http(url: str, dataset: Dataset, scenarios: list[Scenario], requests: int, concurrency: int) -> dict:
+    """
+    Sends every safe scenario ``requests`` times to the server at ``url`` from ``concurrency`` threads.
+    Throttled scenarios are skipped, they would mostly measure the 429 responses.
+    """
+    results = {}
+    for scenario in scenarios:
+        if not scenario.safe or scenario.throttled:
+            continue
+        headers = {"Content-Type": scenario.content_type or "application/json", "Accept": "*/*"}
+        token = _token(dataset, scenario)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = scenario.data(dataset)
+        if data is None:
+            body = None
+        elif scenario.content_type:
+            body = data.encode()
+        else:
+            body = json.dumps(data).encode()
+        full_url = url.rstrip("/") + reverse(scenario.name, args=scenario.args(dataset))
+
+        def send(_):
+            req = urllib.request.Request(full_url, data=body, headers=headers, method=scenario.method.upper())
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req) as resp:
+                    resp.read()
+                    code = resp.status
+            except urllib.error.HTTPError as e:
+                code = e.code
+            return time.perf_counter() - start, code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            responses = list(pool.map(send, range(requests)))
+        wall = time.perf_counter() - started
+        results[str(scenario)] = summarize([r[0] for r in responses], wall, [r[1] for r in responses])
+    return results
+
+
+def compare_middleware(dataset: Dataset, scenarios: list[Scenario], requests: int) -> dict:
+    """
+    Measures the median latency of the safe scenarios with the middleware of the full profile for every path
+    and with the configured profiles
+    """
+    full = settings.MIDDLEWARE_PROFILES["full"]["MIDDLEWARE"]
+    full_stack = {name: {**profile, "MIDDLEWARE": full} for name, profile in settings.MIDDLEWARE_PROFILES.items()}
+    scenarios = [scenario for scenario in scenarios if scenario.safe]
+    with override_settings(MIDDLEWARE_PROFILES=full_stack):
+        before = run_in_process(dataset, scenarios, requests)
+    after = run_in_process(dataset, scenarios, requests)
+    return {
+        name: {"full_p50_ms": before[name]["p50_ms"], "profile_p50_ms": after[name]["p50_ms"],
+               "saved_ms": before[name]["p50_ms"] - after[name]["p50_ms"]}
+        for name in after
+    }
+
+
+def _codecs() -> dict:
+    codecs = {"json": (JSONRenderer(), JSONParser())}
+    if messagepack.msgpack is not None:
+        codecs["msgpack"] = (messagepack.MessagePackRenderer(), messagepack.MessagePackParser())
+    return codecs
+
+
+def _payloads(dataset: Dataset, users: int) -> dict:
+    """
+    Serialized responses of the largest endpoints, as the renderers get them
+    """
+    token = RefreshToken.for_user(dataset.member)
+    return {
+        "users": UserSerializer(KompelloUser.objects.order_by("pk")[:users], many=True).data,
+        "tenants": TenantSerializer(Tenant.objects.order_by("pk")[:users], many=True).data,
+        "login": LoginResponseSerializer({"access_token": str(token.access_token), "refresh_token": str(token),
+                                          "user": dataset.member,
+                                          "exprires_at": token.access_token.payload["exp"]}).data,
+    }
+
+
+def compare_codecs(dataset: Dataset, rounds: int, users: int = 1000) -> dict:
+    """
+    Measures the size and the median encode and decode time of the payloads with every available codec
+    """
+    results = {}
+    for name, payload in _payloads(dataset, users).items():
+        results[name] = {}
+        for codec, (renderer, parser) in _codecs().items():
+            encode, decode = [], []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                content = renderer.render(payload)
+                encode.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                parser.parse(io.BytesIO(content), parser.media_type)
+                decode.append(time.perf_counter() - start)
+            results[name][codec] = {
+                "bytes": len(content),
+                "encode_ms": statistics.median(encode) * 1000,
+                "decode_ms": statistics.median(decode) * 1000,
+            }
+    return results
+
+
+def compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """
+    Returns a description of every endpoint whose p95 latency grew by more than ``tolerance``
+    or that needs more queries per request than in the baseline.
+    """
+    regressions = []
+    for mode, endpoints in results.get("results", {}).items():
+        for endpoint, current in endpoints.items():
+            base = baseline.get("results", {}).get(mode, {}).get(endpoint)
+            if base is None:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{mode} {endpoint}: p95 {base['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+            if (current["queries_per_request"] or 0) > (base["queries_per_request"] or 0):
+                regressions.append(f"{mode} {endpoint}: queries {base['queries_per_request']} -> "
+                                   f"{current['queries_per_request']}")
+    return regressions
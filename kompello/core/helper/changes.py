@@ -0,0 +1,77 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+
+class ChangesSerializer(serializers.Serializer):
+    changed = serializers.ListField(child=serializers.DictField())
+    deleted = serializers.ListField(child=serializers.DictField())
+    cursor = serializers.CharField(help_text="Pass as since to get the following changes")
+    more = serializers.BooleanField(help_text="Whether there are more changes after the cursor")
+
+
+def encode_cursor(positions: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+
+def decode_cursor(cursor: str or None) -> dict: # type: ignore
+    if not cursor:
+        return {}
+    try:
+        positions = {name: (parse_datetime(modified_on), int(pk)) for name, (modified_on, pk)
+                     in json.loads(base64.urlsafe_b64decode(cursor.encode())).items()}
+        if any(modified_on is None for modified_on, _ in positions.values()):
+            raise ValueError("Invalid timestamp")
+        return positions
+    except (ValueError, TypeError, AttributeError):
+        raise serializers.ValidationError({"since": "Invalid cursor"})
+
+
+def changes(since: str or None, streams: dict) -> dict: # type: ignore
+    """
+    Returns the rows of every stream that changed after the cursor ``since`` and the cursor of the next page.
+
+    ``streams`` maps the stream names, changed and deleted, to a queryset and a function that serializes
+    a page of it. Each stream is paginated with its own keyset on ``(modified_on, pk)``, so rows that change
+    while a client pages through them are returned again later instead of being skipped. Querysets that
+    annotate ``changed_on`` are paginated on it instead of ``modified_on``.
+    """
+    positions = decode_cursor(since)
+    size = settings.CHANGES["PAGE_SIZE"]
+    result = {"more": False}
+    for name, (queryset, serialize) in streams.items():
+        field = "changed_on" if "changed_on" in queryset.query.annotations else "modified_on"
+        position = positions.get(name)
+        if position is not None:
+            modified_on, pk = position
+            queryset = queryset.filter(Q(**{f"{field}__gt": modified_on}) | Q(**{field: modified_on, "pk__gt": pk}))
+        page = list(queryset.order_by(field, "pk")[:size + 1])
+        if len(page) > size:
+            page = page[:size]
+            result["more"] = True
+        if page:
+            positions[name] = (getattr(page[-1], field), page[-1].pk)
+        result[name] = serialize(page)
+
+    result["cursor"] = encode_cursor({
+        name: (modified_on.isoformat(), pk) for name, (modified_on, pk) in positions.items()
+    })
+    return result
+
+
+def membership_changes(queryset: QuerySet) -> dict:
+    """
+    Streams for :func:`changes` of the given MembershipChange queryset
+    """
+    def serialize(page):
+        return [{"tenant": change.tenant.uuid, "user": change.user.uuid} for change in page]
+
+    queryset = queryset.select_related("tenant", "user").only("modified_on", "tenant__uuid", "user__uuid")
+    return {
+        "changed": (queryset.filter(removed=False), serialize),
+        "deleted": (queryset.filter(removed=True), serialize),
+    }
@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+
+from kompello.core.helper.response_cache import LocMemLRUBackend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, self.level, mtime=0)
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class BrotliCodec:
+    name = "br"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def compressor(self):
+        return _BrotliCompressor(brotli.Compressor(quality=self.level))
+
+
+class _BrotliCompressor:
+    """
+    Gives the brotli compressor the compress and flush methods of the zlib and zstd compressors
+    """
+
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compressor(self):
+        return zstandard.ZstdCompressor(level=self.level).compressobj()
+
+
+def available_codecs() -> dict:
+    """
+    Returns the codecs whose library is installed by their content coding, in the order of preference
+    """
+    levels = settings.COMPRESSION["LEVELS"]
+    codecs = {}
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec(levels["zstd"])
+    if brotli is not None:
+        codecs["br"] = BrotliCodec(levels["br"])
+    codecs["gzip"] = GzipCodec(levels["gzip"])
+    return codecs
+
+
+def negotiate(accept_encoding: str, codecs: dict):
+    """
+    Returns the codec for the Accept-Encoding header or None if the client accepts none of the codecs.
+    The client's quality values win, ties are broken by the order of ``codecs``.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for name, codec in codecs.items():
+        quality = qualities.get(name, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+
+class CompressedBodyCache:
+    """
+    Compressed bodies by codec and digest of the uncompressed body, so identical responses,
+    like the OpenAPI schema, are only compressed once. The key depends on nothing but the body,
+    so an entry can never be served for a different response.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._entries = LocMemLRUBackend(max_bytes)
+
+    def compress(self, codec, data: bytes) -> bytes:
+        key = f"{codec.name}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        compressed = codec.compress(data)
+        self._entries.set(key, codec.name, compressed)
+        return compressed
+
+
+def compress_chunks(codec, chunks):
+    """
+    Compresses an iterable of byte chunks incrementally, without holding the whole body
+    """
+    compressor = codec.compressor()
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+async def acompress_chunks(codec, chunks):
+    compressor = codec.compressor()
+    async for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,115 @@
+import json
+import random
+import uuid
+
+from auditlog.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from kompello.core.models.auth_models import KompelloUser, KompelloUserSocialAuths, Tenant, TenantMembership
+from kompello.core.models.change_models import MembershipChange
+
+DEFAULT_PASSWORD = "dataset-password-1!"
+
+
+class DatasetGenerator:
+    """
+    Bulk inserts synthetic users, tenants, memberships, social auths and audit history.
+
+    Every user is a member of ``memberships`` random tenants and a share of ``social`` of them has
+    a social identity. Every user and tenant gets a create audit entry and ``history`` update entries.
+    All users share one precomputed password hash and all values, uuids included, come from a
+    random generator seeded with ``seed`` and ``prefix``, so the same arguments always produce the same data.
+    ``prefix`` is put in front of the usernames, emails and slugs to generate several datasets into one database,
+    datasets with different prefixes get different uuids.
+
+    The rows are inserted in batches of ``batch_size``, each in its own transaction, and
+    :meth:`run` yields the progress after every batch as ``(step, done, total)``.
+    """
+
+    def __init__(self, users: int, tenants: int, memberships: int = 3, social: float = 0.2, history: int = 0,
+                 seed: int = 1, batch_size: int = 5000, password: str = DEFAULT_PASSWORD, prefix: str = "gen"):
+        self.users = users
+        self.tenants = tenants
+        self.memberships = min(memberships, tenants)
+        self.social = social
+        self.history = history
+        self.batch_size = batch_size
+        self.password = password
+        self.prefix = prefix
+        self.rng = random.Random(f"{seed}:{prefix}")
+        self.user_pks = []
+        self.tenant_pks = []
+
+    def _uuid(self) -> uuid.UUID:
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _batches(self, step, total, rows):
+        """
+        Inserts the objects of the ``rows`` iterable in batches and yields the progress
+        """
+        done, batch = 0, []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                done += self._insert(batch)
+                batch = []
+                yield step, done, total
+        if batch:
+            done += self._insert(batch)
+            yield step, done, total
+
+    def _insert(self, batch) -> int:
+        model = type(batch[0])
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+            if model is TenantMembership:
+                MembershipChange.objects.bulk_create([
+                    MembershipChange(tenant_id=membership.tenant_id, user_id=membership.kompellouser_id)
+                    for membership in batch
+                ])
+        if model is KompelloUser:
+            self.user_pks += [obj.pk for obj in created]
+        elif model is Tenant:
+            self.tenant_pks += [obj.pk for obj in created]
+        return len(batch)
+
+    def run(self):
+        password = make_password(self.password)
+        yield from self._batches("users", self.users, (
+            KompelloUser(uuid=self._uuid(), username=f"{self.prefix}{i}", email=f"{self.prefix}{i}@email.com",
+                         password=password, first_name=f"First{i}", last_name=f"Last{i}")
+            for i in range(self.users)
+        ))
+        yield from self._batches("tenants", self.tenants, (
+            Tenant(uuid=self._uuid(), slug=f"{self.prefix}{i}", name=f"Tenant {self.prefix}{i}")
+            for i in range(self.tenants)
+        ))
+
+        yield from self._batches("memberships", self.users * self.memberships, (
+            TenantMembership(tenant_id=tenant_pk, kompellouser_id=user_pk)
+            for user_pk in self.user_pks
+            for tenant_pk in self.rng.sample(self.tenant_pks, self.memberships)
+        ))
+        yield from self._batches("social auths", None, (
+            KompelloUserSocialAuths(uuid=self._uuid(), user_id=user_pk, provider="generated-oauth2",
+                                    sub=f"{self.prefix}{user_pk}")
+            for user_pk in self.user_pks if self.rng.random() < self.social
+        ))
+        yield from self._batches("audit history", (self.users + self.tenants) * (self.history + 1), (
+            entry
+            for model, pks in ((KompelloUser, self.user_pks), (Tenant, self.tenant_pks))
+            for entry in self._history(model, pks)
+        ))
+
+    def _history(self, model, pks):
+        content_type = ContentType.objects.get_for_model(model)
+        field = "first_name" if model is KompelloUser else "name"
+        for pk in pks:
+            yield LogEntry(content_type=content_type, object_pk=str(pk), object_id=pk, object_repr=f"{pk}",
+                           action=LogEntry.Action.CREATE, changes=json.dumps({"id": ["None", str(pk)]}))
+            for version in range(self.history):
+                yield LogEntry(content_type=content_type, object_pk=str(pk), object_id=pk, object_repr=f"{pk}",
+                               action=LogEntry.Action.UPDATE,
+                               changes=json.dumps({field: [f"Version {version}", f"Version {version + 1}"]}))
@@ -0,0 +1,132 @@
+import logging
+import time
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from kompello.core.models.auth_models import KompelloUser, KompelloUserSocialAuths, Tenant, TenantMembership
+from kompello.core.models.change_models import MembershipChange
+from kompello.core.models.job_models import DeletionJob
+
+logger = logging.getLogger("kompello.deletion")
+
+# Sent like post_delete when a user or tenant is hidden, the receivers of post_delete
+# skip the objects that were soft deleted before
+soft_deleted = Signal()
+
+MODELS = {model._meta.model_name: model for model in (KompelloUser, Tenant)}
+
+
+def soft_delete(instance) -> DeletionJob:
+    """
+    Hides the user or tenant right away and creates the DeletionJob that removes it with its dependent rows.
+    Deleted users are deactivated as well, so they can neither log in nor use their tokens.
+    """
+    fields = {"deleted_on": timezone.now()}
+    if isinstance(instance, KompelloUser):
+        fields["is_active"] = False
+    with transaction.atomic():
+        type(instance).all_objects.filter(pk=instance.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(instance, name, value)
+        soft_deleted.send(sender=type(instance), instance=instance)
+        return DeletionJob.objects.create(model=instance._meta.model_name, object_id=instance.pk,
+                                          object_uuid=instance.uuid)
+
+
+def _steps(job: DeletionJob) -> list[tuple[str, object]]:
+    """
+    Returns the ``(name, queryset)`` steps of the job, each queryset selects the rows that are left to delete
+    """
+    model = MODELS[job.model]
+    history = LogEntry.objects.filter(content_type=ContentType.objects.get_for_model(model), object_id=job.object_id)
+    if model is Tenant:
+        return [
+            ("memberships", TenantMembership.objects.filter(tenant_id=job.object_id)),
+            ("membership changes", MembershipChange.objects.filter(tenant_id=job.object_id)),
+            ("audit history", history),
+        ]
+    return [
+        ("social auths", KompelloUserSocialAuths.objects.filter(user_id=job.object_id)),
+        ("memberships", TenantMembership.objects.filter(kompellouser_id=job.object_id)),
+        ("membership changes", MembershipChange.objects.filter(user_id=job.object_id)),
+        ("audit history", history),
+        # The collector would set the actor of all entries of the user to null with one update
+        ("audit actor", LogEntry.objects.filter(actor_id=job.object_id)),
+    ]
+
+
+def steps(job: DeletionJob) -> list[str]:
+    return [name for name, _ in _steps(job)] + ["object"]
+
+
+class DeletionWorker:
+    """
+    Runs the pending DeletionJobs one after another.
+
+    Every step deletes its rows in chunks of DELETION["CHUNK_SIZE"], each in its own transaction, and sleeps
+    DELETION["PAUSE"] seconds between the chunks, so other requests get the locks in between. The object itself
+    is deleted last, when only the rows that are cheap to cascade are left. Jobs that were running when
+    the worker stopped are resumed with their current step.
+    """
+
+    def __init__(self, chunk_size: int = None, pause: float = None):
+        self.chunk_size = chunk_size or settings.DELETION["CHUNK_SIZE"]
+        self.pause = settings.DELETION["PAUSE"] if pause is None else pause
+
+    def run_pending(self) -> int:
+        """
+        Runs the interrupted and pending jobs and returns their number
+        """
+        # Interrupted jobs first, "running" sorts after "pending"
+        jobs = DeletionJob.objects.filter(
+            status__in=[DeletionJob.Status.RUNNING, DeletionJob.Status.PENDING]
+        ).order_by("-status", "pk")
+        count = 0
+        for job in jobs:
+            self.run(job)
+            count += 1
+        return count
+
+    def run(self, job: DeletionJob):
+        if job.status == DeletionJob.Status.RUNNING:
+            logger.info("Resuming the deletion of %s %s at %s", job.model, job.object_uuid, job.step)
+        self._update(job, status=DeletionJob.Status.RUNNING)
+        try:
+            names = steps(job)
+            start = names.index(job.step) if job.step in names else 0
+            querysets = dict(_steps(job))
+            for name in names[start:]:
+                self._update(job, step=name)
+                if name == "object":
+                    # Hard deletes of soft deleted objects are not reported again, see soft_deleted
+                    MODELS[job.model].all_objects.filter(pk=job.object_id).delete()
+                elif name == "audit actor":
+                    self._chunked(job, querysets[name], lambda queryset: queryset.update(actor=None))
+                else:
+                    self._chunked(job, querysets[name], lambda queryset: queryset.delete()[0])
+        except Exception as e:
+            # The job keeps its step, so it continues there once it is retried
+            logger.exception("Deleting %s %s failed", job.model, job.object_uuid)
+            self._update(job, status=DeletionJob.Status.FAILED, error=str(e))
+            return
+        self._update(job, status=DeletionJob.Status.DONE, finished_on=timezone.now())
+
+    def _chunked(self, job: DeletionJob, queryset, apply):
+        model = queryset.model
+        while pks := list(queryset.values_list("pk", flat=True)[:self.chunk_size]):
+            with transaction.atomic():
+                changed = apply(model._base_manager.filter(pk__in=pks))
+                self._update(job, deleted_rows=job.deleted_rows + changed)
+            if self.pause:
+                time.sleep(self.pause)
+
+    @staticmethod
+    def _update(job: DeletionJob, **fields):
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.save(update_fields=[*fields, "modified_on"])
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import threading
+import uuid as uuid
+from collections import OrderedDict, defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+
+from kompello.core.helper.invalidation_bus import bus
+
+
+class Subscription:
+    """
+    Queue of the events of one tenant for one connection, owned by the event loop of the connection.
+    A subscription whose queue overflows is marked as lagging and has to resync.
+    """
+
+    def __init__(self, tenant: str, loop: asyncio.AbstractEventLoop):
+        self.tenant = tenant
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.EVENTS["QUEUE_SIZE"])
+        self.lagging = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagging = True
+
+    def reset(self):
+        self.lagging = True
+        self.push(None)
+
+
+class EventBroker:
+    """
+    Fans out the change events of the tenants to the subscribed connections of this process.
+
+    Events are published through the invalidation bus, so events of other workers arrive when this
+    process polls it. Every event gets a sequence number, sent as ``<broker>-<sequence>`` id, and the last
+    EVENTS["BUFFER_SIZE"] events of a tenant are kept for connections that resume with Last-Event-ID.
+    Only tenants that were subscribed to in this process are buffered, the buffers of the
+    EVENTS["BUFFERED_TENANTS"] tenants whose last subscriber left most recently are kept for reconnecting
+    clients. Subscribers that can't be resumed from the buffer get a reset event.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.reset_seq = 0
+        # Buffer of every tenant with the sequence number it started after, least recently unsubscribed first
+        self._buffers = OrderedDict()
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, tenant: str, event: str, data: dict):
+        """
+        Publishes the event once the surrounding transaction commits
+        """
+        if settings.EVENTS["ENABLED"]:
+            payload = json.dumps([str(tenant), event, data], default=str)
+            transaction.on_commit(lambda: bus.publish("events", payload))
+
+    def deliver(self, payload: str):
+        tenant, event, data = json.loads(payload)
+        with self._lock:
+            self.seq += 1
+            item = (self.seq, event, data)
+            if tenant in self._buffers:
+                self._buffers[tenant][1].append(item)
+            subscribers = list(self._subscribers.get(tenant, ()))
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.push, item)
+
+    def subscribe(self, tenant: str, last_event_id: str = None) -> tuple[Subscription, list or None]: # type: ignore
+        """
+        Subscribes the running event loop to the events of ``tenant``.
+        Returns the subscription and the buffered events after ``last_event_id``,
+        or None if they aren't buffered anymore and the client has to resync.
+        """
+        subscription = Subscription(tenant, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[tenant].add(subscription)
+            if tenant not in self._buffers:
+                self._buffers[tenant] = (self.seq, deque(maxlen=settings.EVENTS["BUFFER_SIZE"]))
+            missed = [] if not last_event_id else self._missed(tenant, last_event_id)
+        return subscription, missed
+
+    def _missed(self, tenant, last_event_id):
+        origin, _, seq = last_event_id.partition("-")
+        if origin != self.origin or not seq.isdigit() or not self.reset_seq <= int(seq) <= self.seq:
+            return None
+        seq = int(seq)
+        start, buffer = self._buffers[tenant]
+        # Events before the buffer started weren't kept, later ones were only dropped from a full buffer
+        if seq < start or (len(buffer) == buffer.maxlen and buffer[0][0] > seq + 1):
+            return None
+        return [item for item in buffer if item[0] > seq]
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.origin}-{seq}"
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers[subscription.tenant].discard(subscription)
+            if not self._subscribers[subscription.tenant]:
+                del self._subscribers[subscription.tenant]
+                self._buffers.move_to_end(subscription.tenant)
+                self._trim()
+
+    def _trim(self):
+        unsubscribed = [tenant for tenant in self._buffers if tenant not in self._subscribers]
+        for tenant in unsubscribed[:max(0, len(unsubscribed) - settings.EVENTS["BUFFERED_TENANTS"])]:
+            del self._buffers[tenant]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def reset(self):
+        """
+        Makes all subscribers resync, after this process missed events of the bus
+        """
+        with self._lock:
+            self.reset_seq = self.seq
+            self._buffers = OrderedDict((tenant, (self.seq, deque(maxlen=settings.EVENTS["BUFFER_SIZE"])))
+                                        for tenant in self._subscribers)
+            subscribers = [subscriber for subscribers in self._subscribers.values() for subscriber in subscribers]
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.reset)
+
+
+broker = EventBroker()
+bus.subscribe("events", broker.deliver)
+bus.on_flush(broker.reset)
+
+
+def publish_membership_changes(pairs, removed: bool):
+    """
+    Publishes membership.added or membership.removed for the ``(tenant uuid, user uuid)`` pairs.
+    Tenants with more than EVENTS["MAX_DETAILED"] changes get one memberships.changed event instead.
+    """
+    users_by_tenant = defaultdict(set)
+    for tenant, user in pairs:
+        users_by_tenant[tenant].add(user)
+
+    event = "membership.removed" if removed else "membership.added"
+    for tenant, users in users_by_tenant.items():
+        if len(users) > settings.EVENTS["MAX_DETAILED"]:
+            broker.publish(tenant, "memberships.changed", {"count": len(users)})
+        else:
+            for user in users:
+                broker.publish(tenant, event, {"user": user})
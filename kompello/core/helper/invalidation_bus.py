@@ -0,0 +1,88 @@
+import time
+import uuid as uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from kompello.core.models.event_models import InvalidationEvent
+
+
+class InvalidationBus:
+    """
+    Distributes cache invalidations between worker processes through the database.
+
+    Published events are applied to the local caches and written to the InvalidationEvent
+    table once the surrounding transaction commits, so no thread caches the old data under
+    the new version before the changes are visible. Every worker polls
+    the table at most once per ``POLL_INTERVAL`` seconds, at the start of a request, and
+    applies the events of the other workers in sequence order. A worker that misses
+    events, because it fell more than ``MAX_BACKLOG`` events behind or because the
+    sequence has a gap, flushes all of its caches instead.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.last_seq = None
+        self.last_poll = 0
+        self.last_prune = 0
+        self._handlers = defaultdict(list)
+        self._flush_handlers = []
+
+    def subscribe(self, topic: str, handler):
+        self._handlers[topic].append(handler)
+
+    def on_flush(self, handler):
+        self._flush_handlers.append(handler)
+
+    def publish(self, topic: str, key: str):
+        transaction.on_commit(lambda: self._dispatch(topic, key))
+        if settings.INVALIDATION_BUS["ENABLED"]:
+            transaction.on_commit(
+                lambda: InvalidationEvent.objects.create(origin=self.origin, topic=topic, key=key)
+            )
+
+    def poll(self, force: bool = False):
+        config = settings.INVALIDATION_BUS
+        now = time.monotonic()
+        if not config["ENABLED"] or (not force and now - self.last_poll < config["POLL_INTERVAL"]):
+            return
+        self.last_poll = now
+
+        if self.last_seq is None:
+            self.last_seq = InvalidationEvent.objects.aggregate(seq=Max("id"))["seq"] or 0
+            return
+
+        events = list(
+            InvalidationEvent.objects.filter(id__gt=self.last_seq)
+            .order_by("id")
+            .values_list("id", "origin", "topic", "key")[:config["MAX_BACKLOG"] + 1]
+        )
+        if len(events) > config["MAX_BACKLOG"] or (events and events[0][0] != self.last_seq + 1):
+            self.flush()
+            self.last_seq = InvalidationEvent.objects.aggregate(seq=Max("id"))["seq"] or 0
+        else:
+            for seq, origin, topic, key in events:
+                if origin != self.origin:
+                    self._dispatch(topic, key)
+                self.last_seq = seq
+
+        if now - self.last_prune > config["RETENTION"] / 10:
+            self.last_prune = now
+            InvalidationEvent.objects.filter(
+                created_on__lt=timezone.now() - timedelta(seconds=config["RETENTION"])
+            ).delete()
+
+    def flush(self):
+        for handler in self._flush_handlers:
+            handler()
+
+    def _dispatch(self, topic: str, key: str):
+        for handler in self._handlers[topic]:
+            handler(key)
+
+
+bus = InvalidationBus()
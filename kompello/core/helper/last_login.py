@@ -0,0 +1,88 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from kompello.core.models.auth_models import KompelloUser
+
+logger = logging.getLogger("kompello.last_login")
+
+
+class LastLoginBuffer:
+    """
+    Collects the last login of the users in memory and writes them in bulk.
+
+    A background thread writes the pending logins every LAST_LOGIN["FLUSH_INTERVAL"] seconds and the rest
+    is written when the process exits, so every user is updated at most once per interval however often it
+    logs in. The rows are written with ``update()``, which neither sends the save signals nor creates audit
+    log entries.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, user_pk: int, when=None):
+        when = when or timezone.now()
+        if not settings.LAST_LOGIN["ENABLED"]:
+            KompelloUser.objects.filter(pk=user_pk).update(last_login=when)
+            return
+        with self._lock:
+            self._pending[user_pk] = when
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="last-login-flusher", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """
+        Writes the pending logins and returns the number of users they belong to
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        items = list(pending.items())
+        batch_size = settings.LAST_LOGIN["BATCH_SIZE"]
+        for start in range(0, len(items), batch_size):
+            batch = dict(items[start:start + batch_size])
+            try:
+                KompelloUser.objects.filter(pk__in=batch).update(last_login=Case(
+                    *[When(pk=pk, then=Value(when)) for pk, when in batch.items()], output_field=DateTimeField(),
+                ))
+            except DatabaseError:
+                logger.exception("Writing the last login of %s users failed", len(batch))
+                self._retry(dict(items[start:]))
+                break
+        return len(pending)
+
+    def discard(self):
+        with self._lock:
+            self._pending = {}
+
+    def _retry(self, failed: dict):
+        # Logins recorded since the failed flush are newer and win
+        with self._lock:
+            self._pending = {**failed, **self._pending}
+
+    def _run(self):
+        while True:
+            time.sleep(settings.LAST_LOGIN["FLUSH_INTERVAL"])
+            try:
+                self.flush()
+            except Exception:
+                # A failed flush must not end the thread, the logins would only be written at exit otherwise
+                logger.exception("Flushing the last logins failed")
+            finally:
+                # The connections of this thread would stay open until the next flush otherwise
+                connections.close_all()
+
+
+last_logins = LastLoginBuffer()
+atexit.register(last_logins.flush)
@@ -0,0 +1,108 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from kompello.core.helper.events import publish_membership_changes
+from kompello.core.helper.response_cache import invalidate
+from kompello.core.models.auth_models import TenantMembership
+from kompello.core.models.change_models import MembershipChange
+
+BATCH_SIZE = 1000
+# Tenants of one query that filters by pairs, every tenant is an OR term and SQLite limits their nesting
+QUERY_TENANTS = 100
+
+
+def _group(pairs: set[tuple[int, int]]) -> dict[int, set[int]]:
+    tenants = defaultdict(set)
+    for tenant_pk, user_pk in pairs:
+        tenants[tenant_pk].add(user_pk)
+    return tenants
+
+
+def _pairs_qs(pairs: set[tuple[int, int]], user_field: str = "kompellouser_id"):
+    """
+    Yields the filters of the pairs, each one for up to QUERY_TENANTS tenants
+    """
+    tenants = list(_group(pairs).items())
+    for start in range(0, len(tenants), QUERY_TENANTS):
+        q = Q()
+        for tenant_pk, user_pks in tenants[start:start + QUERY_TENANTS]:
+            q |= Q(tenant_id=tenant_pk, **{f"{user_field}__in": user_pks})
+        yield q
+
+
+def _existing(pairs: set[tuple[int, int]]) -> set[tuple[int, int]]:
+    existing = set()
+    for q in _pairs_qs(pairs):
+        existing.update(TenantMembership.objects.filter(q).values_list("tenant_id", "kompellouser_id"))
+    return existing
+
+
+def record_membership_changes(pairs, removed: bool):
+    """
+    Records and publishes that the memberships of the ``(tenant pk, user pk)`` pairs were added or removed.
+    Every membership has a change, so removals update the existing changes instead of inserting new ones.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    if removed:
+        for q in _pairs_qs(pairs, "user_id"):
+            MembershipChange.objects.filter(q).update(removed=True, modified_on=timezone.now())
+    else:
+        MembershipChange.objects.bulk_create([
+            MembershipChange(tenant_id=tenant_pk, user_id=user_pk) for tenant_pk, user_pk in pairs
+        ], update_conflicts=True, unique_fields=["tenant", "user"], update_fields=["removed", "modified_on"],
+            batch_size=BATCH_SIZE)
+    if settings.EVENTS["ENABLED"]:
+        publish_membership_changes([pair for q in _pairs_qs(pairs, "user_id") for pair in MembershipChange.objects
+                                   .filter(q).values_list("tenant__uuid", "user__uuid")], removed)
+
+
+def _invalidate(tenant_uuids):
+    invalidate("tenants", *[f"tenant:{uuid}" for uuid in tenant_uuids])
+
+
+def add_memberships(pairs: set[tuple[int, int]], tenant_uuids: dict[int, str]) -> int:
+    """
+    Adds the users to the tenants of the given ``(tenant pk, user pk)`` pairs and returns the number of new memberships.
+    ``tenant_uuids`` maps the pks of the tenants to their uuids.
+
+    The existing memberships are selected first and only the new ones are inserted, in the same transaction.
+    The inserts bypass the m2m_changed signal, so the changes are recorded and the cached responses
+    are invalidated here.
+    """
+    if not pairs:
+        return 0
+
+    with transaction.atomic(savepoint=False):
+        new = set(pairs) - _existing(pairs)
+        # Memberships added concurrently since the select are skipped by the unique constraint
+        TenantMembership.objects.bulk_create([
+            TenantMembership(tenant_id=tenant_pk, kompellouser_id=user_pk) for tenant_pk, user_pk in new
+        ], ignore_conflicts=True, batch_size=BATCH_SIZE)
+        if new:
+            record_membership_changes(new, removed=False)
+            _invalidate({tenant_uuids[tenant_pk] for tenant_pk, _ in new})
+    return len(new)
+
+
+def remove_memberships(pairs: set[tuple[int, int]], tenant_uuids: dict[int, str]) -> int:
+    """
+    Removes the users from the tenants of the given ``(tenant pk, user pk)`` pairs and returns the number
+    of removed memberships. Only the memberships that existed are recorded as removed.
+    """
+    if not pairs:
+        return 0
+
+    with transaction.atomic(savepoint=False):
+        existing = _existing(pairs)
+        for q in _pairs_qs(existing):
+            TenantMembership.objects.filter(q).delete()
+        if existing:
+            record_membership_changes(existing, removed=True)
+            _invalidate({tenant_uuids[tenant_pk] for tenant_pk, _ in existing})
+    return len(existing)
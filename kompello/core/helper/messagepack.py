@@ -0,0 +1,73 @@
+import datetime
+import decimal
+import uuid as uuid
+
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MEDIA_TYPE = "application/msgpack"
+
+# Extension type of UUIDs, sent as their 16 bytes. Aware datetimes use the standard timestamp extension type -1.
+UUID_EXT = 1
+
+
+def _default(obj):
+    if isinstance(obj, uuid.UUID):
+        return msgpack.ExtType(UUID_EXT, obj.bytes)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        # Only naive datetimes get here, aware ones are packed as timestamps
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, Promise)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} can't be packed")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == UUID_EXT:
+        return uuid.UUID(bytes=data)
+    return msgpack.ExtType(code, data)
+
+
+def packb(data) -> bytes:
+    return msgpack.packb(data, default=_default, datetime=True, use_bin_type=True)
+
+
+def unpackb(content: bytes):
+    return msgpack.unpackb(content, ext_hook=_ext_hook, timestamp=3, raw=False)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders MessagePack, with UUIDs and aware datetimes as extension types instead of strings
+    """
+    media_type = MEDIA_TYPE
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return packb(data)
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack, the UUID and timestamp extension types become UUIDs and aware datetimes
+    """
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return unpackb(stream.read())
+        except (ValueError, TypeError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as e:
+            raise ParseError(f"MessagePack parse error - {e}")
@@ -0,0 +1,157 @@
+import bisect
+import contextvars
+import threading
+import time
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # One counter per bucket, the +Inf bucket and the sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        for labels, counts in list(self._values.items()):
+            labels = dict(zip(self.labels, labels))
+            total = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                total += count
+                yield f"{self.name}_bucket", {**labels, "le": str(bound)}, total
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, total
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_str = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{label_str}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    "kompello_request_duration_seconds", "Time spent handling the request.", ("view", "method"),
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+))
+REQUEST_DB_DURATION = registry.register(Histogram(
+    "kompello_request_db_duration_seconds", "Time spent in database queries per request.", ("view",),
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+))
+REQUEST_DB_QUERIES = registry.register(Histogram(
+    "kompello_request_db_queries", "Number of database queries per request.", ("view",),
+    (0, 1, 2, 3, 5, 10, 20, 50, 100),
+))
+RESPONSE_SIZE = registry.register(Histogram(
+    "kompello_response_size_bytes", "Size of the response body.", ("view",),
+    (100, 1000, 10000, 100000, 1000000, 10000000),
+))
+REQUESTS = registry.register(Counter(
+    "kompello_requests_total", "Number of handled requests.", ("view", "method", "status"),
+))
+
+
+class RequestTimings:
+    """
+    Durations of the phases of the current request in seconds.
+    """
+    __slots__ = ("view_name", "db", "queries", "auth", "view_start", "view", "render")
+
+    def __init__(self):
+        self.view_name = None
+        self.db = 0.0
+        self.queries = 0
+        self.auth = 0.0
+        self.view_start = None
+        self.view = None
+        self.render = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+current_timings = contextvars.ContextVar("current_timings", default=None)
+
+
+class timed_auth:
+    """
+    Adds the time spent in the block, without database time, to the auth phase of the current request.
+    """
+
+    def __enter__(self):
+        self.timings = current_timings.get()
+        if self.timings is not None:
+            self.db = self.timings.db
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings.auth += time.perf_counter() - self.start - (self.timings.db - self.db)
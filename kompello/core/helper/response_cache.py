@@ -0,0 +1,189 @@
+import functools
+import threading
+import uuid as uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from kompello.core.helper.invalidation_bus import bus
+from kompello.core.helper.singleflight import singleflight
+
+
+class LocMemLRUBackend:
+    """
+    Process local response cache bounded by the size of the stored bodies.
+
+    The least recently used responses are evicted once ``MAX_BYTES`` is reached.
+    """
+
+    def __init__(self, MAX_BYTES: int = 32 * 1024 * 1024):
+        self.max_bytes = MAX_BYTES
+        self.size = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[str, bytes] or None: # type: ignore
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, content_type: str, content: bytes):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[key] = (content_type, content)
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get_versions(self, names: list[str]) -> list[int]:
+        return [self._versions.get(name, 0) for name in names]
+
+    def incr_version(self, name: str):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        # Versions are bumped instead of reset, so responses that are computed
+        # right now can't be stored under a key that becomes valid again.
+        with self._lock:
+            self._entries.clear()
+            self._versions = {name: version + 1 for name, version in self._versions.items()}
+            self.size = 0
+
+
+class DjangoCacheBackend:
+    """
+    Response cache stored in a Django cache, e.g. to share it between workers.
+
+    Entries and versions are shared by all workers, so there is nothing to flush locally.
+    """
+
+    def __init__(self, ALIAS: str = "default", TIMEOUT: int = 3600):
+        self.cache = caches[ALIAS]
+        self.timeout = TIMEOUT
+
+    def get(self, key: str) -> tuple[str, bytes] or None: # type: ignore
+        return self.cache.get(f"response:{key}")
+
+    def set(self, key: str, content_type: str, content: bytes):
+        self.cache.set(f"response:{key}", (content_type, content), self.timeout)
+
+    def get_versions(self, names: list[str]) -> list[int]:
+        versions = self.cache.get_many([f"version:{name}" for name in names])
+        return [versions.get(f"version:{name}", 0) for name in names]
+
+    def incr_version(self, name: str):
+        if not self.cache.add(f"version:{name}", 1, None):
+            self.cache.incr(f"version:{name}")
+
+    def clear(self):
+        pass
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = settings.RESPONSE_CACHE
+        _backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _backend
+
+
+def reset_response_cache():
+    global _backend
+    _backend = None
+
+
+def invalidate(*names: str):
+    """
+    Invalidates all cached responses that depend on one of the given versions, in all workers.
+    """
+    for name in names:
+        bus.publish("response_cache", name)
+
+
+bus.subscribe("response_cache", lambda name: get_backend().incr_version(name))
+bus.on_flush(lambda: get_backend().clear())
+
+
+def _normalize(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return value
+
+
+def cache_response(*versions: str, authorize: str = None):
+    """
+    Caches the rendered response of a GET view method per endpoint, user, tenant and query string.
+
+    ``versions`` are format strings that are filled in with the URL kwargs of the view,
+    e.g. ``"tenant:{uuid}"``. The version of the requesting user is part of the key.
+    Bumping any of the versions with ``invalidate`` makes all dependent entries unreachable,
+    they are evicted later by the backend.
+
+    Responses that don't depend on the user are shared by all users with ``authorize``, the name of a
+    view method that gets the request and the URL kwargs and raises if the user may not see the response.
+    It is called for every request before the cache is read, so concurrent misses of different users
+    are coalesced too.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE["ENABLED"] or not request.user.is_authenticated:
+                return func(self, request, *args, **kwargs)
+
+            backend = get_backend()
+            names = [] if authorize else [f"user:{request.user.pk}"]
+            names += [version.format(**{k: _normalize(v) for k, v in kwargs.items()}) for version in versions]
+            if authorize:
+                getattr(self, authorize)(request, **kwargs)
+            tenant = request.tenant.uuid if getattr(request, "tenant", None) else None
+            key = ":".join([
+                request.resolver_match.view_name,
+                "shared" if authorize else str(request.user.pk),
+                str(tenant),
+                request.accepted_media_type,
+                request.get_full_path(),
+                ".".join(map(str, backend.get_versions(names))),
+            ])
+
+            entry = backend.get(key)
+            if entry is not None:
+                return HttpResponse(entry[1], content_type=entry[0])
+
+            def compute():
+                response = func(self, request, *args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response, None
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = self.get_renderer_context()
+                response.render()
+                entry = (response["Content-Type"], response.content)
+                backend.set(key, *entry)
+                return response, entry
+
+            # Concurrent misses of the same key, e.g. after an invalidation, wait for one computation
+            (response, entry), shared = singleflight.do(("response_cache", key), compute)
+            if not shared:
+                return response
+            if entry is None:
+                return func(self, request, *args, **kwargs)
+            return HttpResponse(entry[1], content_type=entry[0])
+        return wrapper
+    return decorator
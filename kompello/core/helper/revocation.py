@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kompello.core.helper.invalidation_bus import bus
+from kompello.core.models.token_models import RevokedToken
+
+logger = logging.getLogger("kompello.revocation")
+
+
+class RevocationList:
+    """
+    Revoked refresh tokens, checked with a dict lookup.
+
+    The RevokedToken table is the source of truth. Every worker loads the revoked tokens that have not
+    expired on its first check and learns about later revocations through the invalidation bus.
+    Revoked tokens are dropped from memory and deleted from the table once they expired, at most once
+    per REVOCATION["SWEEP_INTERVAL"] seconds.
+
+    The first load holds a lock that the bus subscriber waits for, so a revocation that arrives while
+    the tokens are loaded is added once the load is done instead of being lost.
+    """
+
+    def __init__(self):
+        self._revoked = None
+        self._lock = threading.Lock()
+        self.last_sweep = 0
+
+    def is_revoked(self, jti: str) -> bool:
+        revoked = self._revoked
+        if revoked is None:
+            revoked = self._load()
+        return jti in revoked
+
+    def revoke(self, jti: str, exp: int) -> bool:
+        """
+        Revokes the token with the ``jti`` that expires at the timestamp ``exp``.
+        Returns False if the token was revoked already.
+        """
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=datetime.fromtimestamp(exp, tz=dt_timezone.utc))
+        except IntegrityError:
+            return False
+        bus.publish("revoked_tokens", f"{jti}:{exp}")
+        self.sweep()
+        return True
+
+    def sweep(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_sweep < settings.REVOCATION["SWEEP_INTERVAL"]:
+            return
+        self.last_sweep = now
+        with self._lock:
+            if self._revoked is not None:
+                expired = time.time()
+                self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > expired}
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+
+    def reset(self):
+        with self._lock:
+            self._revoked = None
+        self.last_sweep = 0
+
+    def _load(self) -> dict:
+        with self._lock:
+            if self._revoked is None:
+                self._revoked = {
+                    jti: expires_at.timestamp()
+                    for jti, expires_at in RevokedToken.objects.filter(expires_at__gt=timezone.now())
+                    .values_list("jti", "expires_at")
+                }
+            return self._revoked
+
+    def _add(self, key: str):
+        jti, _, exp = key.rpartition(":")
+        with self._lock:
+            # Before the first load the token is read from the table, which is written before the event is sent
+            if self._revoked is not None:
+                self._revoked[jti] = int(exp)
+
+
+revocations = RevocationList()
+
+bus.subscribe("revoked_tokens", revocations._add)
+bus.on_flush(revocations.reset)
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh token that is rejected once it is in the revocation list
+    """
+
+    def verify(self):
+        super().verify()
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            logger.warning("Revoked refresh token of user %s was used", self.payload.get(api_settings.USER_ID_CLAIM))
+            raise TokenError(_("Token is revoked"))
+
+
+class RotatingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refreshes with a refresh token that is not revoked. With ROTATE_REFRESH_TOKENS the response
+    contains a new refresh token and the used one is revoked, so every refresh token works only once.
+    """
+    token_class = RevocableRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # The token of the parent class already has the claims of the new refresh token
+            refresh = self.token_class(attrs["refresh"], verify=False)
+            if not revocations.revoke(refresh[api_settings.JTI_CLAIM], refresh["exp"]):
+                logger.warning("Refresh token of user %s was used concurrently", refresh.get(api_settings.USER_ID_CLAIM))
+                raise TokenError(_("Token is revoked"))
+        return data
@@ -0,0 +1,92 @@
+import enum
+from collections import defaultdict
+
+from django.db.models import OuterRef, Subquery
+
+from kompello.core.models.auth_models import TenantMembership, TenantRole
+
+
+class TenantPermission(enum.IntFlag):
+    VIEW_TENANT = enum.auto()
+    CHANGE_TENANT = enum.auto()
+    DELETE_TENANT = enum.auto()
+    VIEW_MEMBERS = enum.auto()
+    MANAGE_MEMBERS = enum.auto()
+    MANAGE_ROLES = enum.auto()
+
+
+NO_PERMISSIONS = TenantPermission(0)
+ALL_PERMISSIONS = ~NO_PERMISSIONS
+
+ROLE_PERMISSIONS = {
+    TenantRole.VIEWER: TenantPermission.VIEW_TENANT | TenantPermission.VIEW_MEMBERS,
+    TenantRole.MEMBER: (TenantPermission.VIEW_TENANT | TenantPermission.CHANGE_TENANT | TenantPermission.VIEW_MEMBERS
+                        | TenantPermission.MANAGE_MEMBERS),
+    TenantRole.OWNER: ALL_PERMISSIONS,
+}
+
+
+def permission_names(permissions: TenantPermission) -> list[str]:
+    return [permission.name.lower() for permission in TenantPermission if permission in permissions]
+
+
+def role_subquery(user):
+    """
+    Annotation with the role of ``user`` in every tenant of a Tenant queryset, None if it is no member
+    """
+    return Subquery(TenantMembership.objects.filter(tenant_id=OuterRef("pk"), kompellouser_id=user.pk).values("role"))
+
+
+def tenant_owners(tenant_pks) -> dict[int, set[int]]:
+    """
+    Returns the pks of the owners of the tenants by tenant pk, with one query
+    """
+    owners = defaultdict(set)
+    for tenant_pk, user_pk in TenantMembership.objects.filter(
+        tenant_id__in=tenant_pks, role=TenantRole.OWNER
+    ).values_list("tenant_id", "kompellouser_id"):
+        owners[tenant_pk].add(user_pk)
+    return owners
+
+
+def _load_role(user, tenant_pk: int) -> str or None: # type: ignore
+    return TenantMembership.objects.filter(
+        tenant_id=tenant_pk, kompellouser_id=user.pk
+    ).values_list("role", flat=True).first()
+
+
+def user_permissions(user, tenant_pk: int) -> TenantPermission:
+    """
+    Returns the permissions of the user in the tenant. Staff users have all permissions.
+    """
+    if user.is_staff:
+        return ALL_PERMISSIONS
+    return ROLE_PERMISSIONS.get(_load_role(user, tenant_pk), NO_PERMISSIONS)
+
+
+def tenant_permissions(request, tenant_pk: int) -> TenantPermission:
+    """
+    Returns the permissions of the user of the request in the tenant, like :func:`user_permissions`.
+
+    The role of the user in a tenant is loaded once per request, every following check is a bit test.
+    """
+    if request.user.is_staff:
+        return ALL_PERMISSIONS
+    roles = _roles(request)
+    if tenant_pk not in roles:
+        roles[tenant_pk] = _load_role(request.user, tenant_pk)
+    return ROLE_PERMISSIONS.get(roles[tenant_pk], NO_PERMISSIONS)
+
+
+def remember_roles(request, roles: dict[int, str or None]): # type: ignore
+    """
+    Caches the already loaded roles of the user of the request, by tenant pk, for :func:`tenant_permissions`
+    """
+    _roles(request).update(roles)
+
+
+def _roles(request) -> dict:
+    roles = getattr(request, "_tenant_roles", None)
+    if roles is None:
+        roles = request._tenant_roles = {}
+    return roles
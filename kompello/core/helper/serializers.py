@@ -1,5 +1,83 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
 from rest_framework import serializers
+from rest_framework.request import Request
+
+FIELDS_PARAMETER = OpenApiParameter("fields", OpenApiTypes.STR,
+                                    description="Comma separated names of the fields to return, all by default")
 
 
 class SimpleResponseSerializer(serializers.Serializer):
     message = serializers.CharField()
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin that only returns the fields given as ``fields`` argument
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def sparse_fields(request: Request, serializer_class) -> list[str] or None: # type: ignore
+    """
+    Returns the fields of the ``?fields=`` parameter, or None if all fields are requested.
+    Fields the serializer can't return are rejected.
+    """
+    value = request.query_params.get("fields")
+    if value is None:
+        return None
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    readable = {name for name, field in serializer_class().fields.items() if not field.write_only}
+    unknown = [name for name in fields if name not in readable]
+    if unknown:
+        raise serializers.ValidationError({"fields": [f"Unknown fields: {', '.join(unknown)}"]})
+    if not fields:
+        raise serializers.ValidationError({"fields": ["At least one field is required"]})
+    return fields
+
+
+def only_fields(queryset: QuerySet, serializer_class, fields: list[str] or None) -> QuerySet: # type: ignore
+    """
+    Restricts the columns the queryset loads to the ones read by the given fields of the serializer.
+    The queryset is returned unchanged if one of the fields isn't a plain column.
+    """
+    if fields is None:
+        return queryset
+    serializer_fields = serializer_class().fields
+    columns = []
+    for name in fields:
+        try:
+            field = queryset.model._meta.get_field(serializer_fields[name].source)
+        except FieldDoesNotExist:
+            return queryset
+        if not field.concrete or field.many_to_many:
+            return queryset
+        columns.append(field.name)
+    return queryset.only(*columns)
+
+
+class SparseFieldsetMixin:
+    """
+    Viewset mixin for serializers with :class:`SparseFieldsMixin` that applies the ``?fields=`` parameter
+    to the serializer and the queryset of the ``sparse_fieldset_actions``
+    """
+    sparse_fieldset_actions = ("list", "retrieve")
+
+    def get_sparse_fields(self) -> list[str] or None: # type: ignore
+        if self.action not in self.sparse_fieldset_actions:
+            return None
+        return sparse_fields(self.request, self.get_serializer_class())
+
+    def get_queryset(self):
+        return only_fields(super().get_queryset(), self.get_serializer_class(), self.get_sparse_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
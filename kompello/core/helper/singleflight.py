@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import weakref
+
+from django.conf import settings
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Singleflight:
+    """
+    Runs one call per key at a time. Callers that ask for a key while its call is in flight wait
+    for it and share its result instead of running the same work again.
+
+    :meth:`do` coalesces threads, :meth:`ado` coroutines of the same event loop. Followers wait at most
+    SINGLEFLIGHT["TIMEOUT"] seconds and then run the call themselves, so a stuck leader can't block them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._futures = weakref.WeakKeyDictionary()
+
+    def do(self, key, func) -> tuple[object, bool]:
+        """
+        Returns the result of ``func()`` and whether it was shared with the call of another thread
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(settings.SINGLEFLIGHT["TIMEOUT"]):
+                return func(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, func) -> tuple[object, bool]:
+        """
+        Returns the result of ``await func()`` and whether it was shared with another coroutine
+        """
+        futures = self._futures.setdefault(asyncio.get_running_loop(), {})
+        future = futures.get(key)
+        if future is not None:
+            await asyncio.wait({future}, timeout=settings.SINGLEFLIGHT["TIMEOUT"])
+            # The leader was cancelled, e.g. by a disconnected client, or is too slow
+            if not future.done() or future.cancelled():
+                return await func(), False
+            return future.result(), True
+
+        future = futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await func()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Marks the exception as retrieved when there are no followers
+            future.exception()
+            raise
+        finally:
+            del futures[key]
+
+
+singleflight = Singleflight()
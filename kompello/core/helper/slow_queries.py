@@ -0,0 +1,135 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from django.conf import settings
+
+from kompello.core.helper.metrics import current_timings
+
+logger = logging.getLogger("kompello.slow_queries")
+
+_PACKAGE_DIR = Path(__file__).resolve().parent.parent.parent
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Replaces literals with placeholders and collapses placeholder lists,
+    so that all executions of the same query share one normalized form.
+    """
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    return _PLACEHOLDER_LIST_RE.sub("(...)", sql)
+
+
+def _caller() -> str or None: # type: ignore
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(str(_PACKAGE_DIR)) and frame.filename != __file__:
+            return f"{Path(frame.filename).relative_to(_PACKAGE_DIR.parent)}:{frame.lineno} in {frame.name}"
+    return None
+
+
+class SlowQueryLog:
+    """
+    Collects queries that take longer than SLOW_QUERIES["THRESHOLD"] seconds.
+
+    Every slow query is written to the ``kompello.slow_queries`` logger as JSON and
+    aggregated per normalized SQL, with the types of its parameters but not their values. Only the TOP_N normalized queries with the highest
+    duration are kept in memory. The query plan is captured for the first occurrence of
+    a normalized query and for a sample of the following ones.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        if getattr(self._local, "active", False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= settings.SLOW_QUERIES["THRESHOLD"]:
+                self._local.active = True
+                try:
+                    self.record(sql, params, many, duration, context["connection"])
+                finally:
+                    self._local.active = False
+
+    def record(self, sql, params, many, duration, connection):
+        normalized = normalize_sql(sql)
+        timings = current_timings.get()
+        record = {
+            "sql": normalized,
+            # Only the types, the values can be emails, password hashes or tokens
+            "params": None if many else [type(param).__name__ for param in params or ()],
+            "duration": duration,
+            "view": timings.view_name if timings else None,
+            "caller": _caller(),
+        }
+
+        entry = self._entries.get(normalized)
+        if not many and (entry is None or random.random() < settings.SLOW_QUERIES["EXPLAIN_SAMPLE_RATE"]):
+            record["plan"] = self.explain(sql, params, connection)
+        logger.warning(json.dumps(record, default=str))
+
+        with self._lock:
+            entry = self._entries.get(normalized)
+            if entry is None:
+                entry = self._entries[normalized] = {"sql": normalized, "count": 0, "total": 0.0, "max": 0.0, "plan": None}
+            entry.update(params=record["params"], view=record["view"], caller=record["caller"])
+            entry["count"] += 1
+            entry["total"] += duration
+            entry["max"] = max(entry["max"], duration)
+            if record.get("plan") is not None:
+                entry["plan"] = record["plan"]
+            self._trim()
+
+    @staticmethod
+    def explain(sql, params, connection) -> list[str] or None: # type: ignore
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+
+    def _trim(self):
+        top_n = settings.SLOW_QUERIES["TOP_N"]
+        if len(self._entries) > top_n:
+            for normalized, _ in sorted(self._entries.items(), key=lambda item: item[1]["max"])[:-top_n]:
+                del self._entries[normalized]
+
+    def top(self) -> list[dict]:
+        with self._lock:
+            return sorted((dict(entry) for entry in self._entries.values()), key=lambda entry: entry["max"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def install(sender, connection, **kwargs):
+    """
+    connection_created receiver that instruments every new database connection.
+    The wrapper is inserted at the front, because wrappers installed with the
+    connection.execute_wrapper() context manager remove the last one on exit.
+    """
+    if slow_query_log.execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_log.execute_wrapper)
@@ -0,0 +1,181 @@
+import json
+import uuid as uuid
+from itertools import groupby, islice
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils.dateparse import parse_datetime
+
+from kompello.core.helper.memberships import record_membership_changes
+from kompello.core.helper.response_cache import invalidate
+from kompello.core.models.auth_models import (KompelloUser, KompelloUserSocialAuths, Tenant, TenantMembership,
+                                              TenantRole)
+
+FORMAT = "kompello-tenant-snapshot"
+VERSION = 1
+CHUNK_SIZE = 2000
+
+USER_FIELDS = ("uuid", "username", "email", "password", "first_name", "last_name", "is_active", "date_joined",
+               "last_login")
+LOG_ENTRY_FIELDS = ("object_repr", "serialized_data", "action", "changes", "remote_addr", "timestamp",
+                    "additional_data")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def export_tenant(tenant: Tenant, file):
+    """
+    Writes the tenant, its users with their social auths and the audit history of both as NDJSON lines
+    to the text ``file``. The first line is a header with the format version and the tenant.
+    All rows are read with iterators, so the memory use doesn't grow with the size of the tenant.
+    """
+    def write(record):
+        file.write(json.dumps(record, cls=DjangoJSONEncoder))
+        file.write("\n")
+
+    write({"format": FORMAT, "version": VERSION, "tenant": {"uuid": tenant.uuid, "slug": tenant.slug,
+                                                            "name": tenant.name}})
+
+    members = TenantMembership.objects.filter(tenant_id=tenant.pk).values("kompellouser_id")
+    users = KompelloUser.objects.filter(pk__in=members).annotate(role=Subquery(
+        TenantMembership.objects.filter(tenant_id=tenant.pk, kompellouser_id=OuterRef("pk")).values("role")
+    ))
+    for user in users.order_by("pk").values(*USER_FIELDS, "role").iterator(CHUNK_SIZE):
+        write({"type": "user", **user})
+
+    for social_auth in KompelloUserSocialAuths.objects.filter(user__in=members).order_by("pk").values(
+            "user__uuid", "provider", "sub").iterator(CHUNK_SIZE):
+        write({"type": "social_auth", "user": social_auth["user__uuid"], "provider": social_auth["provider"],
+               "sub": social_auth["sub"]})
+
+    for model, pks in ((Tenant, [tenant.pk]), (KompelloUser, members)):
+        entries = LogEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(model), object_id__in=pks
+        ).annotate(
+            object_uuid=Subquery(model.objects.filter(pk=OuterRef("object_id")).values("uuid"))
+        ).order_by("pk").values("object_uuid", "actor__email", *LOG_ENTRY_FIELDS)
+        for entry in entries.iterator(CHUNK_SIZE):
+            write({"type": "log_entry", "model": model._meta.label_lower, "object": entry.pop("object_uuid"),
+                   "actor": entry.pop("actor__email"), **entry})
+
+
+def import_tenant(file, clone: bool = False) -> Tenant:
+    """
+    Imports a snapshot written by :func:`export_tenant` from the text ``file`` in one transaction.
+    The records are read lazily and inserted in chunks of CHUNK_SIZE.
+
+    Users are matched by email, existing users are added to the tenant but not changed.
+    Staff and superuser rights are never imported. With ``clone`` the tenant gets a new uuid,
+    otherwise importing a tenant that already exists fails.
+    """
+    records = (json.loads(line) for line in file if line.strip())
+    header = _check_header(next(records, None))
+
+    with transaction.atomic():
+        tenant_uuid = uuid.uuid4() if clone else uuid.UUID(header["tenant"]["uuid"])
+        if Tenant.all_objects.filter(uuid=tenant_uuid).exists():
+            raise SnapshotError(f"Tenant {tenant_uuid} already exists")
+        tenant = Tenant.objects.create(uuid=tenant_uuid, slug=header["tenant"]["slug"], name=header["tenant"]["name"])
+
+        # Maps the uuids of the users in the snapshot to their pk and whether they were created by the import
+        users = {}
+        handlers = {
+            "user": lambda chunk: users.update(_import_users(tenant, chunk)),
+            "social_auth": lambda chunk: _import_social_auths(users, chunk),
+            "log_entry": lambda chunk: _import_log_entries(tenant, users, chunk),
+        }
+        for type, group in groupby(records, key=lambda record: record.get("type")):
+            if type not in handlers:
+                raise SnapshotError(f"Unknown record type {type}")
+            while chunk := list(islice(group, CHUNK_SIZE)):
+                try:
+                    handlers[type](chunk)
+                except (KeyError, TypeError) as e:
+                    raise SnapshotError(f"Invalid {type} record: {e!r}")
+
+    invalidate("tenants", "users")
+    return tenant
+
+
+def _check_header(header) -> dict:
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise SnapshotError("Not a tenant snapshot")
+    version = header.get("version")
+    if not isinstance(version, int):
+        raise SnapshotError("The snapshot has no version")
+    if version > VERSION:
+        raise SnapshotError(f"Snapshot version {version} is newer than the supported version {VERSION}")
+    tenant = header.get("tenant")
+    if not isinstance(tenant, dict) or not all(isinstance(tenant.get(name), str) for name in ("uuid", "slug", "name")):
+        raise SnapshotError("The snapshot has no tenant")
+    return header
+
+
+def _import_users(tenant, chunk) -> dict:
+    # Soft deleted users keep their email and username until they are removed
+    existing = dict(KompelloUser.all_objects.filter(email__in=[user["email"] for user in chunk])
+                    .values_list("email", "pk"))
+    taken = set(KompelloUser.all_objects.filter(username__in=[user["username"] for user in chunk])
+                .values_list("username", flat=True))
+    # The uuids of other users, e.g. in a snapshot imported again with --clone, are replaced.
+    # The records of the snapshot still refer to the users by the uuids of the snapshot.
+    taken_uuids = {str(user_uuid) for user_uuid in KompelloUser.all_objects.filter(
+        uuid__in=[user["uuid"] for user in chunk]
+    ).values_list("uuid", flat=True)}
+    new = []
+    for user in chunk:
+        if user["email"] in existing:
+            continue
+        fields = {name: user[name] for name in USER_FIELDS}
+        fields["date_joined"] = parse_datetime(fields["date_joined"])
+        fields["last_login"] = fields["last_login"] and parse_datetime(fields["last_login"])
+        if fields["username"] in taken:
+            fields["username"] = fields["email"]
+        if fields["uuid"] in taken_uuids:
+            fields["uuid"] = uuid.uuid4()
+        new.append(KompelloUser(**fields))
+    created = KompelloUser.objects.bulk_create(new)
+
+    pks = {user.email: user.pk for user in created} | existing
+    TenantMembership.objects.bulk_create([
+        # Snapshots written before there were roles have none
+        TenantMembership(tenant_id=tenant.pk, kompellouser_id=pks[user["email"]],
+                         role=user.get("role", TenantRole.MEMBER))
+        for user in chunk
+    ], ignore_conflicts=True)
+    record_membership_changes([(tenant.pk, pks[user["email"]]) for user in chunk], removed=False)
+    return {user["uuid"]: (pks[user["email"]], user["email"] not in existing) for user in chunk}
+
+
+def _import_social_auths(users, chunk):
+    KompelloUserSocialAuths.objects.bulk_create([
+        KompelloUserSocialAuths(user_id=users[social_auth["user"]][0], provider=social_auth["provider"],
+                                sub=social_auth["sub"])
+        for social_auth in chunk if users.get(social_auth["user"], (None, False))[1]
+    ])
+
+
+def _import_log_entries(tenant, users, chunk):
+    content_types = {model._meta.label_lower: ContentType.objects.get_for_model(model)
+                     for model in (Tenant, KompelloUser)}
+    actors = dict(KompelloUser.objects.filter(email__in={entry["actor"] for entry in chunk if entry["actor"]})
+                  .values_list("email", "pk"))
+    entries = []
+    for entry in chunk:
+        if entry["model"] == Tenant._meta.label_lower:
+            object_id = tenant.pk
+        elif entry["object"] in users and users[entry["object"]][1]:
+            object_id = users[entry["object"]][0]
+        else:
+            # The history of users that already existed stays the one of this instance
+            continue
+        fields = {name: entry[name] for name in LOG_ENTRY_FIELDS}
+        fields["timestamp"] = parse_datetime(fields["timestamp"])
+        entries.append(LogEntry(content_type=content_types[entry["model"]], object_id=object_id,
+                                object_pk=str(object_id), actor_id=actors.get(entry["actor"]), **fields))
+    LogEntry.objects.bulk_create(entries)
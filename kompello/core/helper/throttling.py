@@ -0,0 +1,155 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Seconds between the sweeps of the buckets that are full again
+SWEEP_INTERVAL = 60
+
+
+class TokenBucketStore:
+    """
+    Process local token buckets.
+
+    Every bucket is stored as an immutable ``(tokens, timestamp, full_at)`` tuple,
+    so a bucket is replaced with a single dict assignment and no lock is needed.
+    Two threads racing on the same bucket can at worst let one extra request
+    through, which is acceptable for throttling.
+
+    Buckets that are full again are the same as new ones, they are dropped every
+    SWEEP_INTERVAL seconds, so keys of random usernames or IPs don't stay in memory.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._next_sweep = 0
+
+    def consume(self, key: str, capacity: int, duration: int, now: float) -> float:
+        """
+        Takes one token from the bucket and returns 0, or returns the number of
+        seconds until the next token is available if the bucket is empty.
+        """
+        self._sweep(now)
+        tokens, stamp, _ = self._buckets.get(key, (capacity, now, now))
+        tokens, wait = _take(tokens, stamp, capacity, duration, now)
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) * duration / capacity)
+        return wait
+
+    def _sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        for key, bucket in list(self._buckets.items()):
+            if self._expires(bucket) <= now:
+                self._buckets.pop(key, None)
+
+    @staticmethod
+    def _expires(bucket) -> float:
+        return bucket[2]
+
+
+class SharedTokenBucketStore(TokenBucketStore):
+    """
+    Token buckets kept in a Django cache so that all workers share them.
+
+    The local buckets only remember when a bucket ran empty, so a worker can
+    reject follow up requests without asking the cache again.
+    """
+
+    def __init__(self, cache_alias: str):
+        super().__init__()
+        self.cache = caches[cache_alias]
+
+    def consume(self, key: str, capacity: int, duration: int, now: float) -> float:
+        self._sweep(now)
+        empty_until = self._buckets.get(key)
+        if empty_until is not None and empty_until > now:
+            return empty_until - now
+
+        tokens, stamp = self.cache.get(f"throttle:{key}", (capacity, now))
+        tokens, wait = _take(tokens, stamp, capacity, duration, now)
+        self.cache.set(f"throttle:{key}", (tokens, now), duration)
+        if wait:
+            self._buckets[key] = now + wait
+        else:
+            self._buckets.pop(key, None)
+        return wait
+
+    @staticmethod
+    def _expires(bucket) -> float:
+        return bucket
+
+
+def _take(tokens: float, stamp: float, capacity: int, duration: int, now: float) -> tuple[float, float]:
+    refill = capacity / duration
+    tokens = min(capacity, tokens + (now - stamp) * refill)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / refill
+
+
+_store = None
+
+
+def get_store() -> TokenBucketStore:
+    global _store
+    if _store is None:
+        cache_alias = settings.REST_FRAMEWORK.get("TOKEN_BUCKET_CACHE")
+        _store = SharedTokenBucketStore(cache_alias) if cache_alias else TokenBucketStore()
+    return _store
+
+
+def reset_throttles():
+    global _store
+    _store = None
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Throttles the anonymous authentication endpoints.
+
+    The request has to pass a per IP, a per username and a global token bucket,
+    checked in that order. The rates are configured in
+    ``REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`` with the scopes ``auth.ip``,
+    ``auth.username`` and ``auth.global`` and use the DRF rate format, where
+    ``10/min`` is a bucket of 10 tokens that refills completely in one minute.
+    Throttles run before the view, so rejected requests never reach the
+    password hasher or the OIDC provider.
+    """
+    timer = time.time
+
+    def __init__(self):
+        self.wait_time = 0
+
+    def get_buckets(self, request) -> list[tuple[str, str]]:
+        buckets = [("auth.ip", self.get_ident(request))]
+        data = request.data if isinstance(request.data, dict) else {}
+        username = data.get("username") or data.get("email")
+        if isinstance(username, str) and username:
+            buckets.append(("auth.username", username.lower()))
+        buckets.append(("auth.global", "all"))
+        return buckets
+
+    def allow_request(self, request, view):
+        store = get_store()
+        now = self.timer()
+        for scope, ident in self.get_buckets(request):
+            rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+            if rate is None:
+                continue
+            capacity, duration = self.parse_rate(rate)
+            self.wait_time = store.consume(f"{scope}:{ident}", capacity, duration, now)
+            if self.wait_time:
+                return False
+        return True
+
+    @staticmethod
+    def parse_rate(rate: str) -> tuple[int, int]:
+        num, period = rate.split('/')
+        return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+    def wait(self):
+        return math.ceil(self.wait_time)
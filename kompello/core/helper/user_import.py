@@ -0,0 +1,169 @@
+import codecs
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from kompello.core.helper.memberships import add_memberships
+from kompello.core.helper.response_cache import invalidate
+from kompello.core.models.auth_models import KompelloUser, Tenant
+
+FIELDS = ("email", "first_name", "last_name")
+
+
+def read_rows(lines, format: str):
+    """
+    Yields ``(row number, dict)`` for every row of the CSV or NDJSON ``lines``, an iterable of bytes.
+    The rows are decoded one by one, so the file is never loaded into memory.
+    """
+    lines = codecs.iterdecode(lines, "utf-8-sig")
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = e
+        yield number, row
+
+
+def _hash(password: str) -> str:
+    return make_password(password)
+
+
+class UserImporter:
+    """
+    Creates users from rows with an email, a first and last name and either a ``password``,
+    an already hashed ``password_hash`` or neither for invite-only users with an unusable password.
+
+    The rows are validated and created in chunks of USER_IMPORT["CHUNK_SIZE"], every chunk with one
+    query for the existing emails and one bulk insert. Passwords are hashed by a pool of
+    USER_IMPORT["HASH_WORKERS"] spawned processes, 0 hashes them in the importing process.
+    The created users are added to ``tenant`` if it is given.
+    """
+
+    def __init__(self, tenant: Tenant = None):
+        self.tenant = tenant
+        self.chunk_size = settings.USER_IMPORT["CHUNK_SIZE"]
+        self.workers = settings.USER_IMPORT["HASH_WORKERS"]
+        self.created = 0
+        self.errors = []
+        self._seen = set()
+        self._pool = None
+        # Unusable passwords never match, so the invite-only users can share one
+        self._unusable_password = make_password(None)
+
+    def run(self, rows) -> dict:
+        try:
+            chunk = []
+            for number, row in rows:
+                chunk.append((number, row))
+                if len(chunk) == self.chunk_size:
+                    self._import(chunk)
+                    chunk = []
+            if chunk:
+                self._import(chunk)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+        if self.created:
+            invalidate("users")
+        return {"created": self.created, "errors": self.errors}
+
+    @staticmethod
+    def _validate(row) -> tuple[dict, dict]:
+        if not isinstance(row, dict):
+            return {}, {"row": [f"Invalid row: {row}"]}
+
+        values, errors = {}, {}
+        for name in FIELDS:
+            try:
+                values[name] = KompelloUser._meta.get_field(name).clean(str(row.get(name) or "").strip(), None)
+            except ValidationError as e:
+                errors[name] = e.messages
+        if row.get("password") and row.get("password_hash"):
+            errors["password"] = ["Only one of password and password_hash can be given"]
+        elif row.get("password_hash"):
+            try:
+                identify_hasher(row["password_hash"])
+                values["password_hash"] = row["password_hash"]
+            except ValueError:
+                errors["password_hash"] = ["Unknown password hash format"]
+        elif row.get("password"):
+            values["password"] = row["password"]
+        return values, errors
+
+    def _import(self, chunk):
+        valid, errors_before = [], len(self.errors)
+        for number, row in chunk:
+            values, errors = self._validate(row)
+            if not errors:
+                email = values["email"].lower()
+                if email in self._seen:
+                    errors["email"] = ["Duplicate email in the file"]
+                self._seen.add(email)
+            if errors:
+                self.errors.append({"row": number, "errors": errors})
+            else:
+                valid.append((number, values))
+
+        # The email is the username of the imported users as well, both are compared case-insensitively.
+        # Soft deleted users keep their email until they are removed.
+        emails = [values["email"].lower() for _, values in valid]
+        existing = {}
+        for email, username in KompelloUser.all_objects.annotate(
+            lower_email=Lower("email"), lower_username=Lower("username")
+        ).filter(Q(lower_email__in=emails) | Q(lower_username__in=emails)).values_list("lower_email", "lower_username"):
+            existing[username] = "A user with this email as username already exists"
+            existing[email] = "A user with this email already exists"
+        for number, values in valid:
+            if values["email"].lower() in existing:
+                self.errors.append({"row": number, "errors": {"email": [existing[values["email"].lower()]]}})
+        valid = [(number, values) for number, values in valid if values["email"].lower() not in existing]
+        self.errors[errors_before:] = sorted(self.errors[errors_before:], key=lambda error: error["row"])
+        if not valid:
+            return
+
+        hashes = iter(self._hash([values["password"] for _, values in valid if "password" in values]))
+        users = []
+        for _, values in valid:
+            if "password" in values:
+                password = next(hashes)
+            else:
+                password = values.get("password_hash") or self._unusable_password
+            users.append(KompelloUser(username=values["email"], email=values["email"], password=password,
+                                      first_name=values["first_name"], last_name=values["last_name"]))
+        with transaction.atomic():
+            users = KompelloUser.objects.bulk_create(users)
+            if self.tenant is not None:
+                add_memberships({(self.tenant.pk, user.pk) for user in users}, {self.tenant.pk: self.tenant.uuid})
+        self.created += len(users)
+
+    def _hash(self, passwords: list[str]) -> list[str]:
+        if not passwords:
+            return []
+        if self.workers == 0 or len(passwords) == 1:
+            return [make_password(password) for password in passwords]
+        workers = self.workers or os.cpu_count()
+        if self._pool is None:
+            # Forking the threads of a gunicorn worker could copy locks that other threads hold, spawned
+            # workers start a fresh interpreter and set up Django with the settings module of the environment
+            self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=django.setup)
+        return list(self._pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
@@ -0,0 +1,10 @@
+from kompello.core.helper.invalidation_bus import bus
+
+
+class InvalidationBusMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        bus.poll()
+        return self.get_response(request)
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from kompello.core.helper.benchmark import (SCENARIOS, compare, compare_codecs, compare_middleware, remove,
+                                           run_http, run_in_process, seed)
+
+
+class Command(BaseCommand):
+    help = "Seeds a dataset and measures latency, throughput and queries per request of every API endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=100)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--memberships", type=int, default=3, help="Tenants per user")
+        parser.add_argument("--social", type=float, default=0.2, help="Share of users with a social identity")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=8, help="Client threads for --url")
+        parser.add_argument("--url", help="Also benchmark the server at this URL over HTTP")
+        parser.add_argument(
+            "--database", choices=["test", "default"], default="test",
+            help="Seed a temporary test database or the configured one, which is only used with --url. "
+                 "The dataset is removed from the configured database after the run."
+        )
+        parser.add_argument("--codecs", action="store_true",
+                            help="Also compare the payload size and encode/decode time of JSON and MessagePack")
+        parser.add_argument("--middleware", action="store_true",
+                            help="Also compare the latency with the full middleware stack and the middleware profiles")
+        parser.add_argument("--output", help="Write the results to this file instead of stdout")
+        parser.add_argument("--baseline", help="Fail if the results are worse than the results in this file")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 latency growth against --baseline")
+
+    def handle(self, *args, **options):
+        if options["url"] and options["database"] == "test":
+            raise CommandError("--url needs --database default, the server can't see the test database")
+        if options["database"] == "default" and not options["url"]:
+            raise CommandError("--database default needs --url, the test database is enough without a server")
+
+        old_name = None
+        if options["database"] == "test":
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        dataset = None
+        try:
+            dataset = seed(options["tenants"], options["users"], options["memberships"], options["social"],
+                           options["seed"])
+            results = {
+                "meta": {key: options[key] for key in ("tenants", "users", "memberships", "social", "seed",
+                                                       "requests", "concurrency", "url")},
+                "results": {"in_process": run_in_process(dataset, SCENARIOS, options["requests"])},
+            }
+            if options["middleware"]:
+                results["middleware"] = compare_middleware(dataset, SCENARIOS, options["requests"])
+            if options["codecs"]:
+                results["codecs"] = compare_codecs(dataset, options["requests"])
+            if options["url"]:
+                results["results"]["http"] = run_http(options["url"], dataset, SCENARIOS, options["requests"],
+                                                      options["concurrency"])
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            elif dataset is not None:
+                remove(dataset)
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"], "r") as file:
+                regressions = compare(json.load(file), results, options["tolerance"])
+            if regressions:
+                raise CommandError("Performance regressions:\n" + "\n".join(regressions))
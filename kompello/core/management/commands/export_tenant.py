@@ -0,0 +1,28 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kompello.core.helper.snapshot import export_tenant
+from kompello.core.models.auth_models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Exports a tenant with its users and audit history as a gzip compressed snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("tenant", help="Uuid of the tenant")
+        parser.add_argument("output", help="Snapshot file, - writes to stdout")
+
+    def handle(self, *args, **options):
+        tenant = Tenant.objects.filter(uuid=options["tenant"]).first()
+        if tenant is None:
+            raise CommandError(f"Tenant {options['tenant']} not found")
+
+        output = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            with gzip.open(output, "wt", encoding="utf-8") as file:
+                export_tenant(tenant, file)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
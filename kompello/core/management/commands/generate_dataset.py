@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kompello.core.helper.dataset import DEFAULT_PASSWORD, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = "Bulk inserts a reproducible synthetic dataset of users, tenants, memberships, social auths and audit history"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--tenants", type=int, default=100)
+        parser.add_argument("--memberships", type=int, default=3, help="Tenants per user")
+        parser.add_argument("--social", type=float, default=0.2, help="Share of users with a social identity")
+        parser.add_argument("--history", type=int, default=0, help="Update audit entries per user and tenant")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password of every generated user")
+        parser.add_argument("--prefix", default="gen", help="Prefix of the usernames, emails and slugs")
+
+    def handle(self, *args, **options):
+        generator = DatasetGenerator(options["users"], options["tenants"], options["memberships"], options["social"],
+                                     options["history"], options["seed"], options["batch_size"], options["password"],
+                                     options["prefix"])
+        started = step_started = last = time.perf_counter()
+        current = None
+        for step, done, total in generator.run():
+            if step != current:
+                current, step_started = step, last
+            last = time.perf_counter()
+            elapsed = last - step_started
+            self.stdout.write(f"{step}: {done}{f'/{total}' if total is not None else ''} "
+                              f"({done / elapsed if elapsed else 0:.0f} rows/s)")
+        self.stdout.write(self.style.SUCCESS(f"Generated the dataset in {time.perf_counter() - started:.1f}s"))
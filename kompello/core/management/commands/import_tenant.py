@@ -0,0 +1,26 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kompello.core.helper.snapshot import SnapshotError, import_tenant
+
+
+class Command(BaseCommand):
+    help = "Imports a tenant snapshot written by export_tenant"
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Snapshot file, - reads from stdin")
+        parser.add_argument("--clone", action="store_true", help="Import the tenant with a new uuid")
+
+    def handle(self, *args, **options):
+        source = sys.stdin.buffer if options["input"] == "-" else open(options["input"], "rb")
+        try:
+            with gzip.open(source, "rt", encoding="utf-8") as file:
+                tenant = import_tenant(file, clone=options["clone"])
+        except (SnapshotError, OSError, ValueError) as e:
+            raise CommandError(f"Can't import the snapshot: {e}")
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        self.stdout.write(self.style.SUCCESS(f"Imported tenant {tenant.uuid}"))
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from kompello.core.helper.deletion import DeletionWorker
+from kompello.core.models.job_models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Removes soft deleted users and tenants and their dependent rows in chunks, resuming interrupted jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run the pending jobs and exit instead of polling")
+        parser.add_argument("--chunk-size", type=int, help="Rows per chunk, defaults to DELETION['CHUNK_SIZE']")
+        parser.add_argument("--pause", type=float, help="Seconds between the chunks, defaults to DELETION['PAUSE']")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Continue the failed jobs with the step they failed in")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            retried = DeletionJob.objects.filter(status=DeletionJob.Status.FAILED).update(
+                status=DeletionJob.Status.RUNNING, error=""
+            )
+            self.stdout.write(f"Retrying {retried} failed jobs")
+
+        worker = DeletionWorker(options["chunk_size"], options["pause"])
+        while True:
+            count = worker.run_pending()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} deletion jobs"))
+            if options["once"]:
+                return
+            close_old_connections()
+            time.sleep(settings.DELETION["POLL_INTERVAL"])
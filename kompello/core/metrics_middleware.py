@@ -0,0 +1,66 @@
+import time
+
+from django.db import connection
+
+from kompello.core.helper.metrics import (REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_DURATION, REQUESTS,
+                                          RESPONSE_SIZE, RequestTimings, current_timings)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, database queries and response size per resolved URL name
+    and reports the phases of the request in a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with connection.execute_wrapper(timings.execute_wrapper):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        end = time.perf_counter()
+        duration = end - start
+        if timings.view is None:
+            timings.view = end - timings.view_start if timings.view_start else 0
+
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        REQUEST_DURATION.observe(view, request.method, value=duration)
+        REQUEST_DB_DURATION.observe(view, value=timings.db)
+        REQUEST_DB_QUERIES.observe(view, value=timings.queries)
+        REQUESTS.inc(view, request.method, str(response.status_code))
+        if not response.streaming:
+            RESPONSE_SIZE.observe(view, value=len(response.content))
+
+        serialize = max(timings.view - timings.db - timings.auth, 0)
+        response["Server-Timing"] = ", ".join([
+            f"db;dur={timings.db * 1000:.2f}",
+            f"auth;dur={timings.auth * 1000:.2f}",
+            f"serialize;dur={serialize * 1000:.2f}",
+            f"render;dur={timings.render * 1000:.2f}",
+            f"total;dur={duration * 1000:.2f}",
+        ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current_timings.get()
+        if timings is not None:
+            timings.view_name = request.resolver_match.view_name
+            timings.view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = current_timings.get()
+        if timings is not None and timings.view_start:
+            render_start = time.perf_counter()
+            timings.view = render_start - timings.view_start
+
+            def rendered(response):
+                timings.render = time.perf_counter() - render_start
+
+            response.add_post_render_callback(rendered)
+        return response
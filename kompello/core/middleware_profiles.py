@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+
+class MiddlewareProfile:
+    """
+    Chain of middleware for the requests whose path starts with one of ``paths``
+    """
+
+    def __init__(self, name: str, paths, excluded_paths, middleware: list[str], get_response):
+        self.name = name
+        self.paths = tuple(paths)
+        self.excluded_paths = tuple(excluded_paths)
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+        # Built like the chain of the handler in django.core.handlers.base.BaseHandler.load_middleware
+        handler = get_response
+        for path in reversed(middleware):
+            try:
+                instance = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, "process_view"):
+                self.view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, "process_template_response"):
+                self.template_response_middleware.append(instance.process_template_response)
+            if hasattr(instance, "process_exception"):
+                self.exception_middleware.append(instance.process_exception)
+            handler = convert_exception_to_response(instance)
+        self.handler = handler
+
+    def matches(self, path: str) -> bool:
+        return path.startswith(self.paths) and not (self.excluded_paths and path.startswith(self.excluded_paths))
+
+
+class MiddlewareProfileRouter:
+    """
+    Runs a request through the middleware of the first profile in MIDDLEWARE_PROFILES that matches its path,
+    so the API can skip the session, CSRF and message middleware that only the HTML pages need.
+
+    The handler only knows the router, so it passes the view, template response and exception hooks
+    on to the middleware of the profile the request went through.
+    """
+
+    def __init__(self, get_response):
+        self.profiles = [
+            MiddlewareProfile(name, profile["PATHS"], profile.get("EXCLUDED_PATHS", ()), profile["MIDDLEWARE"],
+                              get_response)
+            for name, profile in settings.MIDDLEWARE_PROFILES.items()
+        ]
+
+    def __call__(self, request):
+        profile = next(profile for profile in self.profiles if profile.matches(request.path_info))
+        request.middleware_profile = profile
+        return profile.handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in request.middleware_profile.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+    def process_template_response(self, request, response):
+        for process_template_response in request.middleware_profile.template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for process_exception in request.middleware_profile.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-19 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvalidationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=32)),
+                ('topic', models.CharField(max_length=64)),
+                ('key', models.CharField(max_length=255)),
+                ('created_on', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
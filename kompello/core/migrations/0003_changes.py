@@ -0,0 +1,66 @@
+# Generated by Django 5.0.2 on 2026-10-19 02:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def track_existing_memberships(apps, schema_editor):
+    Tenant = apps.get_model("core", "Tenant")
+    MembershipChange = apps.get_model("core", "MembershipChange")
+    memberships = Tenant.users.through.objects.values_list("tenant_id", "kompellouser_id").iterator(chunk_size=2000)
+    batch = []
+    for tenant_id, user_id in memberships:
+        batch.append(MembershipChange(tenant_id=tenant_id, user_id=user_id))
+        if len(batch) == 2000:
+            MembershipChange.objects.bulk_create(batch)
+            batch = []
+    MembershipChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_invalidationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32)),
+                ('object_uuid', models.UUIDField()),
+                ('modified_on', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='kompellouser',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='kompellousersocialauths',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='tenant',
+            name='modified_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='MembershipChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('removed', models.BooleanField(default=False)),
+                ('modified_on', models.DateTimeField(auto_now=True, db_index=True)),
+                ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.tenant')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('tenant', 'user')},
+            },
+        ),
+        migrations.RunPython(track_existing_memberships, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-19 03:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def make_members_owners(apps, schema_editor):
+    # Every member could change, delete and manage its tenants before there were roles
+    apps.get_model("core", "TenantMembership").objects.update(role="owner")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        # The table of the implicit through model of Tenant.users becomes the table of TenantMembership
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TenantMembership',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('kompellouser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                        ('tenant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.tenant')),
+                    ],
+                    options={
+                        'db_table': 'core_tenant_users',
+                        'unique_together': {('tenant', 'kompellouser')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='tenant',
+                    name='users',
+                    field=models.ManyToManyField(related_name='tenants', through='core.TenantMembership', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tenantmembership',
+            name='role',
+            field=models.CharField(choices=[('owner', 'Owner'), ('member', 'Member'), ('viewer', 'Viewer')], default='member', max_length=16),
+        ),
+        migrations.RunPython(make_members_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-19 03:11
+
+import django.contrib.auth.models
+import kompello.core.models.auth_models
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_tenantmembership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False)),
+                ('modified_on', models.DateTimeField(auto_now=True, db_index=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('object_uuid', models.UUIDField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16)),
+                ('step', models.CharField(blank=True, max_length=64)),
+                ('deleted_rows', models.PositiveBigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('finished_on', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterModelManagers(
+            name='kompellouser',
+            managers=[
+                ('objects', kompello.core.models.auth_models.KompelloUserManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='kompellouser',
+            name='deleted_on',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='deleted_on',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-19 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tombstone',
+            name='users',
+            field=models.ManyToManyField(related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1 +1,5 @@
 from .auth_models import *
+from .event_models import *
+from .change_models import *
+from .token_models import *
+from .job_models import *
@@ -1,13 +1,20 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
-from kompello.core.models.base_models import BaseModel, HistoryModel
+from kompello.core.models.base_models import ActiveManager, BaseModel, HistoryModel, SoftDeleteModel
 
 
-class KompelloUser(BaseModel, HistoryModel, AbstractUser):
+class KompelloUserManager(ActiveManager, UserManager):
+    pass
+
+
+class KompelloUser(BaseModel, HistoryModel, SoftDeleteModel, AbstractUser):
     email = models.EmailField(unique=True)
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
+    objects = KompelloUserManager()
+    all_objects = UserManager()
+
 class KompelloUserSocialAuths(BaseModel):
     user = models.ForeignKey(KompelloUser, on_delete=models.CASCADE, related_name="social_auths")
     provider = models.CharField(max_length=255, null=False, blank=False)
@@ -16,7 +23,27 @@ class KompelloUserSocialAuths(BaseModel):
     class Meta:
         unique_together = [["provider", "sub", "user"]]
 
-class Tenant(BaseModel, HistoryModel):
+class Tenant(BaseModel, HistoryModel, SoftDeleteModel):
     slug = models.CharField(max_length=255, null=False, blank=False)
     name = models.CharField(max_length=255, null=False, blank=False)
-    users = models.ManyToManyField(KompelloUser, related_name="tenants")
+    users = models.ManyToManyField(KompelloUser, related_name="tenants", through="TenantMembership")
+
+
+class TenantRole(models.TextChoices):
+    OWNER = "owner"
+    MEMBER = "member"
+    VIEWER = "viewer"
+
+
+class TenantMembership(models.Model):
+    """
+    Membership of a user in a tenant with its role, kept in the table of the former implicit through model
+    """
+    id = models.AutoField(primary_key=True)
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
+    kompellouser = models.ForeignKey(KompelloUser, on_delete=models.CASCADE)
+    role = models.CharField(max_length=16, choices=TenantRole.choices, default=TenantRole.MEMBER)
+
+    class Meta:
+        db_table = "core_tenant_users"
+        unique_together = [["tenant", "kompellouser"]]
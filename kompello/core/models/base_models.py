@@ -6,7 +6,7 @@ from django.db import models
 
 class BaseModel(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False)
-    modified_on = models.DateTimeField(auto_now=True)
+    modified_on = models.DateTimeField(auto_now=True, db_index=True)
     created_on = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -18,3 +18,26 @@ class HistoryModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class ActiveManager(models.Manager):
+    """
+    Manager that hides soft deleted objects
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_on__isnull=True)
+
+
+class SoftDeleteModel(models.Model):
+    """
+    Model whose objects are hidden when they are deleted and removed later by a DeletionJob.
+    ``objects`` only returns the objects that are not deleted, ``all_objects`` all of them.
+    """
+    deleted_on = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
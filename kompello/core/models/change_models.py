@@ -0,0 +1,29 @@
+from django.db import models
+
+from kompello.core.models.auth_models import KompelloUser, Tenant
+
+
+class Tombstone(models.Model):
+    """
+    Marks a deleted user or tenant for the changes endpoints.
+    The memberships of a deleted user or tenant are gone with it and get no tombstones of their own.
+    """
+    model = models.CharField(max_length=32)
+    object_uuid = models.UUIDField()
+    modified_on = models.DateTimeField(auto_now=True, db_index=True)
+    # The members of a deleted tenant, the only users besides the admins that see its tombstone
+    users = models.ManyToManyField(KompelloUser, related_name="+")
+
+
+class MembershipChange(models.Model):
+    """
+    Last change of the membership of a user in a tenant, for the changes endpoint of the memberships.
+    Changes to Tenant.users don't touch any timestamp of the users or tenants.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name="+")
+    user = models.ForeignKey(KompelloUser, on_delete=models.CASCADE, related_name="+")
+    removed = models.BooleanField(default=False)
+    modified_on = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = [["tenant", "user"]]
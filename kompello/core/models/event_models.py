@@ -0,0 +1,12 @@
+from django.db import models
+
+
+class InvalidationEvent(models.Model):
+    """
+    Cache invalidation published by one worker for all other workers.
+    The auto incremented id is the sequence number of the event.
+    """
+    origin = models.CharField(max_length=32)
+    topic = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,26 @@
+from django.db import models
+
+from kompello.core.models.base_models import BaseModel
+
+
+class DeletionJob(BaseModel):
+    """
+    Removes a soft deleted user or tenant and the rows that depend on it in the background.
+    ``step`` is the step the worker is in, the steps are idempotent, so a job that was interrupted
+    continues with that step.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    model = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    object_uuid = models.UUIDField()
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, db_index=True)
+    step = models.CharField(max_length=64, blank=True)
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
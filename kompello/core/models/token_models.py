@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh token that can't be used anymore, kept until the token expires.
+    The unique jti lets only one of several concurrent refreshes with the same token revoke it.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_on = models.DateTimeField(auto_now_add=True)
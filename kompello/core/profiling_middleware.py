@@ -0,0 +1,74 @@
+import cProfile
+import random
+import time
+import uuid as uuid
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from kompello.core.authentication import JWTAuthentication
+
+PROFILE_HEADER = "X-KOMPELLO-PROFILE"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests with cProfile and stores the results as pstats files.
+
+    A request is profiled when a staff user sends the X-KOMPELLO-PROFILE header
+    or when it is picked by the random sampling configured in PROFILING["SAMPLE_RATE"].
+    Requests that are not profiled only pay for the header lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        response[f"{PROFILE_HEADER}-ID"] = save_profile(profiler, request)
+        return response
+
+    @staticmethod
+    def _should_profile(request) -> bool:
+        if PROFILE_HEADER in request.headers:
+            try:
+                auth = JWTAuthentication().authenticate(request)
+            except APIException:
+                return False
+            return auth is not None and auth[0].is_staff
+
+        sample_rate = settings.PROFILING["SAMPLE_RATE"]
+        return sample_rate > 0 and random.random() < sample_rate
+
+
+def get_profile_directory() -> Path:
+    directory = Path(settings.PROFILING["DIRECTORY"])
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def save_profile(profiler: cProfile.Profile, request) -> str:
+    """
+    Writes the profile to the profile directory and removes the oldest profiles above PROFILING["MAX_PROFILES"].
+    Returns the name of the written file.
+    """
+    directory = get_profile_directory()
+    view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{view.replace(':', '.')}-{uuid.uuid4().hex[:8]}.prof"
+    profiler.dump_stats(directory / name)
+
+    profiles = sorted(directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+    for path in profiles[:-settings.PROFILING["MAX_PROFILES"]]:
+        path.unlink(missing_ok=True)
+
+    return name
@@ -0,0 +1,113 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from kompello.core.helper import slow_queries
+from kompello.core.helper.deletion import soft_deleted
+from kompello.core.helper.events import broker
+from kompello.core.helper.last_login import last_logins
+from kompello.core.helper.memberships import record_membership_changes
+from kompello.core.helper.response_cache import invalidate
+from kompello.core.models.auth_models import KompelloUser, Tenant, TenantMembership
+from kompello.core.models.change_models import Tombstone
+
+connection_created.connect(slow_queries.install)
+
+# Session logins, like the admin, go through the write-behind buffer too instead of saving the user
+user_logged_in.disconnect(dispatch_uid="update_last_login")
+
+
+@receiver(user_logged_in)
+def record_last_login(sender, user, **kwargs):
+    last_logins.record(user.pk)
+
+
+def _deleted_before(signal, instance) -> bool:
+    # Soft deleted objects were reported when they were hidden, not again when the DeletionJob removes them
+    return signal in (pre_delete, post_delete) and instance.deleted_on is not None
+
+
+@receiver([post_save, post_delete, soft_deleted], sender=KompelloUser)
+def user_changed(sender, instance, signal, update_fields=None, **kwargs):
+    if (update_fields is not None and set(update_fields) == {"last_login"}) or _deleted_before(signal, instance):
+        return
+    invalidate(f"user:{instance.pk}", "users")
+
+
+@receiver([post_save, post_delete, soft_deleted], sender=Tenant)
+def tenant_changed(sender, instance, signal, **kwargs):
+    if not _deleted_before(signal, instance):
+        invalidate(f"tenant:{instance.uuid}", "tenants")
+
+
+@receiver(post_save, sender=KompelloUser)
+def publish_user_updated(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) == {"last_login"}):
+        return
+    for tenant in instance.tenants.values_list("uuid", flat=True):
+        broker.publish(tenant, "user.updated", {"user": instance.uuid})
+
+
+@receiver([pre_delete, soft_deleted], sender=KompelloUser)
+def publish_user_deleted(sender, instance, signal, **kwargs):
+    # Before the memberships are removed, the streams of the user are closed by the event
+    if not _deleted_before(signal, instance):
+        for tenant in instance.tenants.values_list("uuid", flat=True):
+            broker.publish(tenant, "user.deleted", {"user": instance.uuid})
+
+
+@receiver(post_save, sender=Tenant)
+def publish_tenant_updated(sender, instance, created, **kwargs):
+    if not created:
+        broker.publish(instance.uuid, "tenant.updated", {"tenant": instance.uuid})
+
+
+@receiver([post_delete, soft_deleted], sender=Tenant)
+def publish_tenant_deleted(sender, instance, signal, **kwargs):
+    if not _deleted_before(signal, instance):
+        broker.publish(instance.uuid, "tenant.deleted", {"tenant": instance.uuid})
+
+
+def _add_members(tombstone: Tombstone, tenant: Tenant):
+    # Copies the memberships with one query however many members the tenant has
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(Tombstone.users.through._meta.db_table)} "
+            f"({quote('tombstone_id')}, {quote('kompellouser_id')}) "
+            f"SELECT %s, {quote('kompellouser_id')} FROM {quote(TenantMembership._meta.db_table)} "
+            f"WHERE {quote('tenant_id')} = %s",
+            [tombstone.pk, tenant.pk],
+        )
+
+
+@receiver([post_delete, soft_deleted], sender=KompelloUser)
+# The tombstone of a tenant belongs to its members, which are gone by post_delete
+@receiver([pre_delete, soft_deleted], sender=Tenant)
+def create_tombstone(sender, instance, signal, **kwargs):
+    if _deleted_before(signal, instance):
+        return
+    tombstone = Tombstone.objects.create(model=sender._meta.model_name, object_uuid=instance.uuid)
+    if sender is Tenant:
+        _add_members(tombstone, instance)
+
+
+@receiver(m2m_changed, sender=Tenant.users.through)
+def tenant_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if action == "pre_clear":
+        pk_set = set(instance.tenants.values_list("pk", flat=True) if reverse
+                     else instance.users.values_list("pk", flat=True))
+    pairs = [(instance.pk, pk) if not reverse else (pk, instance.pk) for pk in pk_set]
+    record_membership_changes(pairs, removed=action != "post_add")
+
+    if not reverse:
+        tenants = [instance.uuid]
+    else:
+        tenants = Tenant.objects.filter(pk__in=pk_set).values_list("uuid", flat=True)
+
+    invalidate("tenants", *[f"tenant:{tenant}" for tenant in tenants])
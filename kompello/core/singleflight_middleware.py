@@ -0,0 +1,80 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from kompello.core.helper.singleflight import singleflight
+
+# Request headers that can change the response of a GET besides its path and query string
+KEY_HEADERS = ("Authorization", "X-KOMPELLO-TENANT", "Accept", "Accept-Language", "Cookie")
+
+
+class SingleflightMiddleware:
+    """
+    Coalesces concurrent identical GET requests of this process, same path, query string and headers
+    of KEY_HEADERS, so one of them runs the view and the others get a copy of its response.
+    The requests are not authorized yet, so only the requests of the same token are coalesced here.
+    The cached responses that members of a tenant share are coalesced across users by the response
+    cache, which authorizes every waiter first, see ``cache_response``.
+
+    Only complete responses without cookies are shared. Works in WSGI threads and under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = _key(request)
+        if key is None:
+            return self.get_response(request)
+
+        def leader():
+            return _with_snapshot(request, self.get_response(request))
+
+        (response, snapshot), shared = singleflight.do(key, leader)
+        if not shared:
+            return response
+        return _from_snapshot(request, snapshot) if snapshot else self.get_response(request)
+
+    async def __acall__(self, request):
+        key = _key(request)
+        if key is None:
+            return await self.get_response(request)
+
+        async def leader():
+            return _with_snapshot(request, await self.get_response(request))
+
+        (response, snapshot), shared = await singleflight.ado(key, leader)
+        if not shared:
+            return response
+        return _from_snapshot(request, snapshot) if snapshot else await self.get_response(request)
+
+
+def _key(request) -> tuple or None: # type: ignore
+    if not settings.SINGLEFLIGHT["ENABLED"] or request.method not in ("GET", "HEAD"):
+        return None
+    return ("request", request.method, request.get_full_path(), *(request.headers.get(name) for name in KEY_HEADERS))
+
+
+def _with_snapshot(request, response) -> tuple:
+    """
+    Returns the response and a copy of its status, headers and body for the followers,
+    taken before the outer middleware of the leader changes the response
+    """
+    if response.streaming or response.cookies:
+        return response, None
+    return response, (request.resolver_match, response.status_code, list(response.headers.items()), response.content)
+
+
+def _from_snapshot(request, snapshot) -> HttpResponse:
+    # The followers never reach the URL resolver, the outer middleware labels them like the leader
+    request.resolver_match, status, headers, content = snapshot
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    return response
@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from kompello.core.admission_middleware import AdmissionMiddleware
+from kompello.core.helper.admission import AdmissionController, RouteClass
+from kompello.core.helper.metrics import registry
+from kompello.core.tests.helpers import BaseTestCase
+
+
+def _controller(concurrency=1, queue=2, timeout=5):
+    return AdmissionController(concurrency, [
+        RouteClass("test_auth", 1, queue, timeout, 2, paths=["/api/auth/"]),
+        RouteClass("test_read", 1, queue, timeout, 0, paths=["/api/"]),
+    ])
+
+
+def _wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("Condition not reached")
+
+
+class AdmissionTest(BaseTestCase):
+    def test_classify(self):
+        """
+        Test that a request belongs to the first class whose paths and methods match.
+        """
+        controller = AdmissionController.from_settings(settings.ADMISSION)
+        self.assertEqual(controller.classify("/api/auth/standard/", "POST").name, "auth")
+        self.assertEqual(controller.classify("/api/users/import/", "POST").name, "import")
+        self.assertEqual(controller.classify("/api/users/", "POST").name, "write")
+        self.assertEqual(controller.classify("/api/batch/", "POST").name, "batch")
+        self.assertEqual(controller.classify("/api/users/", "GET").name, "read")
+        self.assertIsNone(controller.classify("/metrics", "GET"))
+
+    def test_queue_full(self):
+        """
+        Test that requests are rejected right away when the queue of their class is full.
+        """
+        controller = _controller(queue=0)
+        read = controller.route_classes[1]
+        self.assertIsNone(controller.acquire(read, True))
+        self.assertEqual(controller.acquire(read, True), "queue_full")
+        controller.release(read)
+        self.assertIsNone(controller.acquire(read, True))
+
+    def test_timeout(self):
+        """
+        Test that queued requests are rejected when they don't get a slot before the timeout of their class.
+        """
+        controller = _controller(timeout=0.01)
+        read = controller.route_classes[1]
+        controller.acquire(read, True)
+        self.assertEqual(controller.acquire(read, True), "timeout")
+        self.assertEqual(read.queued, 0)
+        controller.release(read)
+        self.assertEqual(controller.active, 0)
+
+    def test_priority(self):
+        """
+        Test that a free slot goes to an authenticated read before anonymous auth requests that waited longer.
+        """
+        controller = _controller()
+        auth, read = controller.route_classes
+        controller.acquire(read, True)
+        order = []
+
+        def request(route_class, authenticated):
+            controller.acquire(route_class, authenticated)
+            order.append(route_class.name)
+            controller.release(route_class)
+
+        with ThreadPoolExecutor(2) as pool:
+            pool.submit(request, auth, False)
+            _wait_until(lambda: auth.queued == 1)
+            pool.submit(request, read, True)
+            _wait_until(lambda: read.queued == 1)
+            controller.release(read)
+        self.assertEqual(order, ["test_read", "test_auth"])
+        self.assertEqual(controller.active, 0)
+
+    def test_middleware(self):
+        """
+        Test that the middleware rejects requests of a saturated class with 503 and Retry-After
+        and exports the limits and queue depths as metrics.
+        """
+        release = threading.Event()
+
+        def view(request):
+            release.wait(5)
+            return HttpResponse(b"ok")
+
+        config = {**settings.ADMISSION, "RETRY_AFTER": 2, "ROUTE_CLASSES": [
+            {"NAME": "test_middleware", "PATHS": ["/api/"], "CONCURRENCY": 1, "QUEUE": 0, "TIMEOUT": 1,
+             "PRIORITY": 0},
+        ]}
+        with override_settings(ADMISSION=config):
+            middleware = AdmissionMiddleware(view)
+            with ThreadPoolExecutor(1) as pool:
+                running = pool.submit(middleware, RequestFactory().get("/api/users/"))
+                _wait_until(lambda: middleware.controller.active == 1)
+                rejected = middleware(RequestFactory().get("/api/users/"))
+                unlimited = pool.submit(middleware, RequestFactory().get("/metrics"))
+                release.set()
+                self.assertEqual(running.result().status_code, 200)
+                self.assertEqual(unlimited.result().status_code, 200)
+
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected["Retry-After"], "2")
+        metrics = registry.render()
+        self.assertIn('kompello_admission_limit{route_class="test_middleware"} 1', metrics)
+        self.assertIn('kompello_admission_active{route_class="test_middleware"} 0', metrics)
+        self.assertIn('kompello_admission_rejected_total{route_class="test_middleware",reason="queue_full"} 1',
+                      metrics)
+
+    def test_requests_pass(self):
+        """
+        Test that requests below the limits pass the middleware.
+        """
+        self.assertEqual(self.client.get(reverse("core:schema.spec")).status_code, 200)
+
+    def test_settings_fit_the_worker(self):
+        """
+        Test that the gunicorn worker has a thread for every running and queued request, so requests
+        queue in the admission control where they are shed instead of inside gunicorn.
+        """
+        script = (settings.BASE_DIR.parent / ".docker" / "start-server.sh").read_text()
+        threads = int(re.search(r"--threads (\d+)", script).group(1))
+        config = settings.ADMISSION
+        queued = sum(route_class["QUEUE"] for route_class in config["ROUTE_CLASSES"])
+        self.assertGreaterEqual(threads, config["CONCURRENCY"] + queued)
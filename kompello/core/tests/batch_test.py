@@ -0,0 +1,117 @@
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from kompello.core.helper.batch import BatchDispatcher
+from kompello.core.models.auth_models import Tenant
+from kompello.core.tests.helpers import BaseTestCase
+
+
+@override_settings(BATCH={**settings.BATCH, "MAX_WORKERS": 1})
+class BatchTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(2)
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(self.users[0])
+        self._authenticate(self.users[0])
+
+    def _batch(self, *requests):
+        return self.client.post(reverse("core:batch"), {"requests": list(requests)}, format="json")
+
+    def test_batch(self):
+        """
+        Test that the sub-requests are dispatched as the user of the batch request
+        and that their responses are returned in order.
+        """
+        resp = self._batch(
+            {"method": "GET", "path": reverse("core:users-me")},
+            {"method": "GET", "path": f"{reverse('core:tenants-list')}?fields=name"},
+            {"method": "POST", "path": reverse("core:tenants-list"), "body": {"slug": "new", "name": "New"}},
+            {"method": "GET", "path": reverse("core:users-detail", args=[f"{self.users[1].uuid}"])},
+            {"method": "GET", "path": "/api/unknown/"},
+            {"method": "GET", "path": "/metrics"},
+            {"method": "POST", "path": reverse("core:batch"), "body": {"requests": []}},
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([sub["status"] for sub in resp.data], [200, 200, 201, 403, 404, 404, 400])
+        self.assertEqual(resp.data[0]["body"]["email"], self.users[0].email)
+        self.assertEqual(resp.data[1]["body"], [{"name": self.tenant.name}])
+        self.assertIn(self.users[0], Tenant.objects.get(uuid=resp.data[2]["body"]["uuid"]).users.all())
+
+    def test_validation(self):
+        """
+        Test that anonymous, empty and too large batches are rejected.
+        """
+        self.assertEqual(self._batch().status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(BATCH={**settings.BATCH, "MAX_REQUESTS": 1}):
+            resp = self._batch(*[{"method": "GET", "path": reverse("core:users-me")}] * 2)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self._batch({"method": "OPTIONS", "path": reverse("core:users-me")})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self._logout()
+        resp = self._batch({"method": "GET", "path": reverse("core:users-me")})
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_authenticated_once(self):
+        """
+        Test that the user and the tenant are loaded once for all sub-requests.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=self.client._credentials["HTTP_AUTHORIZATION"],
+                                HTTP_X_KOMPELLO_TENANT=f"{self.tenant.uuid}")
+        with self.assertNumQueries(2):
+            resp = self._batch(*[{"method": "GET", "path": reverse("core:schema.spec")}] * 2)
+        self.assertEqual([sub["status"] for sub in resp.data], [200, 200])
+
+
+@override_settings(BATCH={**settings.BATCH, "MAX_WORKERS": 4})
+class ConcurrentBatchTest(APITransactionTestCase):
+    """
+    The GET requests run on threads with their own connections, which only see committed rows
+    """
+
+    def setUp(self):
+        self.users = BaseTestCase._create_user(2)
+        self.tenants = BaseTestCase._create_tenant(2)
+        self.tenants[0].users.add(self.users[0])
+        self.tenants[1].users.add(*self.users)
+        BaseTestCase._authenticate(self, self.users[0])
+
+    def test_concurrent_reads(self):
+        """
+        Test that the GET requests run on several threads and that their responses keep the order of the requests.
+        """
+        threads = set()
+        dispatch = BatchDispatcher._dispatch_in_thread
+
+        def record(dispatcher, sub_request):
+            threads.add(threading.get_ident())
+            return dispatch(dispatcher, sub_request)
+
+        tenants = [reverse("core:tenants-detail", args=[f"{tenant.uuid}"]) for tenant in self.tenants]
+        with mock.patch.object(BatchDispatcher, "_dispatch_in_thread", record):
+            resp = self.client.post(reverse("core:batch"), {"requests": [
+                {"method": "GET", "path": reverse("core:users-me")},
+                {"method": "GET", "path": tenants[0]},
+                {"method": "GET", "path": f"{reverse('core:tenants-list')}?fields=name"},
+                {"method": "GET", "path": tenants[1]},
+                {"method": "GET", "path": "/api/unknown/"},
+                {"method": "POST", "path": reverse("core:tenants-list"), "body": {"slug": "new", "name": "New"}},
+                {"method": "GET", "path": f"{reverse('core:tenants-list')}?fields=name"},
+                {"method": "GET", "path": reverse("core:users-detail", args=[f"{self.users[1].uuid}"])},
+            ]}, format="json")
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([sub["status"] for sub in resp.data], [200, 200, 200, 200, 404, 201, 200, 403])
+        self.assertEqual(resp.data[0]["body"]["email"], self.users[0].email)
+        self.assertEqual([resp.data[1]["body"]["uuid"], resp.data[3]["body"]["uuid"]],
+                         [f"{tenant.uuid}" for tenant in self.tenants])
+        self.assertEqual(resp.data[2]["body"], [{"name": "Tenant 1"}, {"name": "Tenant 2"}])
+        # The reads after the write see the new tenant
+        self.assertEqual(resp.data[6]["body"], [{"name": "Tenant 1"}, {"name": "Tenant 2"}, {"name": "New"}])
+        self.assertGreater(len(threads), 1)
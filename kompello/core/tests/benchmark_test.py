@@ -0,0 +1,116 @@
+from io import StringIO
+from unittest import mock
+
+from auditlog.models import LogEntry
+from django.core.management import CommandError, call_command
+from django.urls import URLPattern
+
+from kompello.core import urls
+from kompello.core.helper import messagepack
+from kompello.core.helper.benchmark import (SCENARIOS, compare, compare_codecs, compare_middleware, remove, run_http,
+                                           run_in_process, seed)
+from kompello.core.models.auth_models import KompelloUser, Tenant
+from kompello.core.models.change_models import Tombstone
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class BenchmarkTest(BaseTestCase):
+    def test_all_routes_have_scenarios(self):
+        """
+        Test that every route in kompello/core/urls.py is benchmarked.
+        """
+        names = {f"core:{pattern.name}" for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names - {scenario.name for scenario in SCENARIOS}, set())
+
+    def test_seed(self):
+        """
+        Test that seed creates the requested dataset.
+        """
+        dataset = seed(tenants=3, users=10, memberships=2, social=0, seed=1)
+        self.assertEqual(KompelloUser.objects.count(), 11)
+        self.assertEqual(Tenant.objects.count(), 3)
+        self.assertEqual(Tenant.users.through.objects.count(), 21)
+        self.assertTrue(dataset.tenant.users.filter(pk=dataset.member.pk).exists())
+
+    def test_remove(self):
+        """
+        Test that remove deletes the dataset with its history and without tombstones, and keeps the other rows.
+        """
+        user = self._create_user(1)[0]
+        tenant = self._create_tenant(1)[0]
+        dataset = seed(tenants=3, users=10, memberships=2, social=0.5, seed=1)
+        remove(dataset, chunk_size=4)
+        self.assertEqual(list(KompelloUser.all_objects.all()), [user])
+        self.assertEqual(list(Tenant.all_objects.all()), [tenant])
+        self.assertFalse(Tenant.users.through.objects.exists())
+        self.assertFalse(LogEntry.objects.exists())
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_configured_database_needs_a_server(self):
+        """
+        Test that the configured database is only seeded for --url.
+        """
+        with self.assertRaisesMessage(CommandError, "--database default needs --url"):
+            call_command("bench", "--database", "default", stdout=StringIO())
+
+    def test_run_http_skips_throttled(self):
+        """
+        Test that run_http only sends the safe scenarios that are not throttled.
+        """
+        dataset = seed(tenants=2, users=5, memberships=1, social=0, seed=1)
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            urlopen.return_value.__enter__.return_value.status = 200
+            results = run_http("http://localhost", dataset, SCENARIOS, requests=1, concurrency=1)
+        self.assertIn("GET core:users-me", results)
+        self.assertNotIn("POST core:auth.standard", results)
+        self.assertEqual({scenario.name for scenario in SCENARIOS if scenario.throttled},
+                         {"core:auth.social", "core:auth.standard", "core:auth.register", "core:auth.revoke"})
+
+    def test_run_in_process(self):
+        """
+        Test that run_in_process measures every scenario and rolls back its changes.
+        """
+        dataset = seed(tenants=2, users=5, memberships=1, social=0.5, seed=1)
+        results = run_in_process(dataset, SCENARIOS, requests=2)
+        self.assertEqual(set(results), {str(scenario) for scenario in SCENARIOS})
+        self.assertEqual(results["GET core:users-me"]["statuses"], {"200": 2})
+        self.assertEqual(KompelloUser.objects.count(), 6)
+
+    def test_compare(self):
+        """
+        Test that compare reports slower endpoints and endpoints with more queries.
+        """
+        baseline = {"results": {"in_process": {
+            "GET a": {"p95_ms": 10, "queries_per_request": 2},
+            "GET b": {"p95_ms": 10, "queries_per_request": 2},
+        }}}
+        results = {"results": {"in_process": {
+            "GET a": {"p95_ms": 11, "queries_per_request": 3},
+            "GET b": {"p95_ms": 20, "queries_per_request": 2},
+            "GET c": {"p95_ms": 50, "queries_per_request": 9},
+        }}}
+        self.assertEqual(compare(baseline, results, 0.2), [
+            "in_process GET a: queries 2 -> 3",
+            "in_process GET b: p95 10.00ms -> 20.00ms",
+        ])
+
+    def test_compare_codecs(self):
+        """
+        Test that compare_codecs measures every payload with JSON and every other available codec.
+        """
+        dataset = seed(tenants=2, users=5, memberships=1, social=0, seed=1)
+        results = compare_codecs(dataset, rounds=2)
+        self.assertEqual(set(results), {"users", "tenants", "login"})
+        self.assertIn("json", results["users"])
+        self.assertEqual(set(results["users"]) == {"json", "msgpack"}, messagepack.msgpack is not None)
+        self.assertGreater(results["users"]["json"]["bytes"], 0)
+
+    def test_compare_middleware(self):
+        """
+        Test that compare_middleware measures the safe scenarios with both middleware stacks.
+        """
+        dataset = seed(tenants=2, users=5, memberships=1, social=0, seed=1)
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name == "core:users-me"]
+        results = compare_middleware(dataset, scenarios, requests=2)
+        self.assertEqual(set(results), {"GET core:users-me"})
+        self.assertEqual(set(results["GET core:users-me"]), {"full_p50_ms", "profile_p50_ms", "saved_ms"})
@@ -0,0 +1,111 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.deletion import soft_delete
+from kompello.core.models.auth_models import Tenant
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class ChangesTest(BaseTestCase):
+    def setUp(self):
+        self.admin = self._create_admin_user(1)[0]
+        self.users = self._create_user(3)
+        self.tenants = self._create_tenant(2)
+        self.tenants[0].users.add(*self.users[:2])
+
+    def _changes(self, name, since=None):
+        resp = self.client.get(reverse(name), {"since": since} if since else {})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_user_changes(self):
+        """
+        Test that only users changed after the cursor and tombstones of deleted users are returned.
+        """
+        self._authenticate(self.admin)
+        first = self._changes("core:users-changes")
+        self.assertEqual(len(first["changed"]), 4)
+        self.assertEqual(first["deleted"], [])
+        self.assertEqual(self._changes("core:users-changes", first["cursor"])["changed"], [])
+
+        self.users[0].first_name = "Changed"
+        self.users[0].save()
+        deleted = self.users[1].uuid
+        self.users[1].delete()
+        second = self._changes("core:users-changes", first["cursor"])
+        self.assertEqual([user["first_name"] for user in second["changed"]], ["Changed"])
+        self.assertEqual(second["deleted"], [{"uuid": deleted}])
+
+        self._authenticate(self.users[0])
+        resp = self.client.get(reverse("core:users-changes"))
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(CHANGES={"PAGE_SIZE": 1})
+    def test_tenant_changes(self):
+        """
+        Test that a user gets the changes of their tenants page by page.
+        """
+        self._authenticate(self.users[0])
+        first = self._changes("core:tenants-changes")
+        self.assertEqual([tenant["uuid"] for tenant in first["changed"]], [f"{self.tenants[0].uuid}"])
+        self.assertFalse(first["more"])
+
+        other = Tenant.objects.create(slug="other", name="Other")
+        other.users.add(self.users[0])
+        self.tenants[0].name = "Changed"
+        self.tenants[0].save()
+        second = self._changes("core:tenants-changes", first["cursor"])
+        self.assertTrue(second["more"])
+        third = self._changes("core:tenants-changes", second["cursor"])
+        self.assertEqual([tenant["name"] for tenant in second["changed"] + third["changed"]], ["Other", "Changed"])
+
+        resp = self.client.get(reverse("core:tenants-changes"), {"since": "invalid"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tenant_changes_follow_the_memberships(self):
+        """
+        Test that a tenant the user joins later is a change and that a user only gets the tombstones
+        of deleted tenants that it was a member of.
+        """
+        self._authenticate(self.users[0])
+        first = self._changes("core:tenants-changes")
+
+        self.tenants[1].users.add(self.users[0])
+        deleted = self.tenants[0].uuid
+        self.tenants[0].delete()
+        hidden = Tenant.objects.create(slug="hidden", name="Hidden")
+        hidden.users.add(self.users[0])
+        soft_delete(hidden)
+        soft_delete(Tenant.objects.create(slug="other", name="Other"))
+        second = self._changes("core:tenants-changes", first["cursor"])
+        self.assertEqual([tenant["uuid"] for tenant in second["changed"]], [f"{self.tenants[1].uuid}"])
+        self.assertEqual(second["deleted"], [{"uuid": deleted}, {"uuid": hidden.uuid}])
+        self.assertEqual(self._changes("core:tenants-changes", second["cursor"])["changed"], [])
+
+        self._authenticate(self.users[2])
+        self.assertEqual(self._changes("core:tenants-changes")["deleted"], [])
+        self._authenticate(self.admin)
+        self.assertEqual(len(self._changes("core:tenants-changes")["deleted"]), 3)
+
+    def test_membership_changes(self):
+        """
+        Test that added and removed memberships are tracked for the M2M manager and the bulk endpoint.
+        """
+        self._authenticate(self.users[0])
+        first = self._changes("core:tenants-memberships-changes")
+        self.assertEqual(len(first["changed"]), 2)
+
+        self.tenants[0].users.remove(self.users[1])
+        self.client.post(reverse("core:tenants-memberships"), {
+            "action": "add", "pairs": [[f"{self.tenants[0].uuid}", f"{self.users[2].uuid}"]]
+        }, format="json")
+        second = self._changes("core:tenants-memberships-changes", first["cursor"])
+        self.assertEqual(second["changed"], [{"tenant": self.tenants[0].uuid, "user": self.users[2].uuid}])
+        self.assertEqual(second["deleted"], [{"tenant": self.tenants[0].uuid, "user": self.users[1].uuid}])
+
+        self.tenants[1].users.add(self.users[1])
+        self.assertEqual(self._changes("core:tenants-memberships-changes", second["cursor"])["changed"], [])
+        self.tenants[0].users.clear()
+        third = self._changes("core:tenants-memberships-changes", second["cursor"])
+        self.assertEqual(len(third["deleted"]), 1)
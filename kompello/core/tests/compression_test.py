@@ -0,0 +1,108 @@
+import gzip
+import unittest
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from kompello.core.compression_middleware import CompressionMiddleware
+from kompello.core.helper import compression
+from kompello.core.helper.compression import GzipCodec, negotiate
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class CompressionTest(BaseTestCase):
+    def _middleware(self, response):
+        return CompressionMiddleware(lambda request: response)
+
+    def _get(self, response, accept_encoding="gzip", method="get"):
+        request = getattr(RequestFactory(), method)("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return self._middleware(response)(request)
+
+    def test_negotiate(self):
+        """
+        Test that the codec with the highest quality of the client is chosen, ties by the server preference.
+        """
+        codecs = {"zstd": "zstd", "br": "br", "gzip": "gzip"}
+        self.assertEqual(negotiate("gzip, deflate, br, zstd", codecs), "zstd")
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.8", codecs), "gzip")
+        self.assertEqual(negotiate("zstd;q=0, *;q=0.5", codecs), "br")
+        self.assertEqual(negotiate("GZIP", codecs), "gzip")
+        self.assertIsNone(negotiate("identity", codecs))
+        self.assertIsNone(negotiate("gzip;q=0", codecs))
+        self.assertIsNone(negotiate("", codecs))
+
+    def test_schema_is_compressed(self):
+        """
+        Test that the OpenAPI schema is gzip compressed for clients that accept it and varies by Accept-Encoding.
+        """
+        plain = self.client.get(reverse("core:schema.spec"))
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        resp = self.client.get(reverse("core:schema.spec"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(int(resp["Content-Length"]), len(resp.content))
+        self.assertLess(len(resp.content), len(plain.content))
+        self.assertEqual(gzip.decompress(resp.content), plain.content)
+
+    def test_skipped_responses(self):
+        """
+        Test that small bodies, other content types and event streams are sent uncompressed.
+        """
+        small = self._get(HttpResponse(b"{}", content_type="application/json"))
+        self.assertNotIn("Content-Encoding", small)
+        self.assertEqual(small.content, b"{}")
+
+        binary = self._get(HttpResponse(b"a" * 4096, content_type="application/octet-stream"))
+        self.assertNotIn("Content-Encoding", binary)
+        self.assertFalse(binary.has_header("Vary"))
+
+        events = self._get(StreamingHttpResponse(iter([b"data: {}\n\n"]), content_type="text/event-stream"))
+        self.assertNotIn("Content-Encoding", events)
+
+        with override_settings(COMPRESSION={**settings.COMPRESSION, "ENABLED": False}):
+            disabled = self._get(HttpResponse(b"a" * 4096, content_type="text/csv"))
+        self.assertNotIn("Content-Encoding", disabled)
+
+    def test_streaming(self):
+        """
+        Test that streaming responses are compressed chunk by chunk without a Content-Length.
+        """
+        chunks = [f'{{"row": {i}}}\n'.encode() for i in range(1000)]
+        resp = self._get(StreamingHttpResponse(iter(chunks), content_type="application/x-ndjson"))
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertFalse(resp.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(b"".join(resp.streaming_content)), b"".join(chunks))
+
+    def test_cache(self):
+        """
+        Test that the compressed body of a GET response is reused and that strong ETags are weakened.
+        """
+        body = b"x" * 4096
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type="text/plain",
+                                                                        headers={"ETag": '"abc"'}))
+        calls = []
+        codec = middleware.codecs["gzip"] = GzipCodec(6)
+        codec.compress = lambda data: calls.append(data) or GzipCodec.compress(codec, data)
+
+        for method in ("get", "get", "post"):
+            resp = middleware(getattr(RequestFactory(), method)("/", HTTP_ACCEPT_ENCODING="gzip"))
+            self.assertEqual(gzip.decompress(resp.content), body)
+            self.assertEqual(resp["ETag"], 'W/"abc"')
+        self.assertEqual(len(calls), 2)
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        resp = self._get(HttpResponse(b"x" * 4096, content_type="text/plain"), accept_encoding="br, gzip")
+        self.assertEqual(resp["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(resp.content), b"x" * 4096)
+
+    @unittest.skipIf(compression.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        chunks = [b"x" * 100] * 100
+        resp = self._get(StreamingHttpResponse(iter(chunks), content_type="text/plain"), accept_encoding="zstd")
+        self.assertEqual(resp["Content-Encoding"], "zstd")
+        decompressor = compression.zstandard.ZstdDecompressor()
+        self.assertEqual(decompressor.decompressobj().decompress(b"".join(resp.streaming_content)), b"".join(chunks))
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from auditlog.models import LogEntry
+from django.core.management import call_command
+from django.db import transaction
+
+from kompello.core.helper import dataset
+from kompello.core.helper.dataset import DatasetGenerator
+from kompello.core.models.auth_models import KompelloUser, KompelloUserSocialAuths, Tenant
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class DatasetGeneratorTest(BaseTestCase):
+    def test_generate(self):
+        """
+        Test that the generator creates all rows in batches and hashes the password once.
+        """
+        with mock.patch.object(dataset, "make_password", wraps=dataset.make_password) as make_password:
+            progress = list(DatasetGenerator(users=25, tenants=4, memberships=2, social=1, history=2,
+                                             batch_size=10).run())
+
+        make_password.assert_called_once()
+        self.assertEqual(KompelloUser.objects.count(), 25)
+        self.assertEqual(Tenant.objects.count(), 4)
+        self.assertEqual(Tenant.users.through.objects.count(), 50)
+        self.assertEqual(KompelloUserSocialAuths.objects.count(), 25)
+        self.assertEqual(LogEntry.objects.count(), (25 + 4) * 3)
+        self.assertEqual(progress[:3], [("users", 10, 25), ("users", 20, 25), ("users", 25, 25)])
+        self.assertTrue(KompelloUser.objects.first().check_password(dataset.DEFAULT_PASSWORD))
+
+    def test_reproducible(self):
+        """
+        Test that the same seed and prefix generate the same data and that other prefixes get other uuids.
+        """
+        def generate(prefix):
+            with transaction.atomic():
+                list(DatasetGenerator(users=5, tenants=3, memberships=2, seed=7, prefix=prefix).run())
+                data = (
+                    list(KompelloUser.objects.order_by("pk").values_list("uuid", flat=True))
+                    + list(Tenant.objects.order_by("pk").values_list("uuid", flat=True)),
+                    list(Tenant.users.through.objects.order_by("pk")
+                         .values_list("tenant__slug", "kompellouser__username")),
+                )
+                transaction.set_rollback(True)
+            return data
+
+        first_uuids, first_memberships = generate("a")
+        self.assertEqual(generate("a"), (first_uuids, first_memberships))
+        second_uuids, _ = generate("b")
+        self.assertFalse(set(first_uuids) & set(second_uuids))
+
+    def test_command(self):
+        """
+        Test that the command generates the dataset.
+        """
+        call_command("generate_dataset", users=3, tenants=2, stdout=mock.MagicMock())
+        self.assertEqual(KompelloUser.objects.count(), 3)
+        self.assertEqual(Tenant.objects.count(), 2)
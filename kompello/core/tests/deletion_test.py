@@ -0,0 +1,151 @@
+import io
+from io import StringIO
+from unittest import mock
+
+from auditlog.models import LogEntry
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.deletion import DeletionWorker, soft_delete
+from kompello.core.helper.snapshot import export_tenant, import_tenant
+from kompello.core.helper.user_import import UserImporter
+from kompello.core.models.auth_models import KompelloUser, Tenant, TenantMembership, TenantRole
+from kompello.core.models.change_models import Tombstone
+from kompello.core.models.job_models import DeletionJob
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class DeletionTest(BaseTestCase):
+    def setUp(self):
+        self.owner = self._create_user(1)[0]
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(self.owner, through_defaults={"role": TenantRole.OWNER})
+        self.tenant.users.add(*self._bulk_create_users(5))
+
+    def test_delete_hides_the_tenant(self):
+        """
+        Test that a deleted tenant is gone right away, while its rows are removed by the worker.
+        """
+        self._authenticate(self.owner)
+        resp = self.client.delete(reverse("core:tenants-detail", args=[self.tenant.uuid]))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertFalse(Tenant.objects.filter(pk=self.tenant.pk).exists())
+        self.assertTrue(Tenant.all_objects.filter(pk=self.tenant.pk).exists())
+        resp = self.client.get(reverse("core:tenants-detail", args=[self.tenant.uuid]))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.model, job.object_uuid, job.status), ("tenant", self.tenant.uuid, DeletionJob.Status.PENDING))
+        self.assertEqual(Tombstone.objects.filter(object_uuid=self.tenant.uuid).count(), 1)
+
+    def test_worker_deletes_in_chunks(self):
+        """
+        Test that the worker removes the dependent rows in chunks and the object last, without a second tombstone.
+        """
+        job = soft_delete(self.tenant)
+        worker = DeletionWorker(chunk_size=2, pause=0)
+        with mock.patch.object(worker, "_update", wraps=worker._update) as update:
+            self.assertEqual(worker.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.Status.DONE)
+        self.assertEqual(job.step, "object")
+        self.assertIsNotNone(job.finished_on)
+        self.assertFalse(Tenant.all_objects.filter(pk=self.tenant.pk).exists())
+        self.assertFalse(TenantMembership.objects.filter(tenant_id=self.tenant.pk).exists())
+        self.assertGreaterEqual(job.deleted_rows, 6)
+        # The 6 memberships need 3 chunks
+        chunks = [call for call in update.call_args_list if "deleted_rows" in call.kwargs]
+        self.assertGreaterEqual(len(chunks), 3)
+        self.assertEqual(Tombstone.objects.filter(object_uuid=self.tenant.uuid).count(), 1)
+        self.assertEqual(worker.run_pending(), 0)
+
+    def test_resume(self):
+        """
+        Test that an interrupted job continues with its step and skips the finished ones.
+        """
+        job = soft_delete(self.owner)
+        job.status = DeletionJob.Status.RUNNING
+        job.step = "audit history"
+        job.save()
+
+        DeletionWorker(pause=0).run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.Status.DONE)
+        self.assertFalse(KompelloUser.all_objects.filter(pk=self.owner.pk).exists())
+        # The memberships were removed by the cascade of the object instead of their step
+        self.assertFalse(TenantMembership.objects.filter(kompellouser_id=self.owner.pk).exists())
+
+    def test_failed_job_keeps_its_step(self):
+        """
+        Test that a failing step marks the job as failed and that the command continues it with --retry-failed.
+        """
+        job = soft_delete(self.tenant)
+        with mock.patch.object(LogEntry.objects, "filter", side_effect=RuntimeError("gone")), \
+                self.assertLogs("kompello.deletion", "ERROR"):
+            DeletionWorker(pause=0).run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (DeletionJob.Status.FAILED, "gone"))
+        self.assertEqual(DeletionWorker(pause=0).run_pending(), 0)
+
+        call_command("run_deletions", "--once", "--retry-failed", "--pause", "0", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (DeletionJob.Status.DONE, ""))
+        self.assertFalse(Tenant.all_objects.filter(pk=self.tenant.pk).exists())
+
+    def test_deleted_user_cannot_log_in(self):
+        """
+        Test that a user can't log in once deleted, but its email is not free until the user is removed.
+        """
+        self._authenticate(self.owner)
+        resp = self.client.delete(reverse("core:users-detail", args=[self.owner.uuid]))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.credentials()
+        resp = self.client.post(reverse("core:auth.standard"),
+                                {"username": self.owner.email, "password": USER_PASSWORD}, format="json")
+        self.assertNotEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.tenant.users.filter(pk=self.owner.pk).exists())
+
+        resp = self.client.post(reverse("core:users-list"), {"username": "new", "email": self.owner.email,
+                                                             "password": USER_PASSWORD}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_progress(self):
+        """
+        Test that admins can follow the progress of the deletion jobs.
+        """
+        self._authenticate(self.owner)
+        resp = self.client.get(reverse("core:deletion-jobs-list"))
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        job = soft_delete(self.owner)
+        job.status = DeletionJob.Status.RUNNING
+        job.step = "memberships"
+        job.save()
+
+        self._authenticate(self._create_admin_user(1)[0])
+        resp = self.client.get(reverse("core:deletion-jobs-detail", args=[job.uuid]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["steps"], ["social auths", "memberships", "membership changes", "audit history",
+                                              "audit actor", "object"])
+        self.assertEqual((resp.data["status"], resp.data["completed_steps"]), ("running", 1))
+
+    def test_imports_keep_deleted_users(self):
+        """
+        Test that imports treat the email and username of soft deleted users as taken instead of failing.
+        """
+        snapshot = io.StringIO()
+        export_tenant(self.tenant, snapshot)
+        soft_delete(self.owner)
+
+        importer = UserImporter()
+        importer.run([(1, {"email": self.owner.email, "first_name": "New", "last_name": "User"})])
+        self.assertEqual(importer.created, 0)
+        self.assertEqual(importer.errors[0]["errors"], {"email": ["A user with this email already exists"]})
+
+        tenant = import_tenant(io.StringIO(snapshot.getvalue()), clone=True)
+        self.assertEqual(KompelloUser.all_objects.filter(email=self.owner.email).count(), 1)
+        self.assertEqual(tenant.users.count(), 5)
@@ -0,0 +1,194 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kompello.core.event_stream import EVENTS_PATH, EventStreamRouter
+from kompello.core.helper.deletion import soft_delete
+from kompello.core.helper.events import broker
+from kompello.core.tests.helpers import BaseTestCase
+
+
+@override_settings(INVALIDATION_BUS={**settings.INVALIDATION_BUS, "ENABLED": False, "POLL_INTERVAL": 0})
+class EventStreamTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(2)
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(self.users[0])
+        self.router = EventStreamRouter(None)
+
+    def _token(self, user):
+        return str(RefreshToken.for_user(user).access_token)
+
+    async def _open(self, token=None, tenant=None, last_event_id=None):
+        """
+        Opens a stream and returns the task serving it, the sent messages and the queue of received messages
+        """
+        headers = []
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        if last_event_id:
+            headers.append((b"last-event-id", last_event_id.encode()))
+        query = f"tenant={tenant}" if tenant else ""
+        scope = {"type": "http", "method": "GET", "path": EVENTS_PATH, "headers": headers,
+                 "query_string": query.encode()}
+        sent, received = [], asyncio.Queue()
+
+        async def send(message):
+            sent.append(message)
+
+        task = asyncio.ensure_future(self.router(scope, received.get, send))
+        return task, sent, received
+
+    async def _wait_for(self, sent, count):
+        for _ in range(100):
+            if len(_events(sent)) >= count:
+                return _events(sent)
+            await asyncio.sleep(0.01)
+        self.fail(f"Expected {count} events, got {_events(sent)}")
+
+    async def _close(self, task, received):
+        await received.put({"type": "http.disconnect"})
+        await asyncio.wait_for(task, 1)
+        if self.router._poller is not None:
+            await asyncio.wait_for(self.router._poller, 1)
+
+    async def _response(self, **kwargs):
+        task, sent, received = await self._open(**kwargs)
+        await asyncio.wait_for(task, 1)
+        return sent[0]["status"], json.loads(sent[1]["body"])
+
+    async def test_authorization(self):
+        """
+        Test that only members of an existing tenant can subscribe to its events.
+        """
+        token = await sync_to_async(self._token)(self.users[0])
+        other = await sync_to_async(self._token)(self.users[1])
+        self.assertEqual((await self._response(tenant=self.tenant.uuid))[0], 401)
+        self.assertEqual((await self._response(token="invalid", tenant=self.tenant.uuid))[0], 401)
+        self.assertEqual((await self._response(token=token))[0], 400)
+        self.assertEqual((await self._response(token=token, tenant="unknown"))[0], 404)
+        self.assertEqual((await self._response(token=other, tenant=self.tenant.uuid))[0], 403)
+
+    async def test_membership_events(self):
+        """
+        Test that a subscriber gets the membership events of its tenant once they are committed.
+        """
+        token = await sync_to_async(self._token)(self.users[0])
+        task, sent, received = await self._open(token=token, tenant=self.tenant.uuid)
+        ready = await self._wait_for(sent, 1)
+        self.assertEqual(ready[0][1:], ("ready", {"tenant": f"{self.tenant.uuid}"}))
+        self.assertEqual(sent[0]["headers"][0], (b"content-type", b"text/event-stream"))
+
+        def add_user():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tenant.users.add(self.users[1])
+
+        await sync_to_async(add_user)()
+        events = await self._wait_for(sent, 2)
+        self.assertEqual(events[1][1:], ("membership.added", {"user": f"{self.users[1].uuid}"}))
+        await self._close(task, received)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_removed_user(self):
+        """
+        Test that the stream ends once its user is removed from the tenant or deleted, but not for other users.
+        """
+        await sync_to_async(self.tenant.users.add)(self.users[1])
+        tokens = [await sync_to_async(self._token)(user) for user in self.users]
+        streams = [await self._open(token=token, tenant=self.tenant.uuid) for token in tokens]
+        for _, sent, _ in streams:
+            await self._wait_for(sent, 1)
+
+        def change(apply):
+            with self.captureOnCommitCallbacks(execute=True):
+                apply()
+
+        await sync_to_async(change)(lambda: self.tenant.users.remove(self.users[1]))
+        task, sent, _ = streams[1]
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(_events(sent)[-1][1:], ("membership.removed", {"user": f"{self.users[1].uuid}"}))
+        self.assertFalse(sent[-1]["more_body"])
+        self.assertFalse(streams[0][0].done())
+
+        await sync_to_async(change)(lambda: soft_delete(self.users[0]))
+        task, sent, received = streams[0]
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(_events(sent)[-1][1:], ("user.deleted", {"user": f"{self.users[0].uuid}"}))
+        await self._close(task, received)
+
+    async def test_token_expiry(self):
+        """
+        Test that the stream ends when its token expires.
+        """
+        def short_token():
+            token = RefreshToken.for_user(self.users[0]).access_token
+            token.set_exp(lifetime=timedelta(seconds=2))
+            return str(token)
+
+        task, sent, received = await self._open(token=await sync_to_async(short_token)(), tenant=self.tenant.uuid)
+        await self._wait_for(sent, 1)
+        await asyncio.wait_for(task, 3)
+        self.assertFalse(sent[-1]["more_body"])
+        await self._close(task, received)
+
+    async def test_resume(self):
+        """
+        Test that a stream resumed with Last-Event-ID gets the missed events,
+        and that a stream that can't be resumed gets a reset event.
+        """
+        token = await sync_to_async(self._token)(self.users[0])
+        task, sent, received = await self._open(token=token, tenant=self.tenant.uuid)
+        await self._wait_for(sent, 1)
+        last_event_id = broker.event_id(broker.seq)
+        await self._close(task, received)
+        broker.deliver(json.dumps([f"{self.tenant.uuid}", "tenant.updated", {"tenant": f"{self.tenant.uuid}"}]))
+
+        task, sent, received = await self._open(token=token, tenant=self.tenant.uuid, last_event_id=last_event_id)
+        events = await self._wait_for(sent, 2)
+        self.assertEqual(events[1], (broker.event_id(broker.seq), "tenant.updated",
+                                     {"tenant": f"{self.tenant.uuid}"}))
+        await self._close(task, received)
+
+        task, sent, received = await self._open(token=token, tenant=self.tenant.uuid, last_event_id="unknown-1")
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(_events(sent)[1][1], "reset")
+        self.assertFalse(sent[-1]["more_body"])
+
+    @override_settings(EVENTS={**settings.EVENTS, "BUFFERED_TENANTS": 1})
+    async def test_buffers(self):
+        """
+        Test that only the events of subscribed tenants are buffered and that the buffers of
+        tenants without subscribers are dropped beyond EVENTS["BUFFERED_TENANTS"].
+        """
+        loop = asyncio.get_running_loop()
+        broker.deliver(json.dumps(["unsubscribed", "tenant.updated", {}]))
+        self.assertNotIn("unsubscribed", broker._buffers)
+
+        subscriptions = [broker.subscribe(tenant)[0] for tenant in ("first", "second")]
+        self.assertEqual(subscriptions[0].loop, loop)
+        for subscription in subscriptions:
+            broker.unsubscribe(subscription)
+        self.assertNotIn("first", broker._buffers)
+        self.assertIn("second", broker._buffers)
+
+        subscription, missed = broker.subscribe("first", broker.event_id(broker.seq - 1))
+        self.assertIsNone(missed)
+        broker.unsubscribe(subscription)
+
+
+def _events(sent) -> list[tuple]:
+    """
+    Parses the ``(id, event, data)`` of the events in the sent body messages
+    """
+    events = []
+    for message in sent:
+        for block in message.get("body", b"").decode().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+            if "event" in fields:
+                events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
@@ -1,6 +1,12 @@
+from django.contrib.auth.hashers import make_password
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from kompello.core.helper.last_login import last_logins
+from kompello.core.helper.response_cache import reset_response_cache
+from kompello.core.helper.revocation import revocations
+from kompello.core.helper.throttling import reset_throttles
 from kompello.core.models.auth_models import KompelloUser, Tenant
 
 
@@ -12,6 +18,17 @@ class BaseTestCase(APITestCase):
     def __init__(self, methodName: str = "runTest") -> None:
         super().__init__(methodName)
 
+    def _pre_setup(self):
+        super()._pre_setup()
+        reset_throttles()
+        reset_response_cache()
+        revocations.reset()
+
+    def _post_teardown(self):
+        # The logins of the test belong to rolled back users
+        last_logins.discard()
+        super()._post_teardown()
+
     @staticmethod
     def _create_tenant(count):
         tenants = []
@@ -37,6 +54,24 @@ class BaseTestCase(APITestCase):
                                               last_name=f"User{i}"))
         return users
 
+    @staticmethod
+    def _bulk_create_users(count, prefix="bulk"):
+        """
+        Creates users with a single query and a single password hash, for tests that need many users
+        """
+        password = make_password(USER_PASSWORD)
+        return KompelloUser.objects.bulk_create([
+            KompelloUser(username=f"{prefix}{i}", email=f"{prefix}{i}@email.com", password=password,
+                         first_name=f"Bulk{i}", last_name=f"User{i}")
+            for i in range(1, count + 1)
+        ])
+
+    def _authenticate(self, user):
+        """
+        Authenticates the client with a token issued directly, without the login request
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
     def _login(self, email, password):
         token = self.client.post(reverse("core:auth.standard"), {"username": email, "password": password}, format='json')
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token.data['access_token']}")
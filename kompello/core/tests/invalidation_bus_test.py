@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.test import override_settings
+
+from kompello.core.helper.invalidation_bus import InvalidationBus
+from kompello.core.models.event_models import InvalidationEvent
+from kompello.core.tests.helpers import BaseTestCase
+
+
+@override_settings(INVALIDATION_BUS={**settings.INVALIDATION_BUS, "ENABLED": True, "MAX_BACKLOG": 3})
+class InvalidationBusTest(BaseTestCase):
+    def setUp(self):
+        self.worker = InvalidationBus()
+        self.other = InvalidationBus()
+        self.received = []
+        self.flushes = []
+        self.other.subscribe("test", self.received.append)
+        self.other.on_flush(lambda: self.flushes.append(True))
+        self.other.poll(force=True)
+
+    def _publish(self, *keys):
+        with self.captureOnCommitCallbacks(execute=True):
+            for key in keys:
+                self.worker.publish("test", key)
+
+    def test_events_reach_other_worker(self):
+        """
+        Test that events published by one worker are applied by another worker in sequence order,
+        while the publishing worker does not apply its own events twice.
+        """
+        own = []
+        self.worker.subscribe("test", own.append)
+        self._publish("a", "b")
+        self.worker.poll(force=True)
+        self.other.poll(force=True)
+
+        self.assertEqual(own, ["a", "b"])
+        self.assertEqual(self.received, ["a", "b"])
+        self.assertEqual(self.flushes, [])
+
+    def test_events_wait_for_commit(self):
+        """
+        Test that events of a transaction that was not committed are neither written nor applied locally.
+        """
+        own = []
+        self.worker.subscribe("test", own.append)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.worker.publish("test", "a")
+            self.assertFalse(InvalidationEvent.objects.exists())
+            self.assertEqual(own, [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(own, ["a"])
+
+    def test_backlog_flushes(self):
+        """
+        Test that a worker that falls more than MAX_BACKLOG events behind flushes its caches
+        and continues with the latest sequence number.
+        """
+        self._publish("a", "b", "c", "d")
+        self.other.poll(force=True)
+        self.assertEqual(self.received, [])
+        self.assertEqual(self.flushes, [True])
+
+        self._publish("e")
+        self.other.poll(force=True)
+        self.assertEqual(self.received, ["e"])
+
+    def test_gap_flushes(self):
+        """
+        Test that a gap in the sequence, e.g. because old events were pruned, flushes the caches.
+        """
+        self._publish("a", "b")
+        InvalidationEvent.objects.filter(key="a").delete()
+        self.other.poll(force=True)
+        self.assertEqual(self.received, [])
+        self.assertEqual(self.flushes, [True])
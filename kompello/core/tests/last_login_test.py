@@ -0,0 +1,98 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from kompello.core.helper.last_login import LastLoginBuffer, last_logins
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class LastLoginTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(3)
+        last_logins.flush()
+
+    def test_login_is_written_behind(self):
+        """
+        Test that a login only sets the last login of the user once the buffer is flushed,
+        without creating audit log entries.
+        """
+        entries = LogEntry.objects.count()
+        resp = self.client.post(reverse("core:auth.standard"),
+                                {"username": self.users[0].email, "password": USER_PASSWORD}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.users[0].refresh_from_db()
+        self.assertIsNone(self.users[0].last_login)
+
+        self.assertEqual(last_logins.flush(), 1)
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
+        self.assertEqual(LogEntry.objects.count(), entries)
+
+    def test_logins_are_coalesced(self):
+        """
+        Test that the logins of all users are written with one query and only the latest login of a user is kept.
+        """
+        buffer = LastLoginBuffer()
+        now = timezone.now()
+        for user in self.users:
+            buffer.record(user.pk, now - timedelta(minutes=1))
+        buffer.record(self.users[0].pk, now)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(buffer.flush(), 0)
+        self.users[0].refresh_from_db()
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[0].last_login, now)
+        self.assertEqual(self.users[1].last_login, now - timedelta(minutes=1))
+
+    @override_settings(LAST_LOGIN={**settings.LAST_LOGIN, "BATCH_SIZE": 2})
+    def test_batches(self):
+        """
+        Test that the pending logins are written in batches of BATCH_SIZE users.
+        """
+        buffer = LastLoginBuffer()
+        for user in self.users:
+            buffer.record(user.pk)
+        with self.assertNumQueries(2):
+            buffer.flush()
+
+    @override_settings(LAST_LOGIN={**settings.LAST_LOGIN, "ENABLED": False})
+    def test_disabled(self):
+        """
+        Test that the last login is written right away when the buffer is disabled.
+        """
+        buffer = LastLoginBuffer()
+        with self.assertNumQueries(1):
+            buffer.record(self.users[0].pk)
+        self.users[0].refresh_from_db()
+        self.assertIsNotNone(self.users[0].last_login)
+
+    @override_settings(LAST_LOGIN={**settings.LAST_LOGIN, "FLUSH_INTERVAL": 0})
+    def test_flusher_survives_errors(self):
+        """
+        Test that the flusher thread keeps running after a flush raised an unexpected error.
+        """
+        buffer = LastLoginBuffer()
+        flushed = threading.Event()
+        calls = []
+
+        def flush():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("flush failed")
+            flushed.set()
+            raise SystemExit
+
+        with mock.patch.object(buffer, "flush", side_effect=flush), \
+                self.assertLogs("kompello.last_login", "ERROR"):
+            buffer.record(self.users[0].pk)
+            self.assertTrue(flushed.wait(5))
+        buffer._thread.join(5)
+        self.assertEqual(len(calls), 2)
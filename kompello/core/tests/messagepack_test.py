@@ -0,0 +1,64 @@
+import datetime
+import unittest
+import uuid as uuid
+
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper import messagepack
+from kompello.core.tests.helpers import BaseTestCase
+
+
+@unittest.skipIf(messagepack.msgpack is None, "msgpack is not installed")
+class MessagePackTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(2)
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(self.users[0])
+        self._authenticate(self.users[0])
+
+    def test_extension_types(self):
+        """
+        Test that UUIDs and aware datetimes survive a round trip as extension types.
+        """
+        data = {"uuid": uuid.uuid4(), "at": datetime.datetime(2024, 1, 2, 3, 4, 5, 6000, tzinfo=datetime.timezone.utc),
+                "day": datetime.date(2024, 1, 2), "nested": [uuid.UUID(int=1)]}
+        self.assertEqual(messagepack.unpackb(messagepack.packb(data)), {**data, "day": "2024-01-02"})
+
+    def test_negotiation(self):
+        """
+        Test that responses are MessagePack for clients that accept it and that MessagePack bodies are parsed.
+        """
+        json_resp = self.client.get(reverse("core:users-me"))
+        resp = self.client.get(reverse("core:users-me"), HTTP_ACCEPT=messagepack.MEDIA_TYPE)
+        self.assertEqual(resp["Content-Type"], messagepack.MEDIA_TYPE)
+        self.assertEqual(messagepack.unpackb(resp.content), json_resp.json())
+
+        resp = self.client.post(reverse("core:tenants-add-users", args=[f"{self.tenant.uuid}"]),
+                                messagepack.packb({"uuids": [self.users[1].uuid]}),
+                                content_type=messagepack.MEDIA_TYPE, HTTP_ACCEPT=messagepack.MEDIA_TYPE)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(messagepack.unpackb(resp.content), {"message": "Success"})
+        self.assertEqual(self.tenant.users.count(), 2)
+
+        resp = self.client.post(reverse("core:tenants-add-users", args=[f"{self.tenant.uuid}"]), b"\xc1",
+                                content_type=messagepack.MEDIA_TYPE)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schema(self):
+        """
+        Test that the OpenAPI schema documents the MessagePack requests and responses.
+        """
+        schema = self.client.get(reverse("core:schema.spec"), HTTP_ACCEPT="application/json").json()
+        operation = schema["paths"]["/api/tenants/{uuid}/add_users/"]["post"]
+        self.assertIn(messagepack.MEDIA_TYPE, operation["requestBody"]["content"])
+        self.assertIn(messagepack.MEDIA_TYPE, operation["responses"]["200"]["content"])
+
+    def test_batch(self):
+        """
+        Test that a MessagePack batch request gets its sub-responses as data, not as rendered MessagePack.
+        """
+        resp = self.client.post(reverse("core:batch"),
+                                messagepack.packb({"requests": [{"method": "GET", "path": reverse("core:users-me")}]}),
+                                content_type=messagepack.MEDIA_TYPE, HTTP_ACCEPT=messagepack.MEDIA_TYPE)
+        self.assertEqual(messagepack.unpackb(resp.content)[0]["body"]["email"], self.users[0].email)
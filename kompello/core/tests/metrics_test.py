@@ -0,0 +1,39 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+@override_settings(METRICS_TOKEN="metrics-token")
+class MetricsTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(1)
+
+    def test_server_timing(self):
+        """
+        Test that every response reports the request phases in the Server-Timing header.
+        """
+        self._login(email=self.users[0].email, password=USER_PASSWORD)
+        resp = self.client.get(reverse("core:users-me"))
+        phases = [part.split(";")[0] for part in resp["Server-Timing"].split(", ")]
+        self.assertEqual(phases, ["db", "auth", "serialize", "render", "total"])
+
+    def test_metrics_endpoint(self):
+        """
+        Test that the metrics endpoint requires the token and reports the requests per URL name
+        in the Prometheus text format.
+        """
+        self._login(email=self.users[0].email, password=USER_PASSWORD)
+        self.client.get(reverse("core:users-me"))
+        self.client.credentials()
+
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+
+        resp = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer metrics-token")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        body = resp.content.decode()
+        self.assertIn("# TYPE kompello_request_duration_seconds histogram", body)
+        self.assertIn('kompello_request_duration_seconds_bucket{view="core:users-me",method="GET",le="+Inf"}', body)
+        self.assertIn('kompello_requests_total{view="core:auth.standard",method="POST",status="200"}', body)
+        self.assertIn('kompello_request_db_queries_count{view="core:users-me"}', body)
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import override_settings
+from django.urls import path, reverse
+
+from kompello.core.tests.helpers import BaseTestCase
+
+calls = []
+
+
+def _fail(request):
+    raise ValueError("boom")
+
+
+urlpatterns = [path("api/fail", _fail)]
+
+
+class RecordingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        calls.append("call")
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        calls.append("view")
+
+    def process_exception(self, request, exception):
+        calls.append("exception")
+        return HttpResponse("handled", status=418)
+
+
+def _with_api_middleware(middleware: list[str]) -> dict:
+    return {**settings.MIDDLEWARE_PROFILES, "api": {**settings.MIDDLEWARE_PROFILES["api"], "MIDDLEWARE": middleware}}
+
+
+class MiddlewareProfilesTest(BaseTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_api_profile(self):
+        """
+        Test that API requests skip the session, CSRF and clickjacking middleware.
+        """
+        resp = self.client.get(reverse("core:schema.spec"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.wsgi_request.middleware_profile.name, "api")
+        self.assertNotIn("X-Frame-Options", resp)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, resp.cookies)
+        self.assertFalse(hasattr(resp.wsgi_request, "session"))
+
+    def test_full_profile(self):
+        """
+        Test that the excluded HTML pages of the API go through the full middleware.
+        """
+        resp = self.client.get(reverse("core:schema.swagger"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.wsgi_request.middleware_profile.name, "full")
+        self.assertEqual(resp["X-Frame-Options"], "DENY")
+        self.assertTrue(hasattr(resp.wsgi_request, "session"))
+
+    def test_hooks_are_delegated(self):
+        """
+        Test that the view and exception hooks of the middleware of a profile are called.
+        """
+        with override_settings(MIDDLEWARE_PROFILES=_with_api_middleware([f"{__name__}.RecordingMiddleware"])):
+            resp = self.client.get(reverse("core:schema.spec"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(calls, ["call", "view"])
+
+    def test_exceptions_are_delegated(self):
+        """
+        Test that the exception hook of the middleware of a profile can handle the exceptions of a view.
+        """
+        with override_settings(MIDDLEWARE_PROFILES=_with_api_middleware([f"{__name__}.RecordingMiddleware"])):
+            with self.settings(ROOT_URLCONF=__name__):
+                resp = self.client.get("/api/fail")
+        self.assertEqual(resp.status_code, 418)
+        self.assertEqual(calls, ["call", "view", "exception"])
@@ -0,0 +1,57 @@
+import pstats
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class ProfilingTest(BaseTestCase):
+    def setUp(self):
+        self.admin_users = self._create_admin_user(1)
+        self.users = self._create_user(1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        profiling = override_settings(PROFILING={**settings.PROFILING, "DIRECTORY": self.directory, "MAX_PROFILES": 2})
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+
+    def test_staff_can_profile(self):
+        """
+        Test that a staff user gets a profile for a request with the profile header, which can be listed
+        and downloaded, and that only the newest MAX_PROFILES profiles are kept.
+        """
+        self._login(email=self.admin_users[0].email, password=USER_PASSWORD)
+        names = []
+        for _ in range(3):
+            resp = self.client.get(reverse("core:users-me"), HTTP_X_KOMPELLO_PROFILE="1")
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            names.append(resp["X-KOMPELLO-PROFILE-ID"])
+
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), sorted(names[1:]))
+        pstats.Stats(str(self.directory / names[-1]))
+
+        resp = self.client.get(reverse("core:profiles-list"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 2)
+
+        resp = self.client.get(reverse("core:profiles-detail", args=[names[-1]]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(resp.streaming_content), (self.directory / names[-1]).read_bytes())
+
+    def test_user_cannot_profile(self):
+        """
+        Test that the profile header is ignored for non staff users and that they can't list profiles.
+        """
+        self._login(email=self.users[0].email, password=USER_PASSWORD)
+        resp = self.client.get(reverse("core:users-me"), HTTP_X_KOMPELLO_PROFILE="1")
+        self.assertNotIn("X-KOMPELLO-PROFILE-ID", resp)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+        resp = self.client.get(reverse("core:profiles-list"))
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,203 @@
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kompello.core import urls
+from kompello.core.helper.throttling import reset_throttles
+from kompello.core.models.auth_models import Tenant, TenantRole
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class Budget:
+    """
+    Maximum number of queries for one request to an endpoint.
+
+    ``args`` and ``data`` are callables that get the test case and return the URL args and the request body.
+    ``user`` is the attribute of the test case that sends the request, None sends it anonymously.
+    The body is sent as JSON unless a ``content_type`` is given.
+    """
+
+    def __init__(self, name, method, max_queries, status_code=status.HTTP_200_OK, user="member", args=None, data=None,
+                 content_type=None):
+        self.name = name
+        self.method = method
+        self.max_queries = max_queries
+        self.status_code = status_code
+        self.user = user
+        self.args = args or (lambda case: [])
+        self.data = data or (lambda case: None)
+        self.content_type = content_type
+
+    def __str__(self):
+        return f"{self.method.upper()} {self.name}"
+
+
+def _self(case):
+    return [f"{case.member.uuid}"]
+
+
+def _tenant(case):
+    return [f"{case.tenant.uuid}"]
+
+
+def _all_uuids(case):
+    return {"uuids": [f"{user.uuid}" for user in case.bulk_users]}
+
+
+def _all_users(case):
+    return {"users": [f"{user.uuid}" for user in [case.member, *case.bulk_users]]}
+
+
+def _startup_batch(case):
+    return {"requests": [
+        {"method": "GET", "path": reverse("core:users-me")},
+        {"method": "GET", "path": reverse("core:users-permissions", args=[f"{case.member.uuid}"])},
+        {"method": "GET", "path": reverse("core:tenants-list")},
+        {"method": "GET", "path": reverse("core:tenants-users", args=[f"{case.tenant.uuid}"])},
+    ]}
+
+
+BUDGETS = [
+    Budget("core:schema.spec", "get", 0, user=None),
+    Budget("core:schema.swagger", "get", 0, user=None),
+    Budget("core:auth.social", "post", 0, status.HTTP_400_BAD_REQUEST, user=None,
+           data=lambda case: {"provider": "unknown", "access_token": "token", "id_token": "token"}),
+    Budget("core:auth.standard", "post", 1, user=None,
+           data=lambda case: {"username": case.member.email, "password": USER_PASSWORD}),
+    Budget("core:auth.register", "post", 2, user=None,
+           data=lambda case: {"email": "new@email.com", "password": USER_PASSWORD, "password_repeated": USER_PASSWORD,
+                              "first_name": "New", "last_name": "User"}),
+    Budget("core:auth.refresh", "post", 4, user=None,
+           data=lambda case: {"refresh": str(RefreshToken.for_user(case.member))}),
+    Budget("core:auth.revoke", "post", 3, status.HTTP_204_NO_CONTENT, user=None,
+           data=lambda case: {"refresh": str(RefreshToken.for_user(case.member))}),
+    Budget("core:batch", "post", 7, data=_startup_batch),
+    Budget("core:users-list", "get", 2, user="admin"),
+    Budget("core:users-list", "post", 2, status.HTTP_201_CREATED, user=None,
+           data=lambda case: {"email": "new@email.com", "password": USER_PASSWORD, "first_name": "New",
+                              "last_name": "User"}),
+    Budget("core:users-detail", "get", 2, args=_self),
+    Budget("core:users-detail", "put", 7, args=_self,
+           data=lambda case: {"email": case.member.email, "password": USER_PASSWORD, "first_name": "New",
+                              "last_name": "Name"}),
+    Budget("core:users-detail", "patch", 4, args=_self, data=lambda case: {"first_name": "New"}),
+    Budget("core:users-detail", "delete", 8, status.HTTP_204_NO_CONTENT, args=_self),
+    Budget("core:users-me", "get", 1),
+    Budget("core:users-changes", "get", 3, user="admin"),
+    Budget("core:users-import", "post", 5, user="admin", content_type="text/csv",
+           data=lambda case: "email,first_name,last_name\nimport@email.com,New,User\n"),
+    Budget("core:users-set-password", "post", 4, args=_self, data=lambda case: {"password": "NewPassword"}),
+    Budget("core:users-permissions", "get", 3, args=_self),
+    Budget("core:tenants-list", "get", 2),
+    Budget("core:tenants-list", "post", 7, status.HTTP_201_CREATED, data=lambda case: {"slug": "new", "name": "New"}),
+    Budget("core:tenants-detail", "get", 3, args=_tenant),
+    Budget("core:tenants-detail", "put", 4, args=_tenant, data=lambda case: {"slug": "new", "name": "New"}),
+    Budget("core:tenants-detail", "patch", 4, args=_tenant, data=lambda case: {"name": "New"}),
+    Budget("core:tenants-detail", "delete", 9, status.HTTP_204_NO_CONTENT, args=_tenant),
+    Budget("core:tenants-users", "get", 4, args=_tenant),
+    Budget("core:tenants-add-users", "post", 5, args=_tenant, data=_all_uuids),
+    Budget("core:tenants-remove-users", "post", 9, args=_tenant, data=_all_uuids),
+    Budget("core:tenants-roles", "post", 4, args=_tenant,
+           data=lambda case: {"user": f"{case.member.uuid}", "role": "owner"}),
+    Budget("core:tenants-memberships", "post", 4,
+           data=lambda case: {"action": "add", "tenants": [f"{case.tenant.uuid}"], **_all_users(case)}),
+    Budget("core:tenants-changes", "get", 3),
+    Budget("core:tenants-memberships-changes", "get", 3),
+    Budget("core:profiles-list", "get", 1, user="admin"),
+    Budget("core:profiles-detail", "get", 1, status.HTTP_404_NOT_FOUND, user="admin",
+           args=lambda case: ["missing.prof"]),
+    Budget("core:slow-queries-list", "get", 1, user="admin"),
+    Budget("core:deletion-jobs-list", "get", 2, user="admin"),
+    Budget("core:deletion-jobs-detail", "get", 2, status.HTTP_404_NOT_FOUND, user="admin",
+           args=lambda case: [uuid.uuid4()]),
+]
+
+SIZES = (1, 10, 1000)
+
+
+@override_settings(
+    RESPONSE_CACHE={**settings.RESPONSE_CACHE, "ENABLED": False},
+    PROFILING={**settings.PROFILING, "DIRECTORY": tempfile.gettempdir()},
+    BATCH={**settings.BATCH, "MAX_WORKERS": 1},
+)
+class QueryBudgetTest(BaseTestCase):
+    """
+    Runs every endpoint against datasets of growing size and fails when an endpoint
+    needs more queries than its budget or when its query count grows with the data.
+    """
+
+    def setUp(self):
+        self.admin = self._create_admin_user(1)[0]
+        self.member = self._create_user(1)[0]
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(self.member, through_defaults={"role": TenantRole.OWNER})
+        self.bulk_users = []
+
+    def _grow(self, size):
+        """
+        Grows the dataset to ``size`` users in the tenant of the member and ``size`` tenants of the member
+        """
+        users = self._bulk_create_users(size - len(self.bulk_users), prefix=f"size{size}-")
+        tenants = Tenant.objects.bulk_create([
+            Tenant(slug=f"size{size}-{i}", name=f"Tenant {i}") for i in range(len(users))
+        ])
+        self.tenant.users.add(*users)
+        self.member.tenants.add(*tenants)
+        self.bulk_users += users
+
+    def _measure(self, budget) -> int:
+        reset_throttles()
+        user = getattr(self, budget.user) if budget.user else None
+        if user is None:
+            self.client.credentials()
+        else:
+            self._authenticate(user)
+
+        request = getattr(self.client, budget.method)
+        path = reverse(budget.name, args=budget.args(self))
+        data = budget.data(self)
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                if budget.content_type:
+                    resp = request(path, data, content_type=budget.content_type)
+                else:
+                    resp = request(path, data, format='json')
+            transaction.set_rollback(True)
+
+        self.assertEqual(resp.status_code, budget.status_code, f"{budget}: {resp.content[:200]}")
+        return len(queries)
+
+    def test_all_routes_have_budgets(self):
+        """
+        Test that every route in kompello/core/urls.py has at least one budget.
+        """
+        names = {f"core:{pattern.name}" for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names - {budget.name for budget in BUDGETS}, set())
+
+    def test_query_budgets(self):
+        """
+        Test that no endpoint exceeds its query budget and that the number of queries of every endpoint
+        is the same for 1, 10 and 1000 users and tenants.
+        """
+        # Warm up process wide caches, like the content types, so they don't count for the first size
+        for budget in BUDGETS:
+            self._measure(budget)
+
+        counts = {str(budget): [] for budget in BUDGETS}
+        for size in SIZES:
+            self._grow(size)
+            for budget in BUDGETS:
+                counts[str(budget)].append(self._measure(budget))
+
+        for budget in BUDGETS:
+            with self.subTest(budget=str(budget)):
+                measured = counts[str(budget)]
+                self.assertEqual(len(set(measured)), 1, f"{budget} grows with the data: {dict(zip(SIZES, measured))}")
+                self.assertLessEqual(measured[0], budget.max_queries, f"{budget} exceeds its budget")
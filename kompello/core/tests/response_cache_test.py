@@ -0,0 +1,99 @@
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.response_cache import LocMemLRUBackend
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class ResponseCacheTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(3)
+        self.tenants = self._create_tenant(1)
+        self.tenants[0].users.add(self.users[0])
+
+    def test_hit_skips_view(self):
+        """
+        Test that a repeated GET is answered from the cache.
+
+        The second request only needs the query that authenticates the user and returns the same bytes.
+        """
+        self._login(email=self.users[0].email, password=USER_PASSWORD)
+        first = self.client.get(reverse("core:users-me"))
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse("core:users-me"))
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second["Content-Type"], "application/json")
+
+    def test_user_update_invalidates(self):
+        """
+        Test that updating a user invalidates the cached users/me response and the tenant user list.
+        """
+        self._login(email=self.users[0].email, password=USER_PASSWORD)
+        self.client.get(reverse("core:users-me"))
+        self.client.get(reverse("core:tenants-users", args=[f"{self.tenants[0].uuid}"]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse("core:users-detail", args=[f"{self.users[0].uuid}"]), {"first_name": "Changed"},
+                              format='json')
+
+        self.assertEqual(self.client.get(reverse("core:users-me")).json()["first_name"], "Changed")
+        users = self.client.get(reverse("core:tenants-users", args=[f"{self.tenants[0].uuid}"])).json()
+        self.assertEqual(users[0]["first_name"], "Changed")
+
+    def test_membership_change_invalidates(self):
+        """
+        Test that membership changes invalidate the cached tenant responses.
+
+        A user that is removed from a tenant must not get the cached tenant detail anymore and the tenant
+        list of a user that is added must contain the tenant.
+        """
+        tenant_url = reverse("core:tenants-detail", args=[f"{self.tenants[0].uuid}"])
+
+        self._login(email=self.users[1].email, password=USER_PASSWORD)
+        self.assertEqual(len(self.client.get(reverse("core:tenants-list")).json()), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenants[0].users.add(self.users[1])
+        self.assertEqual(len(self.client.get(reverse("core:tenants-list")).json()), 1)
+        self.assertEqual(self.client.get(tenant_url).status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].tenants.remove(self.tenants[0])
+        self.assertEqual(self.client.get(tenant_url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_shared_between_members(self):
+        """
+        Test that the members of a tenant share its cached responses and that other users are still refused.
+        """
+        self.tenants[0].users.add(self.users[1])
+        url = reverse("core:tenants-users", args=[f"{self.tenants[0].uuid}"])
+        self._authenticate(self.users[0])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+
+        self._authenticate(self.users[1])
+        with self.assertNumQueries(2):
+            second = self.client.get(url)
+        self.assertEqual(second.content, first.content)
+
+        self._authenticate(self.users[2])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.get(reverse("core:tenants-detail", args=["00000000-0000-4000-8000-000000000000"]))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_lru_eviction(self):
+        """
+        Test that the memory backend evicts the least recently used entries once it is full.
+        """
+        backend = LocMemLRUBackend(MAX_BYTES=10)
+        backend.set("a", "text/plain", b"1234")
+        backend.set("b", "text/plain", b"1234")
+        backend.get("a")
+        backend.set("c", "text/plain", b"1234")
+
+        self.assertIsNotNone(backend.get("a"))
+        self.assertIsNone(backend.get("b"))
+        self.assertIsNotNone(backend.get("c"))
+        self.assertEqual(backend.size, 8)
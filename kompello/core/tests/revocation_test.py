@@ -0,0 +1,102 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from kompello.core.helper.invalidation_bus import bus
+from kompello.core.helper.revocation import revocations
+from kompello.core.models.token_models import RevokedToken
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class RevocationTest(BaseTestCase):
+    def setUp(self):
+        self.user = self._create_user(1)[0]
+
+    def _refresh(self, token: str):
+        return self.client.post(reverse("core:auth.refresh"), {"refresh": token}, format="json")
+
+    def test_refresh_rotates_tokens(self):
+        """
+        Test that a refresh returns a new refresh token and that the used one can't be used again.
+        """
+        token = str(RefreshToken.for_user(self.user))
+        resp = self._refresh(token)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("access", resp.data)
+        self.assertNotEqual(resp.data["refresh"], token)
+
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._refresh(resp.data["refresh"]).status_code, status.HTTP_200_OK)
+
+    def test_revoke(self):
+        """
+        Test that a revoked refresh token can neither be used nor revoked again.
+        """
+        token = str(RefreshToken.for_user(self.user))
+        resp = self.client.post(reverse("core:auth.revoke"), {"refresh": token}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+
+        self.assertEqual(self._refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+        resp = self.client.post(reverse("core:auth.revoke"), {"refresh": token}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_checks_are_in_memory(self):
+        """
+        Test that the revoked tokens are loaded once and revocations of other workers arrive through the bus.
+        """
+        RevokedToken.objects.create(jti="stored", expires_at=timezone.now() + timedelta(days=1))
+        with self.assertNumQueries(1):
+            self.assertTrue(revocations.is_revoked("stored"))
+            self.assertFalse(revocations.is_revoked("other"))
+
+        bus._dispatch("revoked_tokens", f"other:{int(time.time()) + 60}")
+        with self.assertNumQueries(0):
+            self.assertTrue(revocations.is_revoked("other"))
+
+    def test_concurrent_revocation(self):
+        """
+        Test that only the first revocation of a token succeeds.
+        """
+        exp = int(time.time()) + 60
+        self.assertTrue(revocations.revoke("jti", exp))
+        self.assertFalse(revocations.revoke("jti", exp))
+
+    def test_sweep(self):
+        """
+        Test that expired tokens are removed from memory and from the table.
+        """
+        revocations.is_revoked("jti")
+        with self.captureOnCommitCallbacks(execute=True):
+            revocations.revoke("expired", int(time.time()) - 1)
+            revocations.revoke("valid", int(time.time()) + 60)
+        revocations.sweep(force=True)
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["valid"])
+        self.assertFalse(revocations.is_revoked("expired"))
+        self.assertTrue(revocations.is_revoked("valid"))
+
+    def test_revocation_during_load(self):
+        """
+        Test that a revocation that arrives while the revoked tokens are loaded is not lost.
+        """
+        revocations.reset()
+        expires_at = timezone.now() + timedelta(days=1)
+        arrived = threading.Thread(target=bus._dispatch, args=("revoked_tokens", f"other:{int(time.time()) + 60}"))
+
+        def values_list(*fields):
+            # The event arrives after the query ran, before its result is stored
+            arrived.start()
+            arrived.join(0.2)
+            return [("stored", expires_at)]
+
+        with mock.patch.object(RevokedToken.objects, "filter") as filter_:
+            filter_.return_value.values_list.side_effect = values_list
+            self.assertTrue(revocations.is_revoked("stored"))
+        arrived.join(5)
+        self.assertTrue(revocations.is_revoked("other"))
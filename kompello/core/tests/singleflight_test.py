@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.singleflight import Singleflight
+from kompello.core.singleflight_middleware import SingleflightMiddleware
+from kompello.core.tests.helpers import BaseTestCase
+
+
+class SingleflightTest(BaseTestCase):
+    def _concurrently(self, flight, key, count, release):
+        """
+        Calls ``flight.do`` from ``count`` threads, the first call blocks until ``release`` is set
+        """
+        calls = []
+        started = threading.Event()
+
+        def work():
+            calls.append(True)
+            started.set()
+            release.wait(5)
+            return len(calls)
+
+        with ThreadPoolExecutor(count) as pool:
+            leader = pool.submit(flight.do, key, work)
+            started.wait(5)
+            followers = [pool.submit(flight.do, key, work) for _ in range(count - 1)]
+            # Gives the followers time to reach the flight before the leader finishes
+            time.sleep(0.2)
+            release.set()
+            return calls, leader.result(), [follower.result() for follower in followers]
+
+    def test_threads_share_result(self):
+        """
+        Test that concurrent threads with the same key run the function once and share its result.
+        """
+        flight = Singleflight()
+        calls, leader, followers = self._concurrently(flight, "key", 5, threading.Event())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(leader, (1, False))
+        self.assertEqual(followers, [(1, True)] * 4)
+        self.assertEqual(flight._calls, {})
+        self.assertEqual(flight.do("key", lambda: 2), (2, False))
+
+    def test_errors_are_shared(self):
+        """
+        Test that the followers get the exception of the leader and that the key is released.
+        """
+        flight = Singleflight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("failed")
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(flight.do, "key", fail)
+            while "key" not in flight._calls:
+                pass
+            follower = pool.submit(flight.do, "key", lambda: "own")
+            release.set()
+            self.assertRaises(ValueError, leader.result)
+            self.assertRaises(ValueError, follower.result)
+        self.assertEqual(flight.do("key", lambda: "own"), ("own", False))
+
+    @override_settings(SINGLEFLIGHT={**settings.SINGLEFLIGHT, "TIMEOUT": 0.01})
+    def test_timeout(self):
+        """
+        Test that a follower runs the function itself when the leader takes longer than the timeout.
+        """
+        flight = Singleflight()
+        release = threading.Event()
+        with ThreadPoolExecutor(1) as pool:
+            leader = pool.submit(flight.do, "key", lambda: release.wait(5) and "leader")
+            while "key" not in flight._calls:
+                pass
+            self.assertEqual(flight.do("key", lambda: "own"), ("own", False))
+            release.set()
+            self.assertEqual(leader.result(), ("leader", False))
+
+    def test_coroutines_share_result(self):
+        """
+        Test that concurrent coroutines share one call and that a cancelled leader doesn't fail its followers.
+        """
+        flight = Singleflight()
+        calls = []
+
+        async def work():
+            calls.append(True)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def run():
+            results = await asyncio.gather(*[flight.ado("key", work) for _ in range(3)])
+            leader = asyncio.ensure_future(flight.ado("cancelled", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.ado("cancelled", work))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return results, await follower
+
+        results, follower = async_to_sync(run)()
+        self.assertEqual(results, [(1, False), (1, True), (1, True)])
+        self.assertEqual(follower, (3, False))
+
+    def test_middleware(self):
+        """
+        Test that identical concurrent GETs get copies of one response and that other requests aren't coalesced.
+        """
+        release = threading.Event()
+        calls = []
+
+        def view(request):
+            calls.append(request.get_full_path())
+            release.wait(5)
+            response = HttpResponse(b"body", content_type="text/plain", headers={"X-Call": str(len(calls))})
+            return response
+
+        middleware = SingleflightMiddleware(view)
+        factory = RequestFactory()
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(middleware, factory.get("/a", HTTP_AUTHORIZATION="Bearer 1"))
+            while not calls:
+                pass
+            follower = pool.submit(middleware, factory.get("/a", HTTP_AUTHORIZATION="Bearer 1"))
+            other_user = pool.submit(middleware, factory.get("/a", HTTP_AUTHORIZATION="Bearer 2"))
+            other_query = pool.submit(middleware, factory.get("/a?page=2", HTTP_AUTHORIZATION="Bearer 1"))
+            while len(calls) < 3:
+                pass
+            time.sleep(0.2)
+            release.set()
+            responses = [leader.result(), follower.result(), other_user.result(), other_query.result()]
+
+        self.assertEqual(len(calls), 3)
+        self.assertIsNot(responses[0], responses[1])
+        self.assertEqual(responses[1].content, b"body")
+        self.assertEqual(responses[1]["X-Call"], responses[0]["X-Call"])
+        middleware(factory.post("/a"))
+        self.assertEqual(len(calls), 4)
+
+    def test_async_middleware(self):
+        """
+        Test that identical concurrent GETs are coalesced under ASGI.
+        """
+        calls = []
+
+        async def view(request):
+            calls.append(True)
+            await asyncio.sleep(0.01)
+            return HttpResponse(b"body", content_type="text/plain")
+
+        middleware = SingleflightMiddleware(view)
+        factory = RequestFactory()
+
+        async def run():
+            return await asyncio.gather(*[middleware(factory.get("/a")) for _ in range(3)])
+
+        responses = async_to_sync(run)()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([response.content for response in responses], [b"body"] * 3)
+
+    def test_response_cache(self):
+        """
+        Test that cached views still return their responses with the coalesced miss path.
+        """
+        users = self._create_user(1)
+        tenant = self._create_tenant(1)[0]
+        tenant.users.add(users[0])
+        self._authenticate(users[0])
+        first = self.client.get(reverse("core:tenants-users", args=[f"{tenant.uuid}"]))
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        # The user and its permission in the tenant
+        with self.assertNumQueries(2):
+            second = self.client.get(reverse("core:tenants-users", args=[f"{tenant.uuid}"]))
+        self.assertEqual(first.content, second.content)
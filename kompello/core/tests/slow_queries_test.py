@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.slow_queries import normalize_sql, slow_query_log
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class SlowQueriesTest(BaseTestCase):
+    def setUp(self):
+        self.admin_users = self._create_admin_user(1)
+        self.users = self._create_user(1)
+        self.tenants = self._create_tenant(1)
+        self.tenants[0].users.add(self.users[0])
+        slow_query_log.clear()
+        self.addCleanup(slow_query_log.clear)
+
+    def test_normalize_sql(self):
+        """
+        Test that literals and placeholder lists are replaced, so equal queries share one entry.
+        """
+        self.assertEqual(
+            normalize_sql("SELECT a FROM t WHERE b = 'x' AND c = 12 AND d IN (%s, %s, %s)"),
+            "SELECT a FROM t WHERE b = ? AND c = ? AND d IN (...)",
+        )
+
+    def test_slow_query_is_recorded(self):
+        """
+        Test that a query above the threshold is recorded with its view, the calling code and a query plan,
+        that its parameters are redacted and that admins can list the recorded queries.
+        """
+        self._authenticate(self.users[0])
+        with override_settings(SLOW_QUERIES={**settings.SLOW_QUERIES, "THRESHOLD": 0}), \
+                self.assertLogs("kompello.slow_queries", "WARNING") as logs:
+            resp = self.client.get(reverse("core:tenants-list"))
+            self.client.credentials()
+            self.client.post(reverse("core:auth.standard"), {"username": self.users[0].email,
+                                                             "password": USER_PASSWORD}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse([line for line in logs.output if self.users[0].email in line or "pbkdf2" in line])
+
+        entry = next(entry for entry in slow_query_log.top() if "core_tenant_users" in entry["sql"])
+        self.assertEqual(entry["view"], "core:tenants-list")
+        self.assertIn("kompello/core/views/tenant_api_view.py", entry["caller"])
+        self.assertTrue(entry["plan"])
+        self.assertEqual(set(entry["params"]), {"int"})
+
+        self._authenticate(self.admin_users[0])
+        resp = self.client.get(reverse("core:slow-queries-list"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.data)
+        self.assertNotIn(self.users[0].email, resp.content.decode())
@@ -0,0 +1,118 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from kompello.core.helper.snapshot import SnapshotError, VERSION, export_tenant, import_tenant
+from kompello.core.models.auth_models import KompelloUser, KompelloUserSocialAuths, Tenant
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+class SnapshotTest(BaseTestCase):
+    def setUp(self):
+        self.admin = self._create_admin_user(1)[0]
+        self.users = self._create_user(3)
+        self.tenant = self._create_tenant(1)[0]
+        self.tenant.users.add(*self.users[:2])
+        KompelloUserSocialAuths.objects.create(user=self.users[0], provider="google-oauth2", sub="sub0")
+        for obj in (self.tenant, self.users[0]):
+            LogEntry.objects.create(content_type=ContentType.objects.get_for_model(obj), object_pk=str(obj.pk),
+                                    object_id=obj.pk, object_repr=str(obj), action=LogEntry.Action.UPDATE,
+                                    changes=json.dumps({"name": ["Old", "New"]}), actor=self.admin)
+
+    def _export(self) -> str:
+        file = io.StringIO()
+        export_tenant(self.tenant, file)
+        return file.getvalue()
+
+    def test_export(self):
+        """
+        Test that the snapshot has a versioned header followed by the users, social auths and audit history.
+        """
+        records = [json.loads(line) for line in self._export().splitlines()]
+        self.assertEqual(records[0]["version"], VERSION)
+        self.assertEqual(records[0]["tenant"]["uuid"], f"{self.tenant.uuid}")
+        self.assertEqual([record["type"] for record in records[1:]],
+                         ["user", "user", "social_auth", "log_entry", "log_entry"])
+        self.assertNotIn("is_superuser", records[1])
+
+    def test_import(self):
+        """
+        Test that an exported tenant is recreated with its users, memberships, social auths and history
+        after it and its users were deleted.
+        """
+        snapshot = self._export()
+        tenant_uuid = self.tenant.uuid
+        self.users[1].delete()
+        self.tenant.delete()
+        LogEntry.objects.all().delete()
+
+        tenant = import_tenant(io.StringIO(snapshot))
+        self.assertEqual(tenant.uuid, tenant_uuid)
+        self.assertEqual({user.email for user in tenant.users.all()}, {self.users[0].email, self.users[1].email})
+        restored = KompelloUser.objects.get(email=self.users[1].email)
+        self.assertTrue(restored.check_password(USER_PASSWORD))
+        self.assertEqual(KompelloUserSocialAuths.objects.count(), 1)
+        # Only the history of the tenant is imported, the first user already existed
+        self.assertEqual(list(LogEntry.objects.values_list("object_id", "actor")), [(tenant.pk, self.admin.pk)])
+
+        with self.assertRaises(SnapshotError):
+            import_tenant(io.StringIO(snapshot))
+
+    def test_import_version(self):
+        """
+        Test that snapshots of a newer version are rejected.
+        """
+        header, *records = self._export().splitlines()
+        header = json.dumps({**json.loads(header), "version": VERSION + 1})
+        with self.assertRaises(SnapshotError):
+            import_tenant(io.StringIO("\n".join([header, *records])))
+
+    def test_invalid_snapshot(self):
+        """
+        Test that snapshots with a malformed header or records are rejected with a SnapshotError.
+        """
+        header, *records = self._export().splitlines()
+        for broken in ({"format": "kompello-tenant-snapshot"}, {**json.loads(header), "tenant": None}, []):
+            with self.subTest(header=broken), self.assertRaises(SnapshotError):
+                import_tenant(io.StringIO("\n".join([json.dumps(broken), *records])))
+        with self.assertRaisesMessage(SnapshotError, "Invalid user record"):
+            import_tenant(io.StringIO("\n".join([header, json.dumps({"type": "user", "email": "a@b.com"})])),
+                          clone=True)
+
+    def test_import_keeps_uuids_unique(self):
+        """
+        Test that imported users whose uuid belongs to another user get a new one, with their history.
+        """
+        snapshot = self._export()
+        self.users[1].email = "changed@email.com"
+        self.users[1].save()
+
+        tenant = import_tenant(io.StringIO(snapshot), clone=True)
+        self.assertEqual(KompelloUser.all_objects.filter(uuid=self.users[1].uuid).count(), 1)
+        imported = tenant.users.get(email="user2@email.com")
+        self.assertNotEqual(imported.uuid, self.users[1].uuid)
+
+    def test_commands(self):
+        """
+        Test that a tenant can be cloned with the export_tenant and import_tenant commands.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tenant.ndjson.gz")
+            call_command("export_tenant", f"{self.tenant.uuid}", path)
+            with gzip.open(path, "rt") as file:
+                self.assertEqual(json.loads(file.readline())["tenant"]["slug"], self.tenant.slug)
+
+            call_command("import_tenant", path, clone=True, stdout=io.StringIO())
+            clone = Tenant.objects.exclude(pk=self.tenant.pk).get()
+            self.assertEqual(clone.users.count(), 2)
+            self.assertEqual(KompelloUser.objects.count(), 4)
+
+            with self.assertRaises(CommandError):
+                call_command("import_tenant", path)
@@ -1,8 +1,13 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
-from kompello.core.models.auth_models import Tenant
-from kompello.core.tests.helpers import BaseTestCase
+from kompello.core.helper.roles import ROLE_PERMISSIONS, TenantPermission, tenant_permissions
+from kompello.core.models.auth_models import Tenant, TenantMembership, TenantRole
+from kompello.core.models.change_models import MembershipChange
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
 
 
 class TenantViewModelTest(BaseTestCase):
@@ -41,6 +46,7 @@ class TenantViewModelTest(BaseTestCase):
         tenant = Tenant.objects.get(uuid=auth.data["uuid"])
         self.assertIsNotNone(tenant)
         self.assertIn(self.users[0], tenant.users.all())
+        self.assertEqual(TenantMembership.objects.get(tenant=tenant, kompellouser=self.users[0]).role, TenantRole.OWNER)
 
     def test_list(self):
         """
@@ -285,14 +291,14 @@ class TenantViewModelTest(BaseTestCase):
 
         This test verifies the behavior of the delete method in the tenant API view.
         It performs the following steps:
-        1. Creates a tenant and adds a user to it.
+        1. Creates a tenant and adds a user to it as its owner.
         2. Tests the authentication and authorization for a user who is not authenticated.
         3. Tests the authentication and authorization for a user who is authenticated.
         4. Verifies the status code of the responses.
 
         """
         tenants = self._create_tenant(1)
-        tenants[0].users.add(self.users[0])
+        tenants[0].users.add(self.users[0], through_defaults={"role": TenantRole.OWNER})
         tenants[0].save()
 
         no_auth, auth = self._test_auth_not_auth(
@@ -361,7 +367,7 @@ class TenantViewModelTest(BaseTestCase):
             "get"
         )
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 3)
+        self.assertEqual(len(resp.json()), 3)
 
     def test_add_users(self):
         """
@@ -419,3 +425,228 @@ class TenantViewModelTest(BaseTestCase):
         self.assertEqual(Tenant.objects.get(uuid=tenants[0].uuid).users.count(), 0)
 
 
+
+    def test_memberships(self):
+        """
+        Test case for adding and removing many users to and from many tenants with one request.
+
+        It checks that pairs and lists are both accepted, that unknown tenants and users are reported,
+        that users can only change tenants they are a member of and that cached tenant users are invalidated.
+        """
+        tenants = self._create_tenant(3)
+        tenants[0].users.add(self.users[0])
+        tenants[1].users.add(self.users[0])
+        path = reverse("core:tenants-memberships")
+        unknown = "00000000-0000-4000-8000-000000000000"
+
+        self.assertTrue(self._login(self.users[0].email, USER_PASSWORD))
+        self.assertEqual(len(self.client.get(reverse("core:tenants-users", args=[f"{tenants[0].uuid}"])).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(path, {
+                "action": "add",
+                "pairs": [[f"{tenants[1].uuid}", f"{self.users[1].uuid}"], [f"{tenants[1].uuid}", unknown]],
+                "tenants": [f"{tenants[0].uuid}"],
+                "users": [f"{user.uuid}" for user in self.users],
+            }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {"requested": 7, "changed": 5, "unknown_tenants": [], "unknown_users": [unknown]})
+        self.assertEqual(tenants[0].users.count(), 5)
+        self.assertEqual(tenants[1].users.count(), 2)
+        self.assertEqual(len(self.client.get(reverse("core:tenants-users", args=[f"{tenants[0].uuid}"])).data), 5)
+
+        resp = self.client.post(path, {
+            "action": "remove",
+            "tenants": [f"{tenants[0].uuid}", unknown],
+            "users": [f"{user.uuid}" for user in self.users[1:]],
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["changed"], 4)
+        self.assertEqual(resp.data["unknown_tenants"], [unknown])
+        self.assertEqual(tenants[0].users.count(), 1)
+
+        resp = self.client.post(path, {"action": "add", "pairs": [[f"{tenants[2].uuid}", f"{self.users[0].uuid}"]]},
+                                format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(resp.data.get("changed"), None)
+        self.assertEqual(tenants[2].users.count(), 0)
+
+        resp = self.client.post(path, {"action": "add", "tenants": [f"{tenants[0].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self._logout()
+
+        self.assertTrue(self._login(self.admin_users[0].email, USER_PASSWORD))
+        resp = self.client.post(path, {"action": "add", "pairs": [[f"{tenants[2].uuid}", f"{self.users[0].uuid}"]]},
+                                format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(tenants[2].users.count(), 1)
+
+    def test_memberships_of_many_tenants(self):
+        """
+        Test case for the bulk memberships of more tenants than one query can filter by.
+
+        It checks that all memberships are added and removed with their changes and that
+        pairs that weren't members are not recorded as removed.
+        """
+        tenants = Tenant.objects.bulk_create([Tenant(slug=f"many{i}", name=f"Many {i}") for i in range(1200)])
+        path = reverse("core:tenants-memberships")
+        pairs = [[f"{tenant.uuid}", f"{self.users[0].uuid}"] for tenant in tenants]
+        self._authenticate(self.admin_users[0])
+
+        resp = self.client.post(path, {"action": "add", "pairs": pairs}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["changed"], 1200)
+        self.assertEqual(TenantMembership.objects.filter(kompellouser=self.users[0]).count(), 1200)
+        self.assertEqual(MembershipChange.objects.filter(user=self.users[0], removed=False).count(), 1200)
+
+        resp = self.client.post(path, {"action": "remove", "pairs": pairs[:600] + [
+            [f"{tenant.uuid}", f"{self.users[1].uuid}"] for tenant in tenants
+        ]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["changed"], 600)
+        self.assertEqual(MembershipChange.objects.filter(user=self.users[0], removed=True).count(), 600)
+        self.assertFalse(MembershipChange.objects.filter(user=self.users[1]).exists())
+
+    @override_settings(MEMBERSHIPS={"MAX_PAIRS": 4})
+    def test_memberships_limit(self):
+        """
+        Test case for the size limit of the bulk memberships.
+
+        It checks that requests with more pairs than allowed, counting tenants times users, are rejected
+        before any tenant or user is loaded.
+        """
+        tenants = self._create_tenant(3)
+        self._authenticate(self.users[0])
+        data = {"action": "add", "tenants": [f"{tenant.uuid}" for tenant in tenants[:2]],
+                "users": [f"{user.uuid}" for user in self.users[:3]]}
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(reverse("core:tenants-memberships"), data, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse([query for query in queries if "core_tenant" in query["sql"]])
+
+        data["tenants"] = [f"{tenants[2].uuid}"]
+        resp = self.client.post(reverse("core:tenants-memberships"), data, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_sparse_fields(self):
+        """
+        Test case for limiting the returned fields with the fields parameter.
+
+        It checks that list, retrieve and the users of a tenant only return the requested fields,
+        that only their columns are read and that unknown fields are rejected.
+        """
+        tenants = self._create_tenant(2)
+        tenants[0].users.add(*self.users[:2])
+        tenants[1].users.add(self.users[0])
+        self._authenticate(self.users[0])
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse("core:tenants-list"), {"fields": "uuid,name"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, [{"uuid": f"{tenant.uuid}", "name": tenant.name} for tenant in tenants])
+        self.assertNotIn('"slug"', queries[-1]["sql"])
+
+        resp = self.client.get(reverse("core:tenants-detail", args=[f"{tenants[0].uuid}"]), {"fields": "slug"})
+        self.assertEqual(resp.data, {"slug": tenants[0].slug})
+
+        resp = self.client.get(reverse("core:tenants-users", args=[f"{tenants[0].uuid}"]), {"fields": "email"})
+        self.assertEqual(resp.data, [{"email": user.email} for user in self.users[:2]])
+
+        resp = self.client.get(reverse("core:tenants-list"), {"fields": "uuid,users"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(reverse("core:tenants-users", args=[f"{tenants[0].uuid}"]), {"fields": "password"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_roles(self):
+        """
+        Test case for the roles of the members of a tenant.
+
+        It checks that viewers can only read the tenant, that members can't delete it or change roles
+        and that owners can change the roles of the members.
+        """
+        tenants = self._create_tenant(1)
+        tenants[0].users.add(self.users[0], through_defaults={"role": TenantRole.OWNER})
+        tenants[0].users.add(self.users[1])
+        tenants[0].users.add(self.users[2], through_defaults={"role": TenantRole.VIEWER})
+        detail = reverse("core:tenants-detail", args=[f"{tenants[0].uuid}"])
+        roles = reverse("core:tenants-roles", args=[f"{tenants[0].uuid}"])
+
+        self._authenticate(self.users[2])
+        self.assertEqual(self.client.get(detail).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.patch(detail, {"name": "New"}, format="json").status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self._authenticate(self.users[1])
+        self.assertEqual(self.client.patch(detail, {"name": "New"}, format="json").status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.delete(detail).status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.post(roles, {"user": f"{self.users[1].uuid}", "role": "owner"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+        self._authenticate(self.users[0])
+        resp = self.client.post(roles, {"user": f"{self.users[2].uuid}", "role": "member"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(TenantMembership.objects.get(tenant=tenants[0], kompellouser=self.users[2]).role,
+                         TenantRole.MEMBER)
+        resp = self.client.post(roles, {"user": f"{self.users[3].uuid}", "role": "member"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.post(roles, {"user": f"{self.users[2].uuid}", "role": "admin"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self._authenticate(self.users[2])
+        self.assertEqual(self.client.patch(detail, {"name": "Newer"}, format="json").status_code, status.HTTP_200_OK)
+
+    def test_owners_are_protected(self):
+        """
+        Test case for removing and demoting owners.
+
+        It checks that members can't remove owners, neither one by one nor in bulk, and that no removal
+        or role change leaves a tenant without an owner.
+        """
+        tenants = self._create_tenant(1)
+        tenants[0].users.add(self.users[0], through_defaults={"role": TenantRole.OWNER})
+        tenants[0].users.add(*self.users[1:3])
+        remove = reverse("core:tenants-remove-users", args=[f"{tenants[0].uuid}"])
+        roles = reverse("core:tenants-roles", args=[f"{tenants[0].uuid}"])
+        memberships = reverse("core:tenants-memberships")
+
+        self._authenticate(self.users[1])
+        resp = self.client.post(remove, {"uuids": [f"{self.users[0].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.post(memberships, {"action": "remove", "tenants": [f"{tenants[0].uuid}"],
+                                              "users": [f"{self.users[0].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.post(remove, {"uuids": [f"{self.users[2].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        self._authenticate(self.users[0])
+        resp = self.client.post(remove, {"uuids": [f"{self.users[0].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.post(roles, {"user": f"{self.users[0].uuid}", "role": "member"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(TenantMembership.objects.filter(tenant=tenants[0], role=TenantRole.OWNER).count(), 1)
+
+        resp = self.client.post(roles, {"user": f"{self.users[1].uuid}", "role": "owner"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp = self.client.post(roles, {"user": f"{self.users[0].uuid}", "role": "member"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        self._authenticate(self.users[1])
+        resp = self.client.post(remove, {"uuids": [f"{self.users[0].uuid}"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(tenants[0].users.all()), [self.users[1]])
+
+    def test_permission_checks_load_the_role_once(self):
+        """
+        Test case for the per request cache of the roles.
+
+        It checks that the role of the user is loaded with one query and that every following check is in memory.
+        """
+        tenants = self._create_tenant(1)
+        tenants[0].users.add(self.users[0], through_defaults={"role": TenantRole.VIEWER})
+        request = type("Request", (), {"user": self.users[0]})()
+
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                permissions = tenant_permissions(request, tenants[0].pk)
+        self.assertEqual(permissions, ROLE_PERMISSIONS[TenantRole.VIEWER])
+        self.assertIn(TenantPermission.VIEW_MEMBERS, permissions)
+        self.assertNotIn(TenantPermission.MANAGE_MEMBERS, permissions)
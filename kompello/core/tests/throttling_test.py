@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from kompello.core.helper.throttling import SWEEP_INTERVAL, TokenBucketStore
+from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
+
+
+def _rates(**rates):
+    return {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}
+
+
+class ThrottlingTest(BaseTestCase):
+    def setUp(self):
+        self.users = self._create_user(2)
+
+    def test_token_bucket_refills(self):
+        """
+        Test that a bucket allows bursts up to its capacity and refills over time.
+
+        A bucket with 2 tokens per 10 seconds allows two requests, then reports a wait of 5 seconds
+        until the next token. After 5 seconds one token is available again.
+        """
+        store = TokenBucketStore()
+        self.assertEqual(store.consume("key", 2, 10, 0), 0)
+        self.assertEqual(store.consume("key", 2, 10, 0), 0)
+        self.assertEqual(store.consume("key", 2, 10, 0), 5)
+        self.assertEqual(store.consume("key", 2, 10, 5), 0)
+
+    def test_full_buckets_are_dropped(self):
+        """
+        Test that the buckets that refilled completely are dropped by the next sweep, and the others kept.
+        """
+        store = TokenBucketStore()
+        for i in range(100):
+            store.consume(f"spray{i}", 10, 60, 0)
+        self.assertEqual(len(store._buckets), 100)
+
+        store.consume("busy", 2, 10 * SWEEP_INTERVAL, SWEEP_INTERVAL)
+        store.consume("busy", 2, 10 * SWEEP_INTERVAL, SWEEP_INTERVAL)
+        self.assertEqual(set(store._buckets), {"busy"})
+        store.consume("other", 1, 1, SWEEP_INTERVAL * 2)
+        self.assertEqual(set(store._buckets), {"busy", "other"})
+        self.assertGreater(store.consume("busy", 2, 10 * SWEEP_INTERVAL, SWEEP_INTERVAL * 2), 0)
+
+    @override_settings(REST_FRAMEWORK=_rates(**{'auth.username': '2/min'}))
+    def test_username_throttle(self):
+        """
+        Test that failed logins for one username are throttled.
+
+        The first two attempts reach the view and fail, the third one is rejected with 429 and a Retry-After
+        header. Logins for another username are not affected.
+        """
+        data = {"username": self.users[0].email, "password": "wrong"}
+        for _ in range(2):
+            resp = self.client.post(reverse("core:auth.standard"), data, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        resp = self.client.post(reverse("core:auth.standard"), data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp["Retry-After"], "30")
+
+        self.assertTrue(self._login(email=self.users[1].email, password=USER_PASSWORD))
+
+    @override_settings(REST_FRAMEWORK=_rates(**{'auth.ip': '1/min'}))
+    def test_ip_throttle(self):
+        """
+        Test that the IP bucket is shared by all authentication endpoints.
+        """
+        resp = self.client.post(reverse("core:auth.standard"), {"username": "a@b.com", "password": "x"}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        resp = self.client.post(reverse("core:auth.register"), {}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", resp)
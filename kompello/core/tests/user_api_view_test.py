@@ -1,7 +1,10 @@
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 
-from kompello.core.models.auth_models import KompelloUser
+from kompello.core.models.auth_models import KompelloUser, Tenant, TenantRole
 from kompello.core.tests.helpers import BaseTestCase, USER_PASSWORD
 
 
@@ -228,3 +231,133 @@ class UserViewModelTest(BaseTestCase):
         self.assertEqual(no_auth.status_code, status.HTTP_401_UNAUTHORIZED)
         self.assertEqual(auth.status_code, status.HTTP_200_OK)
         self.assertTrue(self._login(email=user.email, password="NewPassword"))
+
+    @override_settings(USER_IMPORT={"CHUNK_SIZE": 2, "HASH_WORKERS": 0})
+    def test_import(self):
+        """
+        Test case for importing users from CSV and NDJSON.
+
+        It checks that only admins can import, that valid rows are created with a password, a password hash
+        or an unusable password, that they are added to the given tenant and that invalid rows are reported.
+        """
+        tenant = self._create_tenant(1)[0]
+        body = "\n".join([
+            "email,first_name,last_name,password,password_hash",
+            f"csv1@email.com,Csv,One,{USER_PASSWORD},",
+            f"csv2@email.com,Csv,Two,,{make_password('Hashed')}",
+            "csv3@email.com,Csv,Three,,",
+            "not-an-email,Csv,Four,,",
+            f"{self.users[0].email},Csv,Five,,",
+            "csv1@email.com,Csv,Six,,",
+            "csv7@email.com,Csv,Seven,,nohash",
+        ])
+        path = reverse("core:users-import") + f"?tenant={tenant.uuid}"
+
+        self.assertTrue(self._login(self.users[0].email, USER_PASSWORD))
+        self.assertEqual(self.client.post(path, body, content_type="text/csv").status_code, status.HTTP_403_FORBIDDEN)
+        self._logout()
+
+        self.assertTrue(self._login(self.admin_users[0].email, USER_PASSWORD))
+        resp = self.client.post(path, body, content_type="text/csv")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 3)
+        self.assertEqual([(error["row"], list(error["errors"])) for error in resp.data["errors"]], [
+            (5, ["email"]), (6, ["email"]), (7, ["email"]), (8, ["password_hash"]),
+        ])
+        self.assertTrue(KompelloUser.objects.get(email="csv1@email.com").check_password(USER_PASSWORD))
+        self.assertTrue(KompelloUser.objects.get(email="csv2@email.com").check_password("Hashed"))
+        self.assertFalse(KompelloUser.objects.get(email="csv3@email.com").has_usable_password())
+        self.assertEqual(tenant.users.count(), 3)
+
+        body = '{"email": "json1@email.com", "first_name": "Json", "last_name": "One"}\n\nnot json\n'
+        resp = self.client.post(reverse("core:users-import"), body, content_type="application/x-ndjson")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 1)
+        self.assertEqual([error["row"] for error in resp.data["errors"]], [3])
+
+        upload = SimpleUploadedFile("users.csv", b"email,first_name,last_name\nfile1@email.com,File,One\n")
+        resp = self.client.post(reverse("core:users-import"), {"file": upload}, format="multipart")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 1)
+
+        resp = self.client.post(reverse("core:users-import"), body, content_type="text/plain")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_collisions(self):
+        """
+        Test case for imported emails that are taken as email or as username, in any case.
+
+        It checks that they are reported as row errors while the other rows are created.
+        """
+        KompelloUser.objects.create_user("taken@email.com", "changed@email.com", USER_PASSWORD)
+        KompelloUser.objects.create_user("upper", "Upper@email.com", USER_PASSWORD)
+        body = "\n".join(["email,first_name,last_name", "TAKEN@email.com,Taken,User", "upper@EMAIL.com,Upper,User",
+                          "new@email.com,New,User"])
+        self._authenticate(self.admin_users[0])
+        resp = self.client.post(reverse("core:users-import"), body, content_type="text/csv")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 1)
+        self.assertEqual(resp.data["errors"], [
+            {"row": 2, "errors": {"email": ["A user with this email as username already exists"]}},
+            {"row": 3, "errors": {"email": ["A user with this email already exists"]}},
+        ])
+
+    @override_settings(USER_IMPORT={"CHUNK_SIZE": 10, "HASH_WORKERS": 2})
+    def test_import_hash_workers(self):
+        """
+        Test case for hashing the passwords of an import in spawned worker processes.
+        """
+        body = "\n".join(["email,first_name,last_name,password"]
+                         + [f"pool{i}@email.com,Pool,{i},Password{i}" for i in range(3)])
+        self._authenticate(self.admin_users[0])
+        resp = self.client.post(reverse("core:users-import"), body, content_type="text/csv")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["created"], 3)
+        for i in range(3):
+            self.assertTrue(KompelloUser.objects.get(email=f"pool{i}@email.com").check_password(f"Password{i}"))
+
+    def test_sparse_fields(self):
+        """
+        Test that list, retrieve and me only return the fields of the fields parameter,
+        that write only and unknown fields are rejected and that updates still return all fields.
+        """
+        user = self.users[0]
+        self._authenticate(self.admin_users[0])
+        resp = self.client.get(reverse("core:users-list"), {"fields": "uuid, email"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data[1], {"uuid": f"{user.uuid}", "email": user.email})
+        resp = self.client.get(reverse("core:users-list"), {"fields": "password"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.get(reverse("core:users-list"), {"fields": ""})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self._authenticate(user)
+        resp = self.client.get(reverse("core:users-detail", args=[f"{user.uuid}"]), {"fields": "first_name"})
+        self.assertEqual(resp.data, {"first_name": user.first_name})
+        resp = self.client.get(reverse("core:users-me"), {"fields": "last_name"})
+        self.assertEqual(resp.data, {"last_name": user.last_name})
+        resp = self.client.patch(f"{reverse('core:users-detail', args=[f'{user.uuid}'])}?fields=uuid",
+                                 {"first_name": "New"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["first_name"], "New")
+        self.assertEqual(resp.data["email"], user.email)
+
+    def test_tenant_permissions(self):
+        """
+        Test that the permissions of a user include the permissions of its role in the tenant of the tenant header.
+        """
+        user = self.users[0]
+        tenant = Tenant.objects.create(slug="roles", name="Roles")
+        tenant.users.add(user, through_defaults={"role": TenantRole.VIEWER})
+        self._authenticate(user)
+        path = reverse("core:users-permissions", args=[f"{user.uuid}"])
+
+        resp = self.client.get(path)
+        self.assertNotIn("tenant_permissions", resp.data)
+        resp = self.client.get(path, HTTP_X_KOMPELLO_TENANT=f"{tenant.uuid}")
+        self.assertEqual(resp.data["tenant_permissions"], ["view_tenant", "view_members"])
+
+        self._authenticate(self.admin_users[0])
+        resp = self.client.get(reverse("core:users-permissions", args=[f"{self.users[1].uuid}"]),
+                               HTTP_X_KOMPELLO_TENANT=f"{tenant.uuid}")
+        self.assertEqual(resp.data["tenant_permissions"], [])
@@ -1,6 +1,10 @@
 from django.urls import path
 from rest_framework import routers
-from kompello.core.views.auth_api_view import social_auth, password_auth, register
+from kompello.core.views.auth_api_view import social_auth, password_auth, register, revoke_token
+from kompello.core.views.batch_api_view import batch
+from kompello.core.views.deletion_job_api_view import DeletionJobViewSet
+from kompello.core.views.profile_api_view import ProfileViewSet
+from kompello.core.views.slow_query_api_view import SlowQueryViewSet
 from kompello.core.views.tenant_api_view import TenantViewSet
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenRefreshView
@@ -11,6 +15,9 @@ app_name = 'core'
 router = routers.SimpleRouter()
 router.register(r'users', UserViewSet, basename='users')
 router.register(r'tenants', TenantViewSet, basename='tenants')
+router.register(r'profiles', ProfileViewSet, basename='profiles')
+router.register(r'slow-queries', SlowQueryViewSet, basename='slow-queries')
+router.register(r'deletion-jobs', DeletionJobViewSet, basename='deletion-jobs')
 
 urlpatterns = [
     path('schema/', SpectacularAPIView.as_view(), name='schema.spec'),
@@ -19,6 +26,8 @@ urlpatterns = [
     path('auth/standard/', password_auth, name='auth.standard'),
     path('auth/register/', register, name='auth.register'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='auth.refresh'),
+    path('auth/revoke/', revoke_token, name='auth.revoke'),
+    path('batch/', batch, name='batch'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
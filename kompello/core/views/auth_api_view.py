@@ -1,10 +1,15 @@
 from drf_spectacular.utils import extend_schema
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework import serializers, status
 from rest_framework.request import Request
 from rest_framework.response import Response
 from kompello.core.auth import get_user_social_auth, parse_id_token
+from kompello.core.helper.last_login import last_logins
+from kompello.core.helper.revocation import RevocableRefreshToken, revocations
+from kompello.core.helper.throttling import AuthRateThrottle
 from rest_framework import exceptions
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 
@@ -22,6 +27,9 @@ class UserPasswordLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
 
+class RevokeTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
 class RegisterSerializer(serializers.Serializer):
     email = serializers.CharField()
     password = serializers.CharField()
@@ -40,6 +48,11 @@ class LoginResponseSerializer(serializers.Serializer):
     exprires_at = serializers.IntegerField()
     user = UserInformationSerializer()
 
+def _login_response(user: KompelloUser) -> Response:
+    last_logins.record(user.pk)
+    token = RefreshToken.for_user(user)
+    return Response(LoginResponseSerializer({"access_token": str(token.access_token), "refresh_token": str(token), "user": user, "exprires_at": token.access_token.payload["exp"]}).data)
+
 @extend_schema(
     request=SocialAuthLoginSerializer,
     responses={200: LoginResponseSerializer},
@@ -47,6 +60,7 @@ class LoginResponseSerializer(serializers.Serializer):
     operation_id="social_auth"
 )
 @api_view(['post'])
+@throttle_classes([AuthRateThrottle])
 def social_auth(request: Request):
     serializer = SocialAuthLoginSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -56,7 +70,7 @@ def social_auth(request: Request):
         if user is None:
             raise exceptions.NotAuthenticated("User not found") 
 
-        return Response(RefreshToken.for_user(user))         
+        return _login_response(user)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -67,6 +81,7 @@ def social_auth(request: Request):
     operation_id="password_auth"
 )
 @api_view(['post'])
+@throttle_classes([AuthRateThrottle])
 def password_auth(request: Request):
     serializer = UserPasswordLoginSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -74,9 +89,7 @@ def password_auth(request: Request):
     if user is None:
         raise exceptions.NotAuthenticated("User not found")
     
-    token = RefreshToken.for_user(user)
-
-    return Response(LoginResponseSerializer({"access_token": str(token.access_token), "refresh_token": str(token), "user": user, "exprires_at": token.access_token.payload["exp"]}).data)
+    return _login_response(user)
 
 @extend_schema(
     request=RegisterSerializer,
@@ -85,6 +98,7 @@ def password_auth(request: Request):
     operation_id="register"
 )
 @api_view(['post'])
+@throttle_classes([AuthRateThrottle])
 def register(request: Request):
     serializer = RegisterSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
@@ -92,14 +106,35 @@ def register(request: Request):
     if serializer.validated_data["password"] != serializer.validated_data["password_repeated"]:
         raise exceptions.ValidationError("Passwords do not match")
     
-    if KompelloUser.objects.filter(email=serializer.validated_data["email"]).exists():
+    if KompelloUser.all_objects.filter(email=serializer.validated_data["email"]).exists():
         raise exceptions.ValidationError("User with this email already exists")
     
     user = KompelloUser.objects.create_user(
+        username=serializer.validated_data["email"],
         email=serializer.validated_data["email"],
         password=serializer.validated_data["password"],
         first_name=serializer.validated_data["first_name"],
         last_name=serializer.validated_data["last_name"]
     )
     
-    return Response(RefreshToken.for_user(user))
+    return _login_response(user)
+
+@extend_schema(
+    request=RevokeTokenSerializer,
+    responses={204: None},
+    description="Revoke a refresh token, e.g. on logout",
+    operation_id="revoke_token"
+)
+@api_view(['post'])
+@throttle_classes([AuthRateThrottle])
+def revoke_token(request: Request):
+    serializer = RevokeTokenSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        refresh = RevocableRefreshToken(serializer.validated_data["refresh"])
+    except TokenError as e:
+        raise InvalidToken(e.args[0]) from e
+
+    if not revocations.revoke(refresh[api_settings.JTI_CLAIM], refresh["exp"]):
+        raise InvalidToken("Token is revoked")
+    return Response(status=status.HTTP_204_NO_CONTENT)
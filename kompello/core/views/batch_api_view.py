@@ -0,0 +1,48 @@
+from django.conf import settings
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from kompello.core.helper.batch import BatchDispatcher
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    path = serializers.RegexField(r"^/", help_text="Path of the API endpoint, e.g. /api/users/me/")
+    body = serializers.JSONField(required=False, allow_null=True, help_text="Sent as JSON")
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True)
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one request is required")
+        if len(value) > settings.BATCH["MAX_REQUESTS"]:
+            raise serializers.ValidationError(f"At most {settings.BATCH['MAX_REQUESTS']} requests are allowed")
+        return value
+
+
+class SubResponseSerializer(serializers.Serializer):
+    status = serializers.IntegerField()
+    body = serializers.JSONField(allow_null=True)
+
+
+@extend_schema(
+    request=BatchRequestSerializer,
+    responses={200: SubResponseSerializer(many=True)},
+    description="Send several API requests at once. They are authenticated once, use the tenant of the batch "
+                "request and their responses are returned in the order of the requests. "
+                "Consecutive GET requests run concurrently, every other request runs after the ones before it.",
+    operation_id="batch"
+)
+@api_view(['post'])
+@permission_classes([IsAuthenticated])
+def batch(request: Request):
+    serializer = BatchRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    dispatcher = BatchDispatcher(request._request, request.user, request.auth)
+    return Response(SubResponseSerializer(dispatcher.run(serializer.validated_data["requests"]), many=True).data)
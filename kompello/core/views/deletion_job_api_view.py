@@ -0,0 +1,41 @@
+from drf_spectacular.utils import extend_schema, extend_schema_view
+from rest_framework import serializers, viewsets
+from rest_framework.permissions import IsAdminUser
+
+from kompello.core.helper.deletion import steps
+from kompello.core.models.job_models import DeletionJob
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    steps = serializers.SerializerMethodField()
+    completed_steps = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DeletionJob
+        fields = ["uuid", "model", "object_uuid", "status", "step", "steps", "completed_steps", "deleted_rows", "error",
+                  "created_on", "modified_on", "finished_on"]
+
+    def get_steps(self, job) -> list[str]:
+        return steps(job)
+
+    def get_completed_steps(self, job) -> int:
+        names = steps(job)
+        if job.status == DeletionJob.Status.DONE:
+            return len(names)
+        return names.index(job.step) if job.step in names else 0
+
+
+@extend_schema_view(
+    list=extend_schema(description="List the background deletions of users and tenants with their progress",
+                       operation_id="deletion_jobs_list"),
+    retrieve=extend_schema(description="Get the progress of the background deletion of a user or tenant",
+                           operation_id="deletion_jobs_retrieve"),
+)
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    A viewset that reports the progress of the DeletionJobs
+    """
+    queryset = DeletionJob.objects.order_by("-pk")
+    serializer_class = DeletionJobSerializer
+    permission_classes = [IsAdminUser]
+    lookup_field = 'uuid'
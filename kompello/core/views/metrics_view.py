@@ -0,0 +1,17 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from kompello.core.helper.metrics import registry
+
+
+def metrics(request):
+    """
+    Exposes the metrics of this worker in the Prometheus text format.
+    Scrapers authenticate with the METRICS_TOKEN as bearer token, in DEBUG mode the endpoint is open.
+    """
+    token = (request.headers.get("Authorization") or "").removeprefix("Bearer ")
+    if not settings.DEBUG and not (settings.METRICS_TOKEN and hmac.compare_digest(token, settings.METRICS_TOKEN)):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+from django.http import FileResponse, Http404
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, viewsets
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from kompello.core.profiling_middleware import get_profile_directory
+
+
+class ProfileSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    size = serializers.IntegerField()
+    created_on = serializers.DateTimeField()
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    A viewset that lists and downloads the captured request profiles
+    """
+    permission_classes = [IsAdminUser]
+    lookup_field = 'name'
+    lookup_value_regex = r'[\w.-]+\.prof'
+
+    @extend_schema(
+        responses={200: ProfileSerializer(many=True)},
+        description="List the captured request profiles, newest first",
+        operation_id="profiles_list"
+    )
+    def list(self, request: Request):
+        profiles = []
+        for path in get_profile_directory().glob("*.prof"):
+            stat = path.stat()
+            profiles.append({
+                "name": path.name,
+                "size": stat.st_size,
+                "created_on": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+            })
+        profiles.sort(key=lambda profile: profile["created_on"], reverse=True)
+        return Response(ProfileSerializer(profiles, many=True).data)
+
+    @extend_schema(
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY},
+        description="Download a captured request profile in the pstats format",
+        operation_id="profiles_retrieve"
+    )
+    def retrieve(self, request: Request, name=None):
+        path = get_profile_directory() / name
+        if not path.is_file():
+            raise Http404
+        return FileResponse(path.open("rb"), as_attachment=True, filename=name)
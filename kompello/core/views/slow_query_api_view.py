@@ -0,0 +1,34 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, viewsets
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from kompello.core.helper.slow_queries import slow_query_log
+
+
+class SlowQuerySerializer(serializers.Serializer):
+    sql = serializers.CharField()
+    count = serializers.IntegerField()
+    total = serializers.FloatField()
+    max = serializers.FloatField()
+    params = serializers.ListField(child=serializers.CharField(), allow_null=True)
+    view = serializers.CharField(allow_null=True)
+    caller = serializers.CharField(allow_null=True)
+    plan = serializers.ListField(child=serializers.CharField(), allow_null=True)
+
+
+class SlowQueryViewSet(viewsets.ViewSet):
+    """
+    A viewset that lists the slowest queries of this worker
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(
+        responses={200: SlowQuerySerializer(many=True)},
+        description="List the slowest normalized queries with the types of their latest parameters, "
+                    "caller and query plan",
+        operation_id="slow_queries_list"
+    )
+    def list(self, request: Request):
+        return Response(SlowQuerySerializer(slow_query_log.top(), many=True).data)
@@ -1,16 +1,32 @@
-from drf_spectacular.utils import extend_schema
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import serializers, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from kompello.core.helper.serializers import SimpleResponseSerializer
-from kompello.core.models.auth_models import KompelloUser, Tenant
+from kompello.core.helper.changes import ChangesSerializer, changes, membership_changes
+from kompello.core.helper.deletion import soft_delete
+from kompello.core.helper.memberships import add_memberships, remove_memberships
+from kompello.core.helper.response_cache import cache_response, invalidate
+from kompello.core.helper.roles import (TenantPermission, remember_roles, role_subquery, tenant_owners,
+                                        tenant_permissions)
+from kompello.core.helper.serializers import (FIELDS_PARAMETER, SimpleResponseSerializer, SparseFieldsMixin,
+                                              SparseFieldsetMixin, only_fields, sparse_fields)
+from kompello.core.models.auth_models import KompelloUser, Tenant, TenantMembership, TenantRole
+from kompello.core.models.change_models import MembershipChange, Tombstone
 from kompello.core.views.user_api_view import UserSerializer
 
 
-class TenantSerializer(serializers.ModelSerializer):
+class TenantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Tenant
         fields = ['uuid', 'slug', 'name']
@@ -27,32 +43,94 @@ class TenantSerializer(serializers.ModelSerializer):
 
 class TenantPermissions(permissions.BasePermission):
     """
-    Allows a user to only access their own user object
+    Allows the members of a tenant the actions that their role permits,
+    see ``required_tenant_permissions`` of the view
     """
 
     def has_object_permission(self, request, view, obj):
-        return request.user in obj.users.all()
+        return view.required_tenant_permissions[view.action] in tenant_permissions(request, obj.pk)
+
+
+def check_owner_removal(request, pairs: set[tuple[int, int]]):
+    """
+    Only users that manage the roles of a tenant can remove its owners, and no tenant may lose its last owner
+    """
+    removed = defaultdict(set)
+    for tenant_pk, user_pk in pairs:
+        removed[tenant_pk].add(user_pk)
+    for tenant_pk, owners in tenant_owners(removed.keys()).items():
+        if not removed[tenant_pk] & owners:
+            continue
+        if TenantPermission.MANAGE_ROLES not in tenant_permissions(request, tenant_pk):
+            raise PermissionDenied("Only owners can remove owners")
+        if owners <= removed[tenant_pk]:
+            raise ValidationError("A tenant needs at least one owner")
 
 
 class UserUuidListSerializer(serializers.Serializer):
     uuids = serializers.ListField(child=serializers.UUIDField())
 
 
-class TenantViewSet(viewsets.ModelViewSet):
+class BulkMembershipSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=["add", "remove"])
+    pairs = serializers.ListField(
+        child=serializers.ListField(child=serializers.UUIDField(), min_length=2, max_length=2),
+        required=False, default=list, help_text="[tenant uuid, user uuid] pairs"
+    )
+    tenants = serializers.ListField(child=serializers.UUIDField(), required=False, default=list,
+                                    help_text="Adds or removes all users to or from all of these tenants")
+    users = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+
+    def validate(self, attrs):
+        if bool(attrs["tenants"]) != bool(attrs["users"]):
+            raise serializers.ValidationError("tenants and users must be given together")
+        if not attrs["pairs"] and not attrs["tenants"]:
+            raise serializers.ValidationError("Either pairs or tenants and users are required")
+        # Checked before the tenants and users are expanded to their pairs
+        if len(attrs["pairs"]) + len(attrs["tenants"]) * len(attrs["users"]) > settings.MEMBERSHIPS["MAX_PAIRS"]:
+            raise serializers.ValidationError(f"At most {settings.MEMBERSHIPS['MAX_PAIRS']} pairs are allowed")
+        return attrs
+
+
+class RoleSerializer(serializers.Serializer):
+    user = serializers.UUIDField()
+    role = serializers.ChoiceField(choices=TenantRole.choices)
+
+
+class BulkMembershipResponseSerializer(serializers.Serializer):
+    requested = serializers.IntegerField()
+    changed = serializers.IntegerField()
+    unknown_tenants = serializers.ListField(child=serializers.UUIDField())
+    unknown_users = serializers.ListField(child=serializers.UUIDField())
+
+
+@extend_schema_view(list=extend_schema(parameters=[FIELDS_PARAMETER]),
+                    retrieve=extend_schema(parameters=[FIELDS_PARAMETER]))
+class TenantViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     A viewset that serializes Users
     """
     queryset = Tenant.objects.all()
     serializer_class = TenantSerializer
     lookup_field = 'uuid'
+    required_tenant_permissions = {
+        'retrieve': TenantPermission.VIEW_TENANT,
+        'update': TenantPermission.CHANGE_TENANT,
+        'partial_update': TenantPermission.CHANGE_TENANT,
+        'destroy': TenantPermission.DELETE_TENANT,
+        'users': TenantPermission.VIEW_MEMBERS,
+        'add_users': TenantPermission.MANAGE_MEMBERS,
+        'remove_users': TenantPermission.MANAGE_MEMBERS,
+        'roles': TenantPermission.MANAGE_ROLES,
+    }
 
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
         """
-        if self.action in ('list', 'create'):
+        if self.action in ('list', 'create', 'memberships', 'changes', 'membership_changes'):
             permission_classes = [IsAuthenticated]
-        elif self.action in ('update', 'partial_update', 'destroy', 'users', 'retrieve', 'add_users', 'remove_users'):
+        elif self.action in self.required_tenant_permissions:
             permission_classes = [TenantPermissions | IsAdminUser]
         else:
             return False
@@ -63,13 +141,36 @@ class TenantViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        serializer.instance.users.add(request.user)
+        serializer.instance.users.add(request.user, through_defaults={"role": TenantRole.OWNER})
         serializer.instance.save()
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    def perform_destroy(self, instance):
+        if settings.DELETION["ENABLED"]:
+            soft_delete(instance)
+        else:
+            instance.delete()
+
+    def check_tenant_permission(self, request, uuid=None):
+        """
+        Checks the permission of the action in the tenant of the URL with one query,
+        before a response that is shared by all its members is served
+        """
+        tenant = get_object_or_404(self.get_queryset().annotate(role=role_subquery(request.user))
+                                   .values("pk", "role"), uuid=uuid)
+        remember_roles(request, {tenant["pk"]: tenant["role"]})
+        if not request.user.is_staff and \
+                self.required_tenant_permissions[self.action] not in tenant_permissions(request, tenant["pk"]):
+            self.permission_denied(request)
+
+    @cache_response("tenant:{uuid}", authorize="check_tenant_permission")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @cache_response("tenants")
     def list(self, request, *args, **kwargs):
-        queryset = Tenant.objects.all()
+        queryset = self.get_queryset()
         if not bool(request.user and request.user.is_staff):
             queryset = queryset.filter(users__in=[request.user])
 
@@ -82,14 +183,17 @@ class TenantViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @extend_schema(
+        parameters=[FIELDS_PARAMETER],
         responses={200: UserSerializer(many=True)},
         description="Get all users in the tenant",
         operation_id="tenant_users"
     )
     @action(detail=True, methods=['get'])
+    @cache_response("tenant:{uuid}", "users", authorize="check_tenant_permission")
     def users(self, request: Request, uuid=None):
         tenant = self.get_object()
-        serializer = UserSerializer(tenant.users.all(), many=True)
+        fields = sparse_fields(request, UserSerializer)
+        serializer = UserSerializer(only_fields(tenant.users.all(), UserSerializer, fields), many=True, fields=fields)
         return Response(serializer.data)
 
     @extend_schema(
@@ -103,8 +207,8 @@ class TenantViewSet(viewsets.ModelViewSet):
         tenant = self.get_object()
         serializer = UserUuidListSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        tenant.users.add(*KompelloUser.objects.filter(uuid__in=serializer.validated_data['uuids']))
-        tenant.save()
+        user_pks = KompelloUser.objects.filter(uuid__in=serializer.validated_data['uuids']).values_list('pk', flat=True)
+        add_memberships({(tenant.pk, user_pk) for user_pk in user_pks}, {tenant.pk: tenant.uuid})
         return Response(SimpleResponseSerializer({"message": "Success"}).data)
 
     @extend_schema(
@@ -118,6 +222,112 @@ class TenantViewSet(viewsets.ModelViewSet):
         tenant = self.get_object()
         serializer = UserUuidListSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        tenant.users.remove(*KompelloUser.objects.filter(uuid__in=serializer.validated_data['uuids']))
-        tenant.save()
+        user_pks = KompelloUser.objects.filter(uuid__in=serializer.validated_data['uuids']).values_list('pk', flat=True)
+        pairs = {(tenant.pk, user_pk) for user_pk in user_pks}
+        check_owner_removal(request, pairs)
+        remove_memberships(pairs, {tenant.pk: tenant.uuid})
+        return Response(SimpleResponseSerializer({"message": "Success"}).data)
+
+    @extend_schema(
+        request=RoleSerializer,
+        responses={200: SimpleResponseSerializer},
+        description="Change the role of a member of the tenant",
+        operation_id="tenant_roles"
+    )
+    @action(detail=True, methods=['post'])
+    def roles(self, request: Request, uuid=None):
+        tenant = self.get_object()
+        serializer = RoleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user, role = serializer.validated_data["user"], serializer.validated_data["role"]
+        if role != TenantRole.OWNER:
+            owners = TenantMembership.objects.filter(tenant_id=tenant.pk, role=TenantRole.OWNER)
+            if set(owners.values_list("kompellouser__uuid", flat=True)) == {user}:
+                raise ValidationError("A tenant needs at least one owner")
+        if not TenantMembership.objects.filter(tenant_id=tenant.pk, kompellouser__uuid=user).update(role=role):
+            raise NotFound("The user is no member of the tenant")
+        if user == request.user.uuid:
+            remember_roles(request, {tenant.pk: role})
+        invalidate(f"tenant:{tenant.uuid}")
         return Response(SimpleResponseSerializer({"message": "Success"}).data)
+
+    @extend_schema(
+        request=BulkMembershipSerializer,
+        responses={200: BulkMembershipResponseSerializer},
+        description="Add or remove many users to or from many tenants. "
+                    "Users that aren't admins need a role that manages the members in all given tenants.",
+        operation_id="tenant_memberships"
+    )
+    @action(detail=False, methods=['post'])
+    def memberships(self, request: Request):
+        serializer = BulkMembershipSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        requested_tenants = {tenant for tenant, _ in data["pairs"]} | set(data["tenants"])
+        requested_users = {user for _, user in data["pairs"]} | set(data["users"])
+
+        tenants = {tenant["uuid"]: tenant for tenant in Tenant.objects.filter(
+            uuid__in=requested_tenants
+        ).annotate(role=role_subquery(request.user)).values("pk", "uuid", "role")}
+        remember_roles(request, {tenant["pk"]: tenant["role"] for tenant in tenants.values()})
+        if not all(TenantPermission.MANAGE_MEMBERS in tenant_permissions(request, tenant["pk"])
+                   for tenant in tenants.values()):
+            raise PermissionDenied("You have to manage the members of all tenants")
+        users = dict(KompelloUser.objects.filter(uuid__in=requested_users).values_list("uuid", "pk"))
+
+        requested = {(tenant, user) for tenant, user in data["pairs"]}
+        requested |= {(tenant, user) for tenant in data["tenants"] for user in data["users"]}
+
+        pairs = {(tenants[tenant]["pk"], users[user]) for tenant, user in requested
+                 if tenant in tenants and user in users}
+        tenant_uuids = {tenant["pk"]: tenant["uuid"] for tenant in tenants.values()}
+        if data["action"] == "add":
+            changed = add_memberships(pairs, tenant_uuids)
+        else:
+            check_owner_removal(request, pairs)
+            changed = remove_memberships(pairs, tenant_uuids)
+
+        return Response(BulkMembershipResponseSerializer({
+            "requested": len(requested),
+            "changed": changed,
+            "unknown_tenants": sorted(requested_tenants - tenants.keys(), key=str),
+            "unknown_users": sorted(requested_users - users.keys(), key=str),
+        }).data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter("since", OpenApiTypes.STR, description="Cursor of the previous response")],
+        responses={200: ChangesSerializer},
+        description="Get the tenants of the user that changed or that the user joined and the uuids of the "
+                    "tenants of the user that were deleted after the cursor",
+        operation_id="tenant_changes"
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request: Request):
+        tenants = Tenant.objects.all()
+        tombstones = Tombstone.objects.filter(model="tenant")
+        if not request.user.is_staff:
+            # A tenant also changed for the user when the user joined it
+            joined = MembershipChange.objects.filter(tenant_id=OuterRef("pk"), user_id=request.user.pk)
+            tenants = tenants.filter(users=request.user).annotate(
+                changed_on=Greatest("modified_on", Coalesce(Subquery(joined.values("modified_on")), "modified_on"))
+            )
+            tombstones = tombstones.filter(users=request.user)
+        return Response(changes(request.query_params.get("since"), {
+            "changed": (tenants, lambda page: TenantSerializer(page, many=True).data),
+            "deleted": (tombstones, lambda page: [{"uuid": tombstone.object_uuid} for tombstone in page]),
+        }))
+
+    @extend_schema(
+        parameters=[OpenApiParameter("since", OpenApiTypes.STR, description="Cursor of the previous response")],
+        responses={200: ChangesSerializer},
+        description="Get the memberships in the tenants of the user that were added or removed after the cursor. "
+                    "The memberships of deleted users and tenants are removed without a change of their own.",
+        operation_id="tenant_membership_changes"
+    )
+    @action(detail=False, methods=['get'], url_path='memberships/changes', url_name='memberships-changes')
+    def membership_changes(self, request: Request):
+        queryset = MembershipChange.objects.all()
+        if not request.user.is_staff:
+            tenants = TenantMembership.objects.filter(kompellouser_id=request.user.pk).values("tenant_id")
+            queryset = queryset.filter(Q(tenant__in=tenants) | Q(user=request.user))
+        return Response(changes(request.query_params.get("since"), membership_changes(queryset)))
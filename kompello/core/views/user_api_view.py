@@ -1,21 +1,37 @@
 from auditlog.models import Q
+from django.conf import settings
 from django.contrib.auth.models import Permission
 from rest_framework_simplejwt.tokens import RefreshToken
-from kompello.core.helper.serializers import SimpleResponseSerializer
-from kompello.core.models.auth_models import KompelloUser
-from drf_spectacular.utils import extend_schema
+from kompello.core.helper.changes import ChangesSerializer, changes
+from kompello.core.helper.deletion import soft_delete
+from kompello.core.helper.response_cache import cache_response
+from kompello.core.helper.roles import permission_names, user_permissions
+from kompello.core.helper.serializers import (FIELDS_PARAMETER, SimpleResponseSerializer, SparseFieldsMixin,
+                                              SparseFieldsetMixin, sparse_fields)
+from kompello.core.helper.user_import import UserImporter, read_rows
+from kompello.core.models.auth_models import KompelloUser, Tenant
+from kompello.core.models.change_models import Tombstone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import viewsets, serializers, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.permissions import IsAdminUser
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
 from rest_framework.permissions import IsAuthenticated
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = KompelloUser
         fields = ['uuid', 'first_name', 'last_name', 'email', 'password']
-        extra_kwargs = {'password': {'write_only': True}, 'uuid': {'read_only': True}}
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'uuid': {'read_only': True},
+            # Soft deleted users keep their email until they are removed
+            'email': {'validators': [UniqueValidator(KompelloUser.all_objects.all())]},
+        }
 
     def create(self, validated_data):
         user = KompelloUser(
@@ -42,6 +58,27 @@ class PasswordSerializer(serializers.Serializer):
 
 class PermissionListSerializer(serializers.Serializer):
     permissions = serializers.ListField(child=serializers.CharField())
+    tenant_permissions = serializers.ListField(
+        child=serializers.CharField(), required=False,
+        help_text="Permissions of the role of the user in the tenant of the X-KOMPELLO-TENANT header"
+    )
+
+class UserImportErrorSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    errors = serializers.DictField(child=serializers.ListField(child=serializers.CharField()))
+
+
+class UserImportResponseSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    errors = UserImportErrorSerializer(many=True)
+
+
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
 
 class KompelloUserPermissions(permissions.BasePermission):
     """
@@ -52,7 +89,9 @@ class KompelloUserPermissions(permissions.BasePermission):
         return request.user == obj
 
 
-class UserViewSet(viewsets.ModelViewSet):
+@extend_schema_view(list=extend_schema(parameters=[FIELDS_PARAMETER]),
+                    retrieve=extend_schema(parameters=[FIELDS_PARAMETER]))
+class UserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     A viewset that serializes Users
     """
@@ -64,7 +103,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         Instantiates and returns the list of permissions that this view requires.
         """
-        if self.action == 'list':
+        if self.action in ('list', 'import_users', 'changes'):
             permission_classes = [IsAdminUser]
         elif self.action in ('retrieve', 'update', 'partial_update', 'destroy', 'set_password', 'permissions'):
             permission_classes = [KompelloUserPermissions | IsAdminUser]
@@ -73,6 +112,12 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return [permission() for permission in permission_classes]
 
+    def perform_destroy(self, instance):
+        if settings.DELETION["ENABLED"]:
+            soft_delete(instance)
+        else:
+            instance.delete()
+
     @extend_schema(
         request=PasswordSerializer,
         responses={200: SimpleResponseSerializer},
@@ -93,14 +138,64 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @extend_schema(
+        request={content_type: {"type": "string", "format": "binary"} for content_type in IMPORT_FORMATS},
+        parameters=[OpenApiParameter("tenant", OpenApiTypes.UUID, description="Add the created users to this tenant")],
+        responses={200: UserImportResponseSerializer},
+        description="Create users from a CSV or NDJSON body with the columns email, first_name, last_name and "
+                    "optionally password or an already hashed password_hash. Users without both are invite-only "
+                    "and get an unusable password. The body can also be uploaded as the file of a multipart form.",
+        operation_id="users_import"
+    )
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def import_users(self, request: Request):
+        # The body is streamed from the request and must not be read by request.data before
+        if request.content_type.startswith("multipart/form-data"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                raise ParseError("The multipart form has no file")
+            lines, format = upload, "csv" if upload.name.endswith(".csv") else "ndjson"
+        else:
+            format = IMPORT_FORMATS.get(request.content_type.split(";")[0].strip())
+            if format is None:
+                raise ParseError(f"Unsupported content type, use one of {', '.join(IMPORT_FORMATS)}")
+            # None for an empty body
+            lines = request.stream or []
+
+        tenant = None
+        if "tenant" in request.query_params:
+            uuid = serializers.UUIDField().run_validation(request.query_params["tenant"])
+            tenant = Tenant.objects.filter(uuid=uuid).first()
+            if tenant is None:
+                raise NotFound("Tenant not found")
+
+        report = UserImporter(tenant).run(read_rows(lines, format))
+        return Response(UserImportResponseSerializer(report).data)
+
+    @extend_schema(
+        parameters=[OpenApiParameter("since", OpenApiTypes.STR, description="Cursor of the previous response")],
+        responses={200: ChangesSerializer},
+        description="Get the users that changed and the uuids of the users that were deleted after the cursor",
+        operation_id="users_changes"
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request: Request):
+        return Response(changes(request.query_params.get("since"), {
+            "changed": (KompelloUser.objects.all(), lambda page: UserSerializer(page, many=True).data),
+            "deleted": (Tombstone.objects.filter(model="kompellouser"),
+                        lambda page: [{"uuid": tombstone.object_uuid} for tombstone in page]),
+        }))
+
+    @extend_schema(
+        parameters=[FIELDS_PARAMETER],
         responses={200: UserSerializer},
         description="Get currently logged in user",
         operation_id="users_me"
     )
     @action(detail=False, methods=['get'])
+    @cache_response()
     def me(self, request: Request):
         user = request.user
-        return Response(UserSerializer(user).data)
+        return Response(UserSerializer(user, fields=sparse_fields(request, UserSerializer)).data)
     
     @extend_schema(
         responses={200: PermissionListSerializer},
@@ -114,4 +209,7 @@ class UserViewSet(viewsets.ModelViewSet):
             permissions = Permission.objects.all().values_list('codename', flat=True)
         else:
             permissions = Permission.objects.filter(Q(user=user) | Q(group__user=user)).values_list('codename', flat=True).all()
-        return Response(PermissionListSerializer({"permissions": permissions}).data)
+        data = {"permissions": permissions}
+        if request.tenant is not None:
+            data["tenant_permissions"] = permission_names(user_permissions(user, request.tenant.pk))
+        return Response(PermissionListSerializer(data).data)